@@ -2,21 +2,26 @@ from LoRaMAC import LoRaMAC
 from LoRaMAC import Region
 from LoRaMAC import Device
 from LoRaMAC import JoinStatus, TransmitStatus, ReceiveStatus
+from LoRaMAC import Priority
 
 import os
 import json
 import time
 import logging
 import RPi.GPIO
+from queue import Queue, Empty
 from threading import Thread
 
 from .Sensors import Relay, DAC5571
 from .Sensors import PCF8574, GPIO, PinState
+from .SampleStore import SampleStore, SAMPLE_BUCKETS_MAX
+from .UplinkBacklog import UplinkBacklog
 
 CONFIG_NAME          = "config"
 RELAY_CONTROL_NAME   = "RelayControl"
 RELAY_THRESHOLD_NAME = "RelayThresholds"
 UPLINK_INTERVAL_NAME = "UplinkInterval"
+BACKFILL_AIRTIME_NAME = "BackfillAirtime"
 
 
 class App():
@@ -33,6 +38,8 @@ class App():
     VOLTAGE_RESOLUTION         = 1000
     LORAWAN_REJOIN_INTERVAL    = 86400 # 1 day (rejoin network after 1 day to renew session keys and frame counters)
     DELAY_PER_LOOP             = 0.1
+    BACKFILL_AIRTIME           = 36    # seconds of airtime in the last hour above which the backlog waits (1 %)
+    BACKFILL_HEADER_SIZE       = 3     # channel, type and record count of a backfill frame
 
     RELAY_CONTROL_MANUAL       = 0x00
     RELAY_CONTROL_AUTOMATIC    = 0x01
@@ -52,6 +59,8 @@ class App():
     TYPE_RELAY_CONTROL         = 0xB2
     TYPE_RELAY_THRESHOLDS      = 0xB3
     TYPE_READ_RELAY_THRESHOLDS = 0xB4
+    TYPE_READ_HISTORY          = 0xB5
+    TYPE_BACKFILL              = 0xB6
 
     TYPE_PIN_0                 = 0xF0
     TYPE_PIN_1                 = 0xF1
@@ -96,6 +105,10 @@ class App():
         self.__dac1 = DAC5571(address=DAC5571.ADDRESS_DAC_1)
         self.__dac2 = DAC5571(address=DAC5571.ADDRESS_DAC_2)
         self.__adc_channels = [0]*self.__port.TOTAL_PIN
+        self.__samples = SampleStore(self.__port.TOTAL_PIN)
+        self.__backlog = UplinkBacklog()
+        self.__backfill_future = None
+        self.__history_requests = Queue()  # (start, end, buckets, mask) of the downlinks, served by the main loop
         self.__thread = Thread(target=self.__led_task, name="App Service", daemon=True)
         self.__gpio = RPi.GPIO
         self.__gpio.setmode(RPi.GPIO.BCM)
@@ -121,6 +134,11 @@ class App():
                 "handler": self.__handle_downlink_config_relay_thresholds,
                 "response": self.__read_relay_thresholds
             },
+            App.TYPE_READ_HISTORY: {
+                "data_size": 10,
+                "handler": self.__handle_downlink_read_history,
+                "response": None
+            },
             App.TYPE_DAC_1:  {
                 "data_size": 2,
                 "handler": self.__handle_downlink_dac_1,
@@ -139,7 +157,8 @@ class App():
         """
         self.__logger.info(f"App Running")
         self.__last_rejoin_timestamp = time.time()
-        self.__LoRaWAN.join(max_tries=3, forced=True)
+        # A session restored from the database is used as is, no join windows before the first uplink
+        self.__LoRaWAN.join(max_tries=3)
 
         while True:
 
@@ -151,33 +170,102 @@ class App():
             self.__read_channels()
             self.__auto_processing()
 
-            if not self.__LoRaWAN.is_joined():
-                time.sleep(1)
-                continue
-
             if (time.time() + App.DELAY_PER_LOOP) > (self.__last_transmit_timestamp + \
                                                      self.__config[CONFIG_NAME][UPLINK_INTERVAL_NAME]):
                 self.__last_transmit_timestamp = time.time()
-                self.__logger.info("The device transmits data")
-                data = bytearray([App.APP_CHANNEL, App.TYPE_TIMESTAMP])
-                data = data + int(self.__last_transmit_timestamp).to_bytes(4, byteorder='big', signed=False)
-                data = data + bytearray([App.APP_CHANNEL, App.TYPE_RELAY])
-                for voltage in self.__adc_channels:
-                    data = data + int(voltage * App.VOLTAGE_RESOLUTION).to_bytes(2, byteorder='big', signed=False)
-                pin_states_data = self.__read_pin_states_from_sensor()
-                if pin_states_data is None:
-                    pin_states_data = self.__read_pin_states_from_driver()
-                if pin_states_data is not None:
-                    data = data + pin_states_data
-                relay_thresholds = self.__read_relay_thresholds()
-                if relay_thresholds is not None:
-                    data = data + relay_thresholds
-                self.__LoRaWAN.transmit(bytes(data), True)
+                data = self.__read_uplink_data()
+                if self.__LoRaWAN.is_joined():
+                    self.__logger.info("The device transmits data")
+                    # Non-blocking: the status is reported to __on_transmit_callback
+                    future = self.__LoRaWAN.transmit(data, True)
+                    future.add_done_callback(lambda done, data=data: self.__on_uplink_done(done, data))
+                else:
+                    # Sent after the rejoin by __backfill
+                    self.__logger.info("The device stores data, not joined")
+                    self.__backlog.put(data, self.__last_transmit_timestamp)
+
+            if not self.__LoRaWAN.is_joined():
                 time.sleep(1)
+                continue
+
+            self.__send_history()
+            self.__backfill()
             
             # minimum delay (!important)
             time.sleep(App.DELAY_PER_LOOP)
 
+    def __read_uplink_data(self)->bytes:
+        data = bytearray([App.APP_CHANNEL, App.TYPE_TIMESTAMP])
+        data = data + int(self.__last_transmit_timestamp).to_bytes(4, byteorder='big', signed=False)
+        data = data + bytearray([App.APP_CHANNEL, App.TYPE_RELAY])
+        for voltage in self.__adc_channels:
+            data = data + int(voltage * App.VOLTAGE_RESOLUTION).to_bytes(2, byteorder='big', signed=False)
+        pin_states_data = self.__read_pin_states_from_sensor()
+        if pin_states_data is None:
+            pin_states_data = self.__read_pin_states_from_driver()
+        if pin_states_data is not None:
+            data = data + pin_states_data
+        relay_thresholds = self.__read_relay_thresholds()
+        if relay_thresholds is not None:
+            data = data + relay_thresholds
+        return bytes(data)
+
+    def __on_uplink_done(self, future, data:bytes):
+        # LoRaMAC thread, an uplink the network did not acknowledge is kept for the backfill
+        try:
+            status = future.result()
+        except Exception as e:
+            self.__logger.error(f"Uplink : {e}")
+            status = None
+        if status != TransmitStatus.TX_NETWORK_ACK:
+            self.__backlog.put(data, int.from_bytes(data[2:6], byteorder='big'))
+
+    def __backfill(self):
+        """
+        Sends the stored uplinks, oldest first, one confirmed frame at a time:
+        channel, type, record count (uint8), then per record its timestamp (uint32), length (uint8) and payload.
+        A frame holds the records fitting in one uplink at the data rate set by ADR; a record too large
+        for it is sent alone with `transmit_fragmented`.
+        It stops when the backlog is empty or when the airtime of the last hour reaches the backfill budget,
+        and the records are removed once the network acknowledged the frame.
+        """
+        if self.__backfill_future is not None and not self.__backfill_future.done():
+            return
+        self.__backfill_future = None
+        if len(self.__backlog) == 0:
+            return
+        budget = self.__config[CONFIG_NAME].get(BACKFILL_AIRTIME_NAME, App.BACKFILL_AIRTIME)
+        if sum(self.__LoRaWAN.get_metrics()["airtime_last_hour"].values()) >= budget:
+            return
+        size = self.__LoRaWAN.max_payload_size()
+        last, records = self.__backlog.peek(size - App.BACKFILL_HEADER_SIZE)
+        if last is None:
+            return
+        data = bytearray([App.APP_CHANNEL, App.TYPE_BACKFILL, len(records)])
+        for timestamp, payload in records:
+            data = data + int(timestamp).to_bytes(4, byteorder='big', signed=False)
+            data = data + bytearray([len(payload)]) + payload
+        self.__logger.info(f"The device sends {len(records)} stored uplinks")
+        if len(data) <= size:
+            self.__backfill_future = self.__LoRaWAN.transmit(bytes(data), True, Priority.LOW)
+        else:
+            self.__backfill_future = self.__LoRaWAN.transmit_fragmented(bytes(data), True, Priority.LOW)
+        self.__backfill_future.add_done_callback(lambda done, last=last: self.__on_backfill_done(done, last))
+
+    def __on_backfill_done(self, future, last:int):
+        try:
+            status = future.result()
+        except Exception as e:
+            # The records stay in the backlog for the next batch
+            self.__logger.error(f"Stored uplinks : {e}")
+            return
+        if status == TransmitStatus.TX_NETWORK_ACK:
+            self.__backlog.remove(last)
+        elif status == TransmitStatus.TX_PAYLOAD_ERROR:
+            # Never sent at any data rate, dropped so the next records are not blocked
+            self.__logger.error(f"Stored uplinks dropped: {status}")
+            self.__backlog.remove(last)
+
     def __led_task(self):
         self.__gpio.setup(App.LED_ERROR_PIN, self.__gpio.OUT)
         self.__gpio.setup(App.LED_COMM_PIN, self.__gpio.OUT)
@@ -211,6 +299,8 @@ class App():
                 self.__adc_channels[i] = self.__relay1.read_voltage(i%4)
             else:
                 self.__adc_channels[i] = self.__relay2.read_voltage(i%4)
+        # History of every read, written to the sample store in batches
+        self.__samples.append(self.__adc_channels)
 
     def __auto_processing(self):
         if not self.__config[CONFIG_NAME][RELAY_CONTROL_NAME]:
@@ -433,6 +523,59 @@ class App():
         except:
             return False
     
+    def __handle_downlink_read_history(self, cmd:list, index:int)->bool:
+        """
+        Queues a query of the aggregated history of the channels, sent by a downlink:
+        start (uint32 UNIX time), end (uint32 UNIX time, 0 for now), buckets (uint8), channel mask (uint8).
+        The query runs on the main loop (`__send_history`), not on the LoRaMAC thread calling back.
+        """
+        try:
+            start = self.__get_uint32_from_command(cmd, index)
+            end = self.__get_uint32_from_command(cmd, index + 4)
+            if start is None or end is None or index + 9 >= len(cmd):
+                return False
+            buckets = cmd[index + 8]
+            mask = cmd[index + 9]
+            if end == 0:
+                end = int(time.time())
+            if buckets == 0 or buckets > SAMPLE_BUCKETS_MAX or mask == 0 or end <= start:
+                return False
+            self.__history_requests.put((start, end, buckets, mask))
+            return True
+        except:
+            return False
+
+    def __send_history(self):
+        """
+        Sends the history queried by the downlinks with `transmit_fragmented` at low priority:
+        channel, type, start (uint32), bucket duration in seconds (uint32), buckets (uint8), channel mask (uint8),
+        then per bucket the sample count (uint16) and the min, max and mean (uint16 mV) of each channel of the mask.
+        """
+        while True:
+            try:
+                start, end, buckets, mask = self.__history_requests.get_nowait()
+            except Empty:
+                return
+            history = self.__samples.query(start, end, buckets)
+            if history is None:
+                self.__logger.error(f"History query failed")
+                self.__led_error_on()
+                continue
+            channels = [channel for channel in range(self.__port.TOTAL_PIN) if mask & (1 << channel)]
+            step = int(round((end - start) / buckets))
+            data = bytearray([App.APP_CHANNEL, App.TYPE_READ_HISTORY])
+            data = data + start.to_bytes(4, byteorder='big', signed=False)
+            data = data + step.to_bytes(4, byteorder='big', signed=False)
+            data = data + bytearray([buckets, mask])
+            for bucket in history:
+                data = data + min(bucket["count"], 0xFFFF).to_bytes(2, byteorder='big', signed=False)
+                for channel in channels:
+                    for key in ("min", "max", "mean"):
+                        voltage = bucket[key][channel] if bucket["count"] > 0 else 0
+                        voltage = max(0, min(int(voltage * App.VOLTAGE_RESOLUTION), 0xFFFF))
+                        data = data + voltage.to_bytes(2, byteorder='big', signed=False)
+            self.__LoRaWAN.transmit_fragmented(bytes(data))
+
     def __handle_downlink_write_pin_state(self, cmd:list, index:int, pin_not_verified:int)->bool:
         try:
             if index > len(cmd):
@@ -0,0 +1,142 @@
+from threading import Lock
+import sqlite3
+import logging
+import time
+import os
+
+__currentdir = os.path.dirname(os.path.realpath(__file__))
+# APP_SAMPLES_DATABASE overrides the sample store file, kept apart from the LoRaMAC session database
+SAMPLE_DATABASE_PATH = os.environ.get("APP_SAMPLES_DATABASE", os.path.join(__currentdir, "samples.db"))
+
+SAMPLE_RETENTION_ROWS   = 864000            # 1 day of samples every 100 ms
+SAMPLE_RETENTION_AGE    = 7 * 86400         # 7 days
+SAMPLE_FLUSH_INTERVAL   = 10                # seconds between two writes of the buffered samples
+SAMPLE_FLUSH_SIZE       = 256               # buffered samples forcing a write
+SAMPLE_BUCKETS_MAX      = 32                # buckets of a range query
+
+
+class SampleStore():
+    """
+    The `SampleStore` class keeps the history of the sensor channels in an append-only SQLite table,
+    one row per sample with a column per channel, indexed by timestamp.
+    Samples are buffered in memory and written in one transaction every SAMPLE_FLUSH_INTERVAL seconds,
+    so the SD card sees a few writes per minute. The table is a ring buffer: rows older than `max_age`
+    or beyond the `max_rows` latest are deleted after each write.
+    `query()` aggregates a time range in buckets (count, min, max and mean of each channel) without loading the rows.
+
+    Example Usage:
+        store = SampleStore(channels=8)\n
+        store.append([0.5]*8)\n
+        buckets = store.query(time.time() - 3600, time.time(), 12)\n
+    """
+
+    def __init__(self, channels:int, database_name:str=SAMPLE_DATABASE_PATH, max_rows:int=SAMPLE_RETENTION_ROWS,
+                 max_age:float=SAMPLE_RETENTION_AGE, flush_interval:float=SAMPLE_FLUSH_INTERVAL):
+        """
+        Initializes the `SampleStore` and creates its table.
+
+        Args:
+            channels (int): The number of channels of a sample.
+            database_name (str): The SQLite file. Default is SAMPLE_DATABASE_PATH.
+            max_rows (int): The samples kept. Default is SAMPLE_RETENTION_ROWS.
+            max_age (float): The age in seconds of the oldest sample kept. Default is SAMPLE_RETENTION_AGE.
+            flush_interval (float): The seconds between two writes of the buffered samples. Default is SAMPLE_FLUSH_INTERVAL.
+        """
+        self.__logger = logging.getLogger("APP[MAIN]")
+        self.__channels = channels
+        self.__max_rows = max_rows
+        self.__max_age = max_age
+        self.__flush_interval = flush_interval
+        self.__buffer = []
+        self.__last_flush = time.monotonic()
+        self.__lock = Lock()
+        columns = [f"C{channel}" for channel in range(channels)]
+        self.__insert_query = f"INSERT INTO SAMPLE(Timestamp, {', '.join(columns)}) VALUES(?{', ?' * channels})"
+        aggregates = "".join([f", MIN({column}), MAX({column}), AVG({column})" for column in columns])
+        self.__query = f"SELECT CAST((Timestamp - ?) / ? AS INTEGER) AS Bucket, COUNT(*){aggregates} FROM SAMPLE " \
+                       f"WHERE Timestamp >= ? AND Timestamp < ? GROUP BY Bucket ORDER BY Bucket"
+        # The connection is used by the main loop (append, query) and by `close()`
+        self.__connection = sqlite3.connect(database_name, check_same_thread=False)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.execute(f"CREATE TABLE IF NOT EXISTS SAMPLE (ID INTEGER PRIMARY KEY, Timestamp REAL NOT NULL, "
+                                  f"{', '.join([column + ' REAL' for column in columns])})")
+        self.__connection.execute("CREATE INDEX IF NOT EXISTS SAMPLE_TIMESTAMP ON SAMPLE(Timestamp)")
+        self.__connection.commit()
+
+    def append(self, values:list, timestamp:float=None):
+        """
+        Buffers a sample, the buffer is written when SAMPLE_FLUSH_INTERVAL elapsed or SAMPLE_FLUSH_SIZE samples wait.
+
+        Args:
+            values (list): The value of each channel.
+            timestamp (float): The UNIX time of the sample. Default is None (now).
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        with self.__lock:
+            self.__buffer.append((timestamp, *values[:self.__channels]))
+        if len(self.__buffer) >= SAMPLE_FLUSH_SIZE or time.monotonic() - self.__last_flush >= self.__flush_interval:
+            self.flush()
+
+    def flush(self) -> bool:
+        """
+        Writes the buffered samples in one transaction and applies the retention.
+
+        Returns:
+            bool: True if the samples are written, False otherwise.
+        """
+        with self.__lock:
+            samples = self.__buffer
+            self.__buffer = []
+            self.__last_flush = time.monotonic()
+            try:
+                with self.__connection:
+                    if len(samples) > 0:
+                        self.__connection.executemany(self.__insert_query, samples)
+                    cursor = self.__connection.execute("SELECT MAX(ID) FROM SAMPLE")
+                    last = cursor.fetchone()[0]
+                    if last is not None:
+                        self.__connection.execute("DELETE FROM SAMPLE WHERE ID <= ? OR Timestamp < ?",
+                                                  (last - self.__max_rows, time.time() - self.__max_age))
+                return True
+            except Exception as e:
+                self.__logger.error(f"Sample store : {e}")
+                return False
+
+    def query(self, start:float, end:float, buckets:int) -> list:
+        """
+        Aggregates the samples of [start, end) in `buckets` buckets of equal duration.
+
+        Args:
+            start (float): The UNIX time of the range start.
+            end (float): The UNIX time of the range end.
+            buckets (int): The number of buckets, at most SAMPLE_BUCKETS_MAX.
+
+        Returns:
+            list: A dict per bucket (`start`, `count`, `min`, `max` and `mean` lists by channel),
+                  `count` is 0 and the lists empty for a bucket without sample. None on error.
+        """
+        if end <= start or buckets < 1 or buckets > SAMPLE_BUCKETS_MAX:
+            return None
+        step = (end - start) / buckets
+        # The buffered samples are part of the history
+        self.flush()
+        result = [{"start": start + index * step, "count": 0, "min": [], "max": [], "mean": []} for index in range(buckets)]
+        with self.__lock:
+            try:
+                rows = self.__connection.execute(self.__query, (start, step, start, end)).fetchall()
+            except Exception as e:
+                self.__logger.error(f"Sample store : {e}")
+                return None
+        for row in rows:
+            bucket = result[min(row[0], buckets - 1)]
+            bucket["count"] = row[1]
+            bucket["min"] = list(row[2::3])
+            bucket["max"] = list(row[3::3])
+            bucket["mean"] = list(row[4::3])
+        return result
+
+    def close(self):
+        self.flush()
+        self.__connection.close()
@@ -0,0 +1,133 @@
+from threading import Lock
+import sqlite3
+import logging
+import time
+import os
+
+__currentdir = os.path.dirname(os.path.realpath(__file__))
+# APP_BACKLOG_DATABASE overrides the backlog file
+BACKLOG_DATABASE_PATH = os.environ.get("APP_BACKLOG_DATABASE", os.path.join(__currentdir, "backlog.db"))
+
+BACKLOG_MAX_ROWS        = 10000         # about 2 days of uplinks every 20 s, the oldest are dropped first
+BACKLOG_RECORD_SIZE_MAX = 255           # a record length is one byte in a backfill frame
+BACKLOG_RECORD_HEADER   = 5             # timestamp (uint32) and length (uint8) of a record in a backfill frame
+
+
+class UplinkBacklog():
+    """
+    The `UplinkBacklog` class is a durable FIFO of the uplinks not delivered while the link is down.
+    Each record is committed with a full fsync (synchronous FULL), so an uplink stored before a power cut
+    is sent after the restart. Records are read oldest first by `peek()` and removed by `remove()`
+    once the network acknowledged the frame carrying them.
+
+    Example Usage:
+        backlog = UplinkBacklog()\n
+        backlog.put(payload)\n
+        last, records = backlog.peek(200)\n
+        backlog.remove(last)\n
+    """
+
+    def __init__(self, database_name:str=BACKLOG_DATABASE_PATH, max_rows:int=BACKLOG_MAX_ROWS):
+        """
+        Initializes the `UplinkBacklog` and creates its table.
+
+        Args:
+            database_name (str): The SQLite file. Default is BACKLOG_DATABASE_PATH.
+            max_rows (int): The records kept. Default is BACKLOG_MAX_ROWS.
+        """
+        self.__logger = logging.getLogger("APP[MAIN]")
+        self.__max_rows = max_rows
+        self.__lock = Lock()
+        # Records are put by the main loop and by the transmit callbacks of LoRaMAC
+        self.__connection = sqlite3.connect(database_name, check_same_thread=False)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=FULL")
+        self.__connection.execute("CREATE TABLE IF NOT EXISTS BACKLOG (ID INTEGER PRIMARY KEY AUTOINCREMENT, "
+                                  "Timestamp REAL NOT NULL, Payload BLOB NOT NULL)")
+        self.__connection.commit()
+
+    def __len__(self) -> int:
+        with self.__lock:
+            try:
+                return self.__connection.execute("SELECT COUNT(*) FROM BACKLOG").fetchone()[0]
+            except Exception as e:
+                self.__logger.error(f"Uplink backlog : {e}")
+                return 0
+
+    def put(self, payload:bytes, timestamp:float=None) -> bool:
+        """
+        Stores an uplink at the end of the backlog.
+
+        Args:
+            payload (bytes): The uplink payload, at most BACKLOG_RECORD_SIZE_MAX bytes.
+            timestamp (float): The UNIX time of the uplink. Default is None (now).
+
+        Returns:
+            bool: True if the uplink is stored, False otherwise.
+        """
+        if len(payload) == 0 or len(payload) > BACKLOG_RECORD_SIZE_MAX:
+            return False
+        if timestamp is None:
+            timestamp = time.time()
+        with self.__lock:
+            try:
+                with self.__connection:
+                    cursor = self.__connection.execute("INSERT INTO BACKLOG(Timestamp, Payload) VALUES(?, ?)",
+                                                       (timestamp, bytes(payload)))
+                    self.__connection.execute("DELETE FROM BACKLOG WHERE ID <= ?", (cursor.lastrowid - self.__max_rows,))
+                return True
+            except Exception as e:
+                self.__logger.error(f"Uplink backlog : {e}")
+                return False
+
+    def peek(self, size_max:int) -> tuple:
+        """
+        Reads the oldest uplinks, as many as fit in `size_max` bytes with a BACKLOG_RECORD_HEADER each.
+        The oldest uplink is always read, even if it does not fit.
+
+        Args:
+            size_max (int): The size of the batch in bytes.
+
+        Returns:
+            tuple: The ID of the last uplink read (for `remove()`) and the list of (timestamp, payload), oldest first.
+                   (None, []) if the backlog is empty.
+        """
+        last = None
+        records = []
+        size = 0
+        with self.__lock:
+            try:
+                cursor = self.__connection.execute("SELECT ID, Timestamp, Payload FROM BACKLOG ORDER BY ID")
+                for row in cursor:
+                    if len(records) > 0 and size + BACKLOG_RECORD_HEADER + len(row[2]) > size_max:
+                        break
+                    size = size + BACKLOG_RECORD_HEADER + len(row[2])
+                    last = row[0]
+                    records.append((row[1], bytes(row[2])))
+                cursor.close()
+            except Exception as e:
+                self.__logger.error(f"Uplink backlog : {e}")
+                return None, []
+        return last, records
+
+    def remove(self, last:int) -> bool:
+        """
+        Removes the uplinks up to `last`, delivered to the network.
+
+        Args:
+            last (int): The ID returned by `peek()`.
+
+        Returns:
+            bool: True if the uplinks are removed, False otherwise.
+        """
+        with self.__lock:
+            try:
+                with self.__connection:
+                    self.__connection.execute("DELETE FROM BACKLOG WHERE ID <= ?", (last,))
+                return True
+            except Exception as e:
+                self.__logger.error(f"Uplink backlog : {e}")
+                return False
+
+    def close(self):
+        self.__connection.close()
@@ -1,16 +1,26 @@
-from .loramac_database import Database
-from .loramac_wrapper import WrapperLoRaMAC
-from .loramac_types import MessageType
+from .loramac_database import Database, WriteBehindDatabase
+from .loramac_crypto import lorawan_codec
+from .loramac_types import MessageType, DeviceClass
 from .loramac_region import Region
 from .loramac_device import Device
 from .loramac_status import JoinStatus, TransmitStatus, ReceiveStatus, RadioStatus
-from .loramac_command import MacCommand
+from .loramac_metrics import Metrics
+from .loramac_request import MacFuture, MacRequest, RequestType, Priority
+from .loramac_scheduler import Scheduler
+from .loramac_radio import RadioActor
+from .loramac_airtime import AirtimeLedger, RadioOnTime, time_on_air, LORAWAN_FRAME_OVERHEAD
+from .loramac_channel import ChannelSelector
+from .loramac_fragment import fragment, FRAGMENT_HEADER_SIZE
+from .loramac_session import Session
+from .loramac_frame import FrameView
 from .loramac_settings import *
-from .LoRaRF import SX126x
+from .LoRaRF import SX126x, BaseLoRa
 
-from threading import Thread, Semaphore, Timer
+from threading import Thread, Event, Lock
+from queue import Queue, Empty
 import logging
 import random
+import math
 import time
 
 logging.basicConfig(format='%(asctime)s.%(msecs)03d   %(levelname)-8s %(name)s: %(message)s',
@@ -24,7 +34,9 @@ class LoRaMAC():
     The class uses a LoRaRF library for low-level communication with the LoRa radio module.
 
     Note:
-        Only LoRaWAN Class C device is implemented (can work with LoRaWAN Class A)
+        LoRaWAN Class A and Class C devices are implemented (see `DeviceClass`).
+        In Class A the radio sleeps (warm start) between the RX windows of the uplinks.
+        More devices can share the radio (`add_device()`), each with its own session and uplink queue.
 
     Example Usage:
         device  = Device(DevEUI, AppEUI, AppKey)\n
@@ -32,7 +44,8 @@ class LoRaMAC():
         LoRaWAN = LoRaMAC(device, region)\n
         LoRaWAN.set_callback(on_join_callback, on_transmit_callback, on_receive_callback)\n
         LoRaWAN.join()\n
-        LoRaWAN.transmit(payload, confirmed=True)\n
+        status  = LoRaWAN.transmit(payload, confirmed=True).result()\n
+        LoRaWAN.add_device(Device(DevEUI2, AppEUI, AppKey2))\n
 
     Main functionalities:
     - Joining a LoRaWAN network
@@ -40,14 +53,21 @@ class LoRaMAC():
     - Receiving data
 
     Methods:
-    - is_joined(self) -> bool: Returns whether the device has successfully joined the network.
+    - is_joined(self, device=None) -> bool: Returns whether the device has successfully joined the network.
     - set_callback(self, on_join, on_transmit, on_receive): Sets the callback functions for join, transmit, and receive events.
-    - join(self, max_tries:int=1, forced:bool=False) -> bool: Joins the LoRaWAN network.
-    - transmit(self, payload:bytes, confirmed:bool=False) -> bool: Transmits data over the LoRaWAN network.
+    - add_device(self, device, on_join=None, on_transmit=None, on_receive=None) -> bool: Hosts one more device on the radio.
+    - join(self, max_tries:int=1, forced:bool=False, device=None) -> MacFuture: Joins the LoRaWAN network.
+    - transmit(self, payload:bytes, confirmed:bool=False, device=None) -> MacFuture: Transmits data over the LoRaWAN network.
+    - transmit_fragmented(self, payload:bytes, device=None) -> MacFuture: Transmits a payload larger than one frame.
+    - max_payload_size(self, device=None) -> int: Returns the largest payload of one uplink at the current data rate.
+    - request_link_check(self), request_device_time(self): Add LinkCheckReq / DeviceTimeReq to the next uplink.
     - set_logging_level(self, level=logging.INFO): Sets the logging level for the `LoRaMAC` object.
+    - get_metrics(self, device=None) -> dict: Returns the counters and latencies measured by the `LoRaMAC` object.
 
     Fields:
-    - _device: The device object associated with the `LoRaMAC` object.
+    - _session: Session of the device given to the constructor, used when no device is given to the methods.
+    - _sessions: Sessions of the hosted devices by DevEUI (hex), in the order they were added.
+    - _sessions_by_devaddr: Sessions of the joined devices by DevAddr (bytes), dispatching the downlinks.
     - _region: The region object associated with the `LoRaMAC` object.
     - _on_join: Callback function for join event.
     - _on_transmit: Callback function for transmit event.
@@ -56,20 +76,35 @@ class LoRaMAC():
     - _channel: Current channel for communication.
     - _spreading_factor: Current spreading factor for communication.
     - _LoRa: LoRaRF object for low-level communication with the LoRa radio module.
-    - _db: Database object for storing device information.
-    - _LoRaSemaphore: Semaphore object for thread synchronization.
+    - _db: Database object for storing device information, updates written behind on its own thread.
+    - _radio: RadioActor, the only thread driving the radio (TX, RX windows, packet reads).
+    - _events: Queue waking the background task with MacRequest objects and DIO1 interrupt timestamps (IRQ mode).
+    - _scheduler: Scheduler opening the RX windows at exact offsets from the TX done instant.
+    - _ledger: AirtimeLedger enforcing the duty cycle and the dwell time of the region.
+    - _channels: ChannelSelector picking uplink channels from their ACK ratio and downlink SNR.
+    - _device_class: DeviceClass, what the radio does between the RX windows.
+    - _radio_on: RadioOnTime accounting the time the radio is awake.
+    - _metrics: Metrics object for counters and latencies.
     - _thread: Thread object for running the background task.
     """
     
-    def __init__(self, device:Device, region:Region):
+    def __init__(self, device:Device, region:Region, radio:BaseLoRa=None, irq_pin:int=RADIO_IRQ_PIN,
+                 device_class:DeviceClass=DeviceClass.CLASS_C):
         """
         Initializes the LoRaMAC object with the provided device and region.
     
         Args:
             device (Device): The device object associated with the LoRaMAC object.
             region (Region): The region object associated with the LoRaMAC object.
+            radio (BaseLoRa): The LoRa radio driver. Default is None (SX126x on the Raspberry Pi SPI bus).
+            irq_pin (int): The BCM pin wired to DIO1, -1 to poll the radio. Default is RADIO_IRQ_PIN.
+            device_class (DeviceClass): The receive behaviour between uplinks. Default is DeviceClass.CLASS_C.
+
+        Example Usage:
+            radio   = SimulatedLoRa()\n
+            LoRaWAN = LoRaMAC(device, region, radio=radio, irq_pin=0)\n
+            LoRaWAN = LoRaMAC(device, region, device_class=DeviceClass.CLASS_A)\n
         """
-        self._device = device
         self._region = region
         self._on_join = None
         self._on_transmit = None
@@ -77,44 +112,68 @@ class LoRaMAC():
         self._logger = logging.getLogger("APP[LoRaMAC]")
         self._logger.setLevel(logging.DEBUG)
         self._logger.debug(f"LoRaMAC Initializing...")
+        self._codec = lorawan_codec()
+        self._logger.debug(f"LoRaWAN frames by {self._codec.__name__}")
         self._channel = self._region.value.UPLINK_CHANNEL_MIN
         self._spreading_factor = self._region.value.SPREADING_FACTOR_MAX
-        self._LoRa = SX126x()
-        self._Mac = MacCommand()
+        self._LoRa = SX126x() if radio is None else radio
         self._LoRaIrqStatus = self._LoRa.STATUS_DEFAULT
-        self.__rx2_timer:Timer = None
-        self.__rx2_timeout_timer:Timer = None
-        db = Database()
-        db.open()
-        # Create table if not exists
-        db.create_table()
-        # Get device info if exists
-        device_dict = db.get_device(device.DevEUI.hex())
-        if device_dict is None:
-            # Insert device info if not exists
-            db.insert_device(device.DevEUI.hex(), device.AppEUI.hex(), device.AppKey.hex())
-        else:
-            # Restore device if exists
-            self._device.set_device(device_dict)
-        db.close()
-        self._LoRaSemaphore = Semaphore()
-        self._LoRaSemaphore.release()
+        self._irq_mode = irq_pin != -1
+        self._device_class = device_class
+        self._radio_on = RadioOnTime()
+        self.__radio_asleep = False
+        self._events = Queue()
+        self._sessions = {}
+        self._sessions_by_devaddr = {}
+        self.__session_turn = 0
+        self._rx_windows_end = 0
+        self._ledger = AirtimeLedger(region)
+        self._duty_cycle_end = 0
+        self._channels = ChannelSelector()
+        self._started_at = time.monotonic()
+        self.__first_uplink = True
+        self._metrics = Metrics()
+        self._db = WriteBehindDatabase(Database(persistent=True))
+        self._db.open()
+        self._db.create_table()
+        self._scheduler = Scheduler("LoRaMAC Scheduler")
+        self.__rx_windows:list = []
+        self.__rx_session:Session = None
+        self.__rx_snr = 0
+        self.__rx_rssi = 0
+        self.__tx_sequence = 0
+        self.__busy_in_tx = False
+        self._tx_done = Event()
+        self._tx_done_at = 0
+        self._session = self.__open_session(device)
+        self.__rx_session = self._session
+        self._radio = RadioActor("LoRaMAC Radio", self._metrics)
         self._thread = Thread(target=self.__background_task, name="LoRaMAC Service", daemon=True)
         self._logger.debug(f"LoRa Radio Initializing...")
+        # The driver polls the IRQ status: every SPI access stays on the radio thread
         self._LoRa.begin(RADIO_SPI_BUS_ID, RADIO_SPI_CS_ID, RADIO_RESET_PIN, RADIO_BUSY_PIN,
-                         RADIO_IRQ_PIN, RADIO_TX_ENABLE_PIN, RADIO_RX_ENABLE_PIN)
-        self._logger.debug(f"LoRa Radio Initialized")
+                         -1, RADIO_TX_ENABLE_PIN, RADIO_RX_ENABLE_PIN)
+        if self._irq_mode:
+            # DIO1 edges only wake the radio thread, which then reads the IRQ status
+            self._LoRa.onInterrupt(irq_pin, self.__radio_irq_cb)
+        self._radio_on.on()
+        if self._device_class == DeviceClass.CLASS_A:
+            self._radio.call(self.__radio_sleep)
+        self._logger.debug(f"LoRa Radio Initialized ({'IRQ' if self._irq_mode else 'polling'} mode, {self._device_class.name})")
         self._thread.start()
         self._logger.debug(f"LoRaMAC Initialized")
 
-    def is_joined(self)->bool:
+    def is_joined(self, device:Device=None)->bool:
         """
         Returns a boolean value indicating whether the device has successfully joined the LoRaWAN network.
+
+        Args:
+            device (Device): The hosted device. Default is None (device given to the constructor).
     
         Returns:
             True if the device has joined the LoRaWAN network, False otherwise.
         """
-        return self._device.isJoined
+        return self.__session_of(device).device.isJoined
 
     def set_callback(self, on_join, on_transmit, on_receive):
         """
@@ -150,145 +209,235 @@ class LoRaMAC():
         self._on_transmit = on_transmit
         self._on_receive = on_receive
 
-    def join(self, max_tries:int=1, forced:bool=False)->bool:
+    def add_device(self, device:Device, on_join=None, on_transmit=None, on_receive=None)->bool:
+        """
+        Hosts one more device on the radio of the `LoRaMAC`, with its own session restored from the database.
+
+        The devices share the radio, the duty cycle and the RX windows: their uplinks are sent one at a time,
+        the highest priority first and in turn between the devices of the same priority.
+        Downlinks are dispatched to the device of their DevAddr.
+
+        Args:
+            device (Device): The device to host.
+            on_join (function): The join callback of the device. Default is None (callback of `set_callback()`).
+            on_transmit (function): The transmit callback of the device. Default is None (callback of `set_callback()`).
+            on_receive (function): The receive callback of the device. Default is None (callback of `set_callback()`).
+
+        Returns:
+            bool: False if the device is already hosted, True otherwise.
+
+        Example Usage:
+            sensor  = Device(DevEUI2, AppEUI, AppKey2)\n
+            LoRaWAN.add_device(sensor, on_receive=on_sensor_receive)\n
+            LoRaWAN.join(max_tries=3, device=sensor)\n
+            status  = LoRaWAN.transmit(payload, device=sensor).result()\n
+        """
+        if device.DevEUI.hex() in self._sessions:
+            self._logger.warning(f"Device {device.DevEUI.hex()} already hosted")
+            return False
+        self.__open_session(device, on_join, on_transmit, on_receive)
+        self._logger.info(f"Device {device.DevEUI.hex()} added, {len(self._sessions)} devices hosted")
+        return True
+
+    def join(self, max_tries:int=1, forced:bool=False, device:Device=None)->MacFuture:
         """
         Join the network.
 
+        The join is queued to the LoRaMAC service thread and this method returns immediately.
+
         Args:
             max_tries (int): The maximum number of join attempts. Default is 1.
             forced (bool): Whether to force the join process. Default is False.
+            device (Device): The hosted device to join. Default is None (device given to the constructor).
 
         Returns:
-            bool: True if the join process started, False otherwise.
+            MacFuture: Completes with the final `JoinStatus` (the same status given to the on_join callback).
+                       Its `delay` is the number of seconds the join waits for the duty cycle.
 
         Example Usage:
             device  = Device(DevEUI, AppEUI, AppKey)\n
             region  = Region.US915\n
             LoRaWAN = LoRaMAC(device, region)\n
             joining = LoRaWAN.join(max_tries=3, forced=True)\n
+            status  = joining.result()\n
 
         """
-        if max_tries > 0:
-            self._device.join_max_tries = max_tries - 1
-        else:
+        session = self.__session_of(device)
+        request = MacRequest(RequestType.JOIN, max_tries=max_tries)
+        request.session = session
+        if max_tries <= 0:
             self._logger.debug(f"Join max try error")
-            if callable(self._on_join):
-                self._on_join(JoinStatus.JOIN_MAX_TRY_ERROR)
-            return False
+            self.__notify_join(session, JoinStatus.JOIN_MAX_TRY_ERROR, request)
+            return request.future
         
-        if not forced and self._device.isJoined:
+        if not forced and session.device.isJoined:
             self._logger.debug(f"Already Joined")
-            if callable(self._on_join):
-                self._on_join(JoinStatus.JOIN_OK)
-            return True
-        
-        self._device.isJoined = False
-        if not self.__lorawan_join_request():
-            if callable(self._on_join):
-                self._on_join(JoinStatus.JOIN_REQUEST_ERROR)
-            return False
-        
-        if self._region == Region.EU868:
-            self._channel = random.randint(self._region.value.UPLINK_CHANNEL_MIN, Region.EU868.value.JOIN_CHANNEL_MAX)
-        else:
-            self._channel = self.__random_channel()
-        self._spreading_factor = self._region.value.SPREADING_FACTOR_MAX
-        
-        self._logger.info(f"Joining...")
-        self._LoRaSemaphore.acquire()
-        self.__radio_tx_mode()
-        if self.__radio_transmit(delay=JOIN_RX1_DELAY):
-            # Transmit ok
-            self.__radio_rx1_mode()
-            # open RX2 600 ms later
-            rx2_opening_in = (JOIN_RX2_DELAY - JOIN_RX1_DELAY) + 0.6
-            self.__rx2_timer = Timer(rx2_opening_in, self.__radio_rx2_timer_cb)
-            self.__rx2_timer.start()
-            self._LoRaSemaphore.release()
-            return True
-        else:
-            # Transmit error
-            self.__radio_rx2_mode()
-            self._LoRaSemaphore.release()
-            if self._device.join_max_tries > 0:
-                    self.join(self._device.join_max_tries)
-            elif callable(self._on_join):
-                self._on_join(JoinStatus.JOIN_MAX_TRY_ERROR)
-                return True
-            
+            self.__notify_join(session, JoinStatus.JOIN_OK, request)
+            return request.future
 
-    def transmit(self, payload:bytes, confirmed:bool=False)->bool:
+        request.future.delay = self.__transmit_delay(session, self.__join_channels(session))
+        if request.future.delay > 0:
+            self._logger.info(f"Join delayed {request.future.delay:.1f} s by duty cycle")
+        self._events.put(request)
+        return request.future
+
+    def transmit(self, payload:bytes, confirmed:bool=False, priority:Priority=Priority.NORMAL, fport:int=None,
+                 device:Device=None)->MacFuture:
         """
         Transmits data over the LoRaWAN network.
 
+        The uplink is queued to the LoRaMAC service thread and this method returns immediately.
+        Queued uplinks are sent by priority once the RX windows of the previous uplink are closed,
+        and pending payloads for the same FPort are merged into one frame when they fit.
+
         Args:
             payload (bytes): The data to be transmitted as a byte array.
             confirmed (bool, optional): Whether the transmission should be confirmed by the network. Default is False.
+            priority (Priority, optional): The queue priority of the uplink. Default is Priority.NORMAL.
+            fport (int, optional): The FPort of the uplink. Default is the device FPort.
+            device (Device, optional): The hosted device sending the uplink. Default is None (device given to the constructor).
 
         Returns:
-            bool: True if the transmission process started, False otherwise.
+            MacFuture: Completes with a `TransmitStatus`: TX_OK when an unconfirmed uplink is sent,
+                       TX_NETWORK_ACK or TX_NETWORK_NO_ACK for a confirmed uplink, or an error status.
+                       Its `delay` is the number of seconds the uplink waits for the RX windows and the duty cycle.
         """
-        self._device.uplinkMacPayload = payload
-        if not self._device.isJoined:
+        session = self.__session_of(device)
+        if fport is None:
+            fport = session.device.FPort
+        request = MacRequest(RequestType.UPLINK, payload=bytes(payload), confirmed=confirmed, priority=priority, fport=fport,
+                             mergeable=fport != FRAGMENT_FPORT)
+        request.session = session
+        if not session.device.isJoined:
             self._logger.debug(f"Uplink : join error")
-            if callable(self._on_transmit):
-                self._on_transmit(TransmitStatus.TX_JOIN_ERROR)
-            return False
-        
-        if not self.__lorawan_data_up(confirmed):
-            if callable(self._on_transmit):
-                self._on_transmit(TransmitStatus.TX_PAYLOAD_ERROR)
-            return False
-        
-        self._channel = self.__random_channel()
-        self._spreading_factor = self.__random_spreading_factor()
-        
-        self._logger.info(f"Transmitting...")
-        self._LoRaSemaphore.acquire()
-        self.__radio_tx_mode()
-        if self.__radio_transmit(delay=UPLINK_RX1_DELAY):
-            # Transmit ok
-            self.__radio_rx1_mode()
-            # open RX2 600 ms later
-            rx2_opening_in = (UPLINK_RX2_DELAY - UPLINK_RX1_DELAY) + 0.6
-            self.__rx2_timer = Timer(rx2_opening_in, self.__radio_rx2_timer_cb)
-            self.__rx2_timer.start()
-            self._LoRaSemaphore.release()
-            self._Mac.answer = None
-            return True
-        else:
-            # Transmit error
-            self.__radio_rx2_mode()
-            self._LoRaSemaphore.release()
-            return False
+            self.__notify_transmit(session, TransmitStatus.TX_JOIN_ERROR, request)
+            return request.future
+
+        if len(request.payload) > self.__max_payload_size(self._region.value.SPREADING_FACTOR_MIN):
+            self._logger.error(f"Uplink : payload of {len(request.payload)} bytes too large, use transmit_fragmented()")
+            self.__notify_transmit(session, TransmitStatus.TX_PAYLOAD_ERROR, request)
+            return request.future
+
+        request.future.delay = self.__transmit_delay(session, self.__uplink_channels(session))
+        if request.future.delay > 0:
+            self._logger.info(f"Uplink delayed {request.future.delay:.1f} s")
+        session.uplinks.put(request)
+        self._events.put(RequestType.UPLINK)
+        return request.future
     
-    def stack_transmit(self)->bool:
-        self._LoRaSemaphore.acquire()
-        self._device.uplinkMacPayload = bytes([])
-        if not self.__lorawan_data_up(False, 0):
-            self._LoRaSemaphore.release()
+    def transmit_fragmented(self, payload:bytes, confirmed:bool=False, priority:Priority=Priority.LOW,
+                            parity_group:int=FRAGMENT_PARITY_GROUP, device:Device=None)->MacFuture:
+        """
+        Transmits a payload larger than one frame as a run of fragments on FRAGMENT_FPORT.
+
+        Fragments are sized to the current data rate and carry a header (session, index, fragment count,
+        parity group, payload length) so the application server rebuilds the payload with `Reassembler`.
+        A parity fragment every `parity_group` data fragments allows one lost fragment per group.
+
+        Args:
+            payload (bytes): The data to be transmitted.
+            confirmed (bool, optional): Whether every fragment should be confirmed by the network. Default is False.
+            priority (Priority, optional): The queue priority of the fragments. Default is Priority.LOW.
+            parity_group (int, optional): The data fragments per parity fragment. Default is FRAGMENT_PARITY_GROUP.
+            device (Device, optional): The hosted device sending the fragments. Default is None (device given to the constructor).
+
+        Returns:
+            MacFuture: Completes with TX_OK (or TX_NETWORK_ACK if confirmed) once every fragment is sent,
+                       else with the first error status of a fragment.
+
+        Example Usage:
+            sending = LoRaWAN.transmit_fragmented(bytes(history))\n
+            status  = sending.result()\n
+        """
+        session = self.__session_of(device)
+        future = MacFuture()
+        # Room is left for FOpts so a MAC answer never pushes a fragment to a faster data rate
+        fragment_size = self.__max_payload_size(self.__uplink_spreading_factor(session)) - self._codec.LORAWAN_MAX_FOPTS_LEN
+        if fragment_size <= FRAGMENT_HEADER_SIZE:
+            # Data rate too slow for fragments, they go at the fastest one
+            fragment_size = self.__max_payload_size(self._region.value.SPREADING_FACTOR_MIN) - self._codec.LORAWAN_MAX_FOPTS_LEN
+        try:
+            frames = fragment(bytes(payload), fragment_size, session.fragment_session, parity_group)
+        except ValueError as e:
+            self._logger.error(f"Uplink : {e}")
+            future.set_result(TransmitStatus.TX_PAYLOAD_ERROR)
+            return future
+        session.fragment_session = (session.fragment_session + 1) % 256
+        self._logger.info(f"Uplink : {len(payload)} bytes in {len(frames)} fragments of {fragment_size} bytes")
+
+        futures = [self.transmit(frame, confirmed, priority, FRAGMENT_FPORT, session.device) for frame in frames]
+        future.delay = max(item.delay for item in futures)
+        success = TransmitStatus.TX_NETWORK_ACK if confirmed else TransmitStatus.TX_OK
+        lock = Lock()
+        pending = [len(futures)]
+
+        def on_fragment_done(done:MacFuture):
+            # Fragments complete on the service and scheduler threads, the result is set once
+            status = done.result()
+            with lock:
+                pending[0] = pending[0] - 1
+                if future.done():
+                    return
+                if status != success:
+                    result = status
+                elif pending[0] == 0:
+                    result = success
+                else:
+                    return
+                future.set_result(result)
+
+        for item in futures:
+            item.add_done_callback(on_fragment_done)
+        return future
+
+    def max_payload_size(self, device:Device=None) -> int:
+        """
+        Returns the largest payload sent in one uplink at the current data rate (set by ADR) of the device,
+        with room left for the MAC answers in FOpts. Larger payloads go at a faster data rate or fail,
+        use `transmit_fragmented()` for them.
+
+        Args:
+            device (Device): The hosted device. Default is None (device given to the constructor).
+
+        Returns:
+            int: The payload size in bytes, 0 if the data rate leaves no room for a payload.
+        """
+        session = self.__session_of(device)
+        return max(0, self.__max_payload_size(self.__uplink_spreading_factor(session)) - self._codec.LORAWAN_MAX_FOPTS_LEN)
+
+    def stack_transmit(self, device:Device=None)->bool:
+        session = self.__session_of(device)
+        self._spreading_factor = self.__uplink_spreading_factor(session)
+        if self.__select_channel(session, self.__uplink_channels(session)) > 0:
+            # Sub-bands off: the MAC answer rides on the next uplink
+            return False
+        session.device.uplinkMacPayload = bytes([])
+        if not self.__lorawan_data_up(session, False, 0):
             return False
 
-        self._channel = self.__random_channel()
-        self._spreading_factor = self.__random_spreading_factor()
         self._logger.info(f"Stack -> internal Tx on fPort 0")
-        self.__radio_tx_mode()
-        if self.__radio_transmit(delay=UPLINK_RX1_DELAY):
+        if self._radio.call(self.__radio_send, session, session.mac.rx_delay, session.mac.rx_delay + 1):
             # Transmit ok
-            self.__radio_rx1_mode()
-            # open RX2 600 ms later
-            rx2_opening_in = (UPLINK_RX2_DELAY - UPLINK_RX1_DELAY) + 0.6
-            self.__rx2_timer = Timer(rx2_opening_in, self.__radio_rx2_timer_cb)
-            self.__rx2_timer.start()
-            self._LoRaSemaphore.release()
-            self._Mac.answer = None
+            self.__piggyback_sent(session)
             return True
         else:
             # Transmit error
-            self.__radio_rx2_mode()
-            self._LoRaSemaphore.release()
             return False
     
+    def request_link_check(self, device:Device=None):
+        """
+        Asks the network for the link margin and the number of gateways (LinkCheckReq) in the next uplink.
+        The answer is reported by `get_metrics()` under "link_check".
+        """
+        self.__session_of(device).mac.request_link_check()
+
+    def request_device_time(self, device:Device=None):
+        """
+        Asks the network for the GPS time (DeviceTimeReq) in the next uplink.
+        The answer is reported by `get_metrics()` under "device_time".
+        """
+        self.__session_of(device).mac.request_device_time()
+
     def set_logging_level(self, level:int=logging.INFO):
         """
         Sets the logging level for the `LoRaMAC`.
@@ -301,165 +450,806 @@ class LoRaMAC():
         """
         self._logger.setLevel(level)
 
+    def get_metrics(self, device:Device=None) -> dict:
+        """
+        Returns the counters and latencies measured by the `LoRaMAC`.
+
+        Args:
+            device (Device): The hosted device of the session fields (link check, MAC state...).
+                             Default is None (device given to the constructor).
+
+        Returns:
+            dict: The metrics, latencies are in seconds (see `Metrics.to_dict()`).
+
+        Example Usage:
+            metrics = LoRaWAN.get_metrics()\n
+            print(metrics["rx_done_to_callback"]["p95"])\n
+            print(metrics["airtime_last_hour"])\n
+            print(metrics["radio_on_time_last_hour"])\n
+        """
+        session = self.__session_of(device)
+        metrics = self._metrics.to_dict()
+        metrics["devices"] = len(self._sessions)
+        metrics["session_resume_pending"] = session.resume_uplinks is not None
+        metrics["piggyback_pending"] = self.__piggyback_pending(session)
+        metrics["fcnt_reserved"] = session.fcnt_reserved
+        metrics["database_pending"] = self._db.pending()
+        metrics["link_check"] = {"margin": session.mac.link_margin, "gateways": session.mac.gateway_count}
+        metrics["device_time"] = session.mac.device_time
+        metrics["mac_state"] = session.mac.to_dict()
+        metrics["airtime_last_hour"] = self._ledger.airtime_last_hour()
+        metrics["radio_on_time_last_hour"] = self._radio_on.last_hour()
+        metrics["channels"] = self._channels.to_dict()
+        return metrics
+
+
+    def __open_session(self, device:Device, on_join=None, on_transmit=None, on_receive=None) -> Session:
+        # Session of a new hosted device, restored from the database if the device is known
+        session = Session(device, self._region, on_join, on_transmit, on_receive)
+        # Get device info if exists
+        device_dict = self._db.get_device(device.DevEUI.hex())
+        if device_dict is None:
+            # Insert device info if not exists
+            self._db.insert_device(device.DevEUI.hex(), device.AppEUI.hex(), device.AppKey.hex())
+        else:
+            # Restore device if exists, FCnt is the bound reserved before the restart
+            device.set_device(device_dict)
+            session.fcnt_reserved = device.FCnt
+            session.fcnt_reserving = device.FCnt
+        self.__resume_session(session)
+        # Copied on write, the service thread iterates the sessions without lock
+        sessions = dict(self._sessions)
+        sessions[session.dev_eui] = session
+        self._sessions = sessions
+        if device.isJoined:
+            self.__set_dev_addr(session)
+        return session
+
+    def __session_of(self, device:Device) -> Session:
+        if device is None:
+            return self._session
+        session = self._sessions.get(device.DevEUI.hex())
+        if session is None:
+            raise ValueError(f"LoRaMAC : device {device.DevEUI.hex()} not hosted, see add_device()")
+        return session
+
+    def __set_dev_addr(self, session:Session):
+        # Downlinks of the DevAddr go to the session, the previous DevAddr of the session is dropped
+        sessions = {dev_addr: item for dev_addr, item in self._sessions_by_devaddr.items() if item is not session}
+        sessions[bytes(session.device.DevAddr)] = session
+        self._sessions_by_devaddr = sessions
+
+    def __resume_session(self, session:Session):
+        """
+        Keeps the session restored from the database, so the first uplink needs no join.
+        The first uplinks ask the network for a downlink (ADRACKReq), and the device joins again
+        if RESUME_MAX_UPLINKS uplinks get none.
+        """
+        device = session.device
+        if not device.isJoined:
+            return
+        if len(device.DevAddr) != 4 or len(device.NwkSKey) != 16 or len(device.AppSKey) != 16:
+            self._logger.warning(f"Session : incomplete, join needed")
+            device.isJoined = False
+            return
+        self._logger.info(f"Session restored : DevAddr = {device.DevAddr.hex()}, FCnt = {device.FCnt}")
+        state = self._db.get_mac_state(device.DevEUI.hex())
+        if state is not None and session.mac.set_state(state):
+            self.__set_max_duty_cycle(session)
+        session.resume_uplinks = 0
+        session.mac.adr_request_ack()
+        self._metrics.increment("session_resumed")
+        self._scheduler.schedule_in(0, self.__prepare_uplinks, session)
 
     def __background_task(self):
         while True:
-            
-            if not self._LoRaSemaphore.acquire(timeout=0.5):
-                time.sleep(0.5)
-                continue
 
-            time.sleep(0.2)
-            self._LoRa.wait(1)
-            if self._LoRa.available() == 0:
-                self._LoRaSemaphore.release()
-                continue
+            event = self.__radio_wait_event()
+            if isinstance(event, MacRequest):
+                self.__process_request(event)
+            elif isinstance(event, float) or (event is None and not self._irq_mode):
+                self.__process_radio(event)
+            self.__dispatch_uplink()
 
-            time.sleep(0.2)
-            self._device.downlinkPhyPayload = self.__radio_receive(delay=1)
-            if len(self._device.downlinkPhyPayload) == 0:
-                self._LoRaSemaphore.release()
-                continue
-
-            if self.__rx2_timeout_timer is not None:
-                self.__rx2_timeout_timer.cancel()
-                self.__rx2_timeout_timer = None
-            
-            if self.__rx2_timer is not None:
-                self.__rx2_timer.cancel()
-                self.__radio_rx2_mode()
-                self.__rx2_timer = None
-
-            if len(self._device.downlinkPhyPayload) < 10:
-                self._logger.error(f"Downlink PhyPayload")
-                self._LoRaSemaphore.release()
-                continue
-            
-            
-            self._LoRaSemaphore.release()
-            self.__lorawan_message_type()
-            if self._device.message_type == MessageType.JOIN_ACCEPT:
-                if self._device.isJoined:
-                    continue
-                self._device.rx2_window_timeout = -1
-                if not self.__lorawan_join_accept():
-                    if self._device.join_max_tries > 0:
-                            self.join(self._device.join_max_tries)
-                    elif callable(self._on_join):
-                        self._on_join(JoinStatus.JOIN_ACCEPT_ERROR)
-                elif callable(self._on_join):
-                        self._on_join(JoinStatus.JOIN_OK)
+    def __radio_wait_event(self):
+        """
+        Blocks the background task until a request is queued, an uplink can be sent,
+        or the radio may have something to report.
+
+        Returns:
+            MacRequest: A join request queued by `join()`.
+            RequestType: RequestType.UPLINK when `transmit()` queued an uplink.
+            float: The `time.monotonic()` timestamp of the DIO1 interrupt in IRQ mode.
+            None: The poll interval elapsed (polling mode, radio awake), the RX windows or the duty cycle wait ended,
+                or the MAC answers waited PIGGYBACK_DEADLINE for an application uplink.
+        """
+        # Nothing to poll while the radio sleeps (Class A between the RX windows)
+        timeout = None if self._irq_mode or self.__radio_asleep else RADIO_POLL_INTERVAL
+        sessions = self._sessions.values()
+        deadlines = [session.piggyback_deadline for session in sessions if session.piggyback_deadline > 0]
+        if any(session.has_uplink() for session in sessions):
+            uplink_in = max(0, max(self._rx_windows_end, self._duty_cycle_end) - time.monotonic())
+            timeout = uplink_in if timeout is None else min(timeout, uplink_in)
+        elif len(deadlines) > 0:
+            fallback_in = max(0, max(self._rx_windows_end, min(deadlines)) - time.monotonic())
+            timeout = fallback_in if timeout is None else min(timeout, fallback_in)
+        try:
+            return self._events.get(timeout=timeout)
+        except Empty:
+            return None
+
+    def __process_radio(self, rx_done_at:float):
+        payload, rx_done_at, rx_windows = self._radio.call(self.__radio_poll, rx_done_at)
+        if len(payload) == 0:
+            return
+        in_rx_windows = rx_windows is not None
+
+        frame = FrameView(payload)
+        if not frame.is_downlink():
+            # Uplinks of other nodes, proprietary or truncated frames, dropped before any crypto
+            self._logger.debug(f"Downlink PhyPayload dropped")
+            self._metrics.increment("foreign_frames")
+            return
+
+        session = self.__downlink_session(frame)
+        if session is None:
+            return
+        device = session.device
+        device.downlinkPhyPayload = payload
+        session.mac.snr = self.__rx_snr
+        session.mac.rssi = self.__rx_rssi
+        on_receive = session.on_receive if session.on_receive is not None else self._on_receive
+        # Only a valid downlink of the device of the last uplink closes its RX windows, any other frame
+        # leaves them to __rx_windows_closed_cb (join retry, NO_ACK of a confirmed uplink)
+        owns_rx_windows = in_rx_windows and session is self.__rx_session
+        device.message_type = frame.mtype
+        if device.message_type == MessageType.JOIN_ACCEPT:
+            if device.isJoined:
+                return
+            if not self.__lorawan_join_accept(session):
+                # The join is retried or failed when the RX windows close
+                self._metrics.increment("join_accept_errors")
+            else:
+                device.rx2_window_timeout = -1
+                if owns_rx_windows:
+                    self.__close_rx_windows(rx_windows)
+                self.__notify_join(session, JoinStatus.JOIN_OK)
+                # Measured once the callback returned
+                self._metrics.record("rx_done_to_callback", time.monotonic() - rx_done_at)
+        
+        elif device.message_type == MessageType.CONFIRMED_DATA_DOWN or \
+            device.message_type  == MessageType.UNCONFIRMED_DATA_DOWN:
+            if not device.isJoined:
+                return
+
+            if not self.__lorawan_data_down(session, frame):
+                if callable(on_receive):
+                    on_receive(ReceiveStatus.RX_PAYLOAD_ERROR, bytes([]))
+            else:
+                if device.message_type == MessageType.CONFIRMED_DATA_DOWN:
+                    # Only a downlink with a valid MIC is acknowledged. Cleared once an uplink carried it,
+                    # an unconfirmed downlink in between does not cancel it
+                    device.Ack = True
+                if owns_rx_windows:
+                    # The downlink closes the RX windows of the last uplink
+                    self.__close_rx_windows(rx_windows)
+                if session.repeat_request is not None:
+                    # The network received the uplink, no more NbTrans repetitions
+                    self.__notify_transmit(session, TransmitStatus.TX_OK, session.repeat_request)
+                    session.repeat_request = None
+                if owns_rx_windows:
+                    self._channels.record_downlink(self._channel, session.mac.rssi, session.mac.snr)
+                if device.AckDown:
+                    if session.uplink_request is not None:
+                        self._channels.record_result(session.uplink_request.channel, True)
+                    self.__notify_transmit(session, TransmitStatus.TX_NETWORK_ACK, session.uplink_request)
+                    session.uplink_request = None
+                if len(device.downlinkMacPayload) > 0 and callable(on_receive):
+                    on_receive(ReceiveStatus.RX_OK, device.downlinkMacPayload)
+                # Measured once the callbacks returned
+                self._metrics.record("rx_done_to_callback", time.monotonic() - rx_done_at)
             
-            elif self._device.message_type == MessageType.CONFIRMED_DATA_DOWN or \
-                self._device.message_type  == MessageType.UNCONFIRMED_DATA_DOWN:
-                if not self._device.isJoined:
-                    continue
-                if self._device.message_type == MessageType.CONFIRMED_DATA_DOWN:
-                    self._device.Ack = True
-                else:
-                    self._device.Ack = False
+            # MAC answers and the ACK wait for the next application uplink
+            if self.__piggyback_pending(session) and session.piggyback_deadline == 0:
+                session.piggyback_deadline = time.monotonic() + PIGGYBACK_DEADLINE
 
-                if not self.__lorawan_data_down():
-                    if callable(self._on_receive):
-                        self._on_receive(ReceiveStatus.RX_PAYLOAD_ERROR, bytes([]))
-                else:
-                    if self._device.AckDown and callable(self._on_transmit):
-                        self._on_transmit(TransmitStatus.TX_NETWORK_ACK)
-                    if len(self._device.downlinkMacPayload) > 0 and callable(self._on_receive):
-                        self._on_receive(ReceiveStatus.RX_OK, self._device.downlinkMacPayload)
-                
-                if self._Mac.answer is not None:
-                    self.stack_transmit()
-
-
-    def __increment_device_channel_group(self):
-        self._device.channelGroup = (self._device.channelGroup + 1) % 8
-        db = Database()
-        db.open()
-        db.update_channel_group(self._device.DevEUI.hex(), self._device.channelGroup)
-        db.close()
-        self._device.uplink_channel_min = self._region.value.UPLINK_CHANNEL_MIN + 8 * self._device.channelGroup
-        self._device.uplink_channel_max = self._device.uplink_channel_min + 7 * (self._device.channelGroup + 1)
-        if self._device.uplink_channel_max > self._region.value.UPLINK_CHANNEL_MAX:
-            self._device.channelGroup = 0
-            self._device.uplink_channel_min = self._region.value.UPLINK_CHANNEL_MIN
-            self._device.uplink_channel_max = self._region.value.UPLINK_CHANNEL_MIN + 7
-
-    def __random_channel(self) -> int:
-        return random.randint(self._device.uplink_channel_min, self._device.uplink_channel_max)
-    
-    def __random_spreading_factor(self) -> int:
-        return random.randint(self._region.value.SPREADING_FACTOR_MIN, self._region.value.SPREADING_FACTOR_MAX)
+    def __downlink_session(self, frame:FrameView) -> Session:
+        """
+        Returns the session a downlink is for: a join accept goes to the device of the last uplink (the join request),
+        a data downlink to the device of its DevAddr.
+
+        Returns:
+            Session: The session of the downlink, None if no hosted device has its DevAddr.
+        """
+        if frame.mtype == MessageType.JOIN_ACCEPT:
+            return self.__rx_session
+        DevAddr = frame.dev_addr
+        session = self._sessions_by_devaddr.get(DevAddr)
+        if session is None:
+            self._logger.debug(f"LoRaWAN : Unknown device data received, DevAddr = {DevAddr.hex()}")
+            self._metrics.increment("unknown_devaddr_downlinks")
+        return session
+
+    def __dispatch_uplink(self):
+        """
+        Sends the next queued uplink once the RX windows of the previous one are closed.
+        A pending NbTrans repetition goes first, then the queued uplinks at the ADR data rate.
+        Pending payloads for the same FPort are merged up to the maximum payload size of the data rate.
+        The uplink waits until the duty cycle of a sub-band allows it, and its spreading factor is lowered
+        until its time on air fits the dwell time of the region.
+        MAC answers and downlink ACKs get a dedicated fPort 0 uplink only when no application uplink
+        carried them within PIGGYBACK_DEADLINE.
+        With several hosted devices, the session is picked by `__next_uplink_session()`.
+        """
+        now = time.monotonic()
+        sessions = list(self._sessions.values())
+        if not any(session.has_uplink() for session in sessions):
+            for session in sessions:
+                self.__piggyback_fallback(session, now)
+            return
+        if now < self._rx_windows_end or now < self._duty_cycle_end:
+            return
+        session = self.__next_uplink_session(sessions)
+        request = session.repeat_request
+        if request is None:
+            self._spreading_factor = self.__uplink_spreading_factor(session)
+            answer = session.mac.answer
+            fopts_size = 0 if answer is None else len(answer)
+            request = session.uplinks.pop(self.__max_payload_size(self._spreading_factor) - fopts_size)
+            if request is None:
+                return
+
+            # Faster data rate for a frame too large or too long for the current one
+            frame_size = len(request.payload) + fopts_size
+            while (frame_size > self.__max_payload_size(self._spreading_factor) or \
+                   self._ledger.exceeds_dwell_time(self.__uplink_airtime(frame_size))) and \
+                    self._spreading_factor > self._region.value.SPREADING_FACTOR_MIN:
+                self._spreading_factor = self._spreading_factor - 1
+            if frame_size > self.__max_payload_size(self._spreading_factor):
+                self._logger.error(f"Uplink : {frame_size} bytes exceed the maximum payload size")
+                self.__notify_transmit(session, TransmitStatus.TX_PAYLOAD_ERROR, request)
+                return
+            airtime = self.__uplink_airtime(frame_size)
+            if self._ledger.exceeds_dwell_time(airtime):
+                self._logger.error(f"Uplink : {airtime * 1000:.0f} ms exceeds the dwell time")
+                self.__notify_transmit(session, TransmitStatus.TX_PAYLOAD_ERROR, request)
+                return
+
+        delay = self.__select_channel(session, self.__uplink_channels(session))
+        if delay > 0:
+            self._logger.info(f"Uplink delayed {delay:.1f} s by duty cycle")
+            self._metrics.increment("duty_cycle_delays")
+            self._duty_cycle_end = now + delay
+            if request is not session.repeat_request:
+                session.uplinks.requeue(request)
+            return
+        self.__process_uplink(session, request)
+
+    def __next_uplink_session(self, sessions:list) -> Session:
+        """
+        Picks the session sending the next uplink: the highest priority first (NbTrans repetitions, then
+        the queued uplinks by `Priority`), in turn between the sessions of the same priority.
+
+        Returns:
+            Session: The session with the next uplink, None if no session has one.
+        """
+        count = len(sessions)
+        chosen = None
+        chosen_priority = None
+        for i in range(count):
+            index = (self.__session_turn + i) % count
+            priority = sessions[index].uplink_priority()
+            if priority is not None and (chosen is None or priority < chosen_priority):
+                chosen = index
+                chosen_priority = priority
+        if chosen is None:
+            return None
+        # The next turn starts after the chosen session
+        self.__session_turn = (chosen + 1) % count
+        return sessions[chosen]
+
+    def __max_payload_size(self, spreading_factor:int) -> int:
+        # Maximum FRMPayload and FOpts size, bounded by the wrapper buffer
+        return min(self._region.max_payload_size(spreading_factor),
+                   self._codec.LORAWAN_BUFFER_SIZE_MAX - LORAWAN_FRAME_OVERHEAD)
+
+    def __uplink_airtime(self, payload_size:int) -> float:
+        # Time on air of an uplink carrying `payload_size` bytes of FRMPayload and FOpts
+        return time_on_air(self._spreading_factor, self._region.value.UPLINK_BANDWIDTH,
+                           payload_size + LORAWAN_FRAME_OVERHEAD, LORA_CODING_RATE, LORA_PREAMBLE_SIZE)
+
+    def __uplink_channels(self, session:Session) -> list:
+        # Channels of the device channel group enabled by the ADR channel mask
+        enabled = session.mac.link_adr.channels
+        if self._region == Region.EU868:
+            # All the channels, including those added by NewChannelReq
+            return sorted(enabled)
+        channels = [channel for channel in range(session.device.uplink_channel_min, session.device.uplink_channel_max + 1)
+                    if channel in enabled]
+        if len(channels) == 0:
+            channels = sorted(enabled)
+        return channels
+
+    def __join_channels(self, session:Session) -> range:
+        if self._region == Region.EU868:
+            return range(self._region.value.UPLINK_CHANNEL_MIN, Region.EU868.value.JOIN_CHANNEL_MAX + 1)
+        return self.__uplink_channels(session)
+
+    def __select_channel(self, session:Session, channels:list) -> float:
+        """
+        Sets `_channel` to the `ChannelSelector` choice among the channels of `channels`
+        whose sub-band duty cycle allows a transmission now.
+
+        Returns:
+            float: 0 if a channel is selected, else the number of seconds until one of `channels` is allowed.
+        """
+        now = time.monotonic()
+        delays = {channel: self._ledger.delay(session.mac.uplink_frequency(channel), now) for channel in channels}
+        free = [channel for channel, delay in delays.items() if delay == 0]
+        if len(free) == 0:
+            return min(delays.values())
+        self._channel = self._channels.select(free, now)
+        return 0
+
+    def __transmit_delay(self, session:Session, channels:list) -> float:
+        # Expected wait of a new request for the RX windows and the duty cycle
+        now = time.monotonic()
+        duty_cycle_delay = min(self._ledger.delay(session.mac.uplink_frequency(channel), now) for channel in channels)
+        return max(0, self._rx_windows_end - now, duty_cycle_delay)
+
+    def __process_request(self, request:MacRequest):
+        if request.type == RequestType.JOIN:
+            self.__process_join(request.session, request)
+
+    def __process_join(self, session:Session, request:MacRequest):
+        device = session.device
+        previous = session.join_request
+        if previous is not None and previous is not request and not previous.future.done():
+            # A superseded join completes with the outcome of the new one
+            request.future.add_done_callback(lambda future: previous.complete(future.result()))
+        session.join_request = request
+        device.join_max_tries = request.max_tries - 1
+        if device.isJoined:
+            self.__save_is_joined(session, False)
+            # The uplinks prepared for the previous session are lost
+            self._codec.release_session(device.DevAddr)
+        device.isJoined = False
+        session.resume_uplinks = None
+        delay = self.__select_channel(session, self.__join_channels(session))
+        if delay > 0:
+            # Join again at the first instant the duty cycle allows
+            self._logger.info(f"Join delayed {delay:.1f} s by duty cycle")
+            self._metrics.increment("duty_cycle_delays")
+            self._scheduler.schedule_in(delay, self._events.put, request)
+            return
+        if time.monotonic() < self._rx_windows_end and self.__rx_session is not session:
+            # The RX windows of another device are open, join once they close
+            self._scheduler.schedule_in(self._rx_windows_end - time.monotonic(), self._events.put, request)
+            return
+        if not self.__lorawan_join_request(session):
+            self.__notify_join(session, JoinStatus.JOIN_REQUEST_ERROR)
+            return
+        
+        self._spreading_factor = self._region.value.SPREADING_FACTOR_MAX
+        
+        self._logger.info(f"Joining...")
+        if not self._radio.call(self.__radio_send, session, JOIN_RX1_DELAY, JOIN_RX2_DELAY):
+            # Transmit error
+            if device.join_max_tries > 0:
+                self.__retry_join(session)
+            else:
+                self.__notify_join(session, JoinStatus.JOIN_MAX_TRY_ERROR)
+
+    def __piggyback_pending(self, session:Session) -> bool:
+        return session.mac.pending or (session.device.Ack and session.device.isJoined)
+
+    def __piggyback_sent(self, session:Session):
+        # The uplink carried the MAC answers and the ACK of the last confirmed downlink
+        session.mac.answer_sent()
+        session.device.Ack = False
+        # MAC answers beyond FOpts wait for the next uplink
+        session.piggyback_deadline = time.monotonic() + PIGGYBACK_DEADLINE if session.mac.pending else 0
+
+    def __piggyback_fallback(self, session:Session, now:float):
+        if session.piggyback_deadline == 0 or now < self._rx_windows_end:
+            return
+        if not self.__piggyback_pending(session):
+            session.piggyback_deadline = 0
+        elif now >= session.piggyback_deadline:
+            self._metrics.increment("dedicated_mac_frames")
+            if not self.stack_transmit(session.device):
+                # Sub-bands off or radio error: try again after another deadline
+                session.piggyback_deadline = now + PIGGYBACK_DEADLINE
+
+    def __retry_join(self, session:Session):
+        # Queue the join in progress again with its remaining tries
+        session.join_request.max_tries = session.device.join_max_tries
+        self._events.put(session.join_request)
+
+    def __process_uplink(self, session:Session, request:MacRequest):
+        device = session.device
+        session.repeat_request = None
+        if not device.isJoined:
+            self._logger.debug(f"Uplink : join error")
+            self.__notify_transmit(session, TransmitStatus.TX_JOIN_ERROR, request)
+            return
+        
+        if request.phy_payload is None:
+            device.uplinkMacPayload = request.payload
+            if not self.__lorawan_data_up(session, request.confirmed, request.fport):
+                self.__notify_transmit(session, TransmitStatus.TX_PAYLOAD_ERROR, request)
+                return
+            request.phy_payload = device.uplinkPhyPayload
+        else:
+            # NbTrans repetition: same frame and FCnt
+            device.uplinkPhyPayload = request.phy_payload
+        
+        self._logger.info(f"Transmitting...")
+        if self._radio.call(self.__radio_send, session, session.mac.rx_delay, session.mac.rx_delay + 1):
+            # Transmit ok
+            if request.transmissions == 0 and self.__piggyback_pending(session):
+                self._metrics.increment("piggybacked_mac_frames")
+            self.__piggyback_sent(session)
+            request.transmissions = request.transmissions + 1
+            request.channel = self._channel
+            self._channels.record_uplink(self._channel, request.confirmed)
+            if self.__first_uplink:
+                self.__first_uplink = False
+                self._metrics.record("start_to_first_uplink", time.monotonic() - self._started_at)
+            if session.resume_uplinks is not None and request.transmissions == 1:
+                self.__check_resumed_session(session)
+            if session.uplink_request is not None:
+                # The previous confirmed uplink can no longer be acknowledged
+                self._channels.record_result(session.uplink_request.channel, False)
+                self.__notify_transmit(session, TransmitStatus.TX_NETWORK_NO_ACK, session.uplink_request)
+                session.uplink_request = None
+            if request.confirmed:
+                session.uplink_request = request
+            elif request.transmissions < session.mac.link_adr.nb_tx:
+                session.repeat_request = request
+            else:
+                self.__notify_transmit(session, TransmitStatus.TX_OK, request)
+        else:
+            # Transmit error
+            self.__notify_transmit(session, TransmitStatus.TX_RADIO_ERROR, request)
+
+    def __check_resumed_session(self, session:Session):
+        # Counts the uplinks of the restored session until a downlink proves it alive
+        session.resume_uplinks = session.resume_uplinks + 1
+        if session.resume_uplinks < RESUME_MAX_UPLINKS:
+            return
+        self._logger.warning(f"Session : no downlink after {session.resume_uplinks} uplinks, joining")
+        session.resume_uplinks = None
+        self._metrics.increment("session_resume_failed")
+        self.join(max_tries=RESUME_JOIN_MAX_TRIES, forced=True, device=session.device)
+
+    def __set_max_duty_cycle(self, session:Session):
+        # The radio keeps the strictest DutyCycleReq of the hosted devices
+        max_duty_cycle = max([item.mac.max_duty_cycle for item in self._sessions.values()] + [session.mac.max_duty_cycle])
+        self._ledger.set_max_duty_cycle(1 / (2 ** max_duty_cycle))
+
+    def __save_mac_state(self, session:Session):
+        # MAC state set by the network, restored with the session
+        self.__set_max_duty_cycle(session)
+        self._db.update_mac_state(session.dev_eui, session.mac.to_dict())
+
+    def __prepare_uplinks(self, session:Session):
+        # Scheduler thread, the codec computes the keystreams of the next uplinks while the radio is idle
+        device = session.device
+        if not device.isJoined:
+            return
+        try:
+            self._codec.prepare_session(device.DevAddr, device.NwkSKey, device.AppSKey, device.FCnt)
+        except Exception as e:
+            self._logger.error(f"LoRaWAN : Prepare uplinks {e}")
+
+    def __reserve_f_cnt(self, session:Session):
+        """
+        Queues the next FCnt bound, FCNT_RESERVE_BLOCK above the last one, the uplinks up to this bound need no database write.
+        After a power cut the device resumes from the bound, so no frame counter is used twice.
+        The bound is queued half a block ahead, so it is written before an uplink needs it.
+        """
+        device = session.device
+        reserved = max(session.fcnt_reserving, device.FCnt) + FCNT_RESERVE_BLOCK
+        self._db.update_f_cnt(device.DevEUI.hex(), reserved)
+        session.fcnt_reserving = reserved
+        self._metrics.increment("fcnt_writes")
+
+    def __wait_f_cnt(self, session:Session) -> bool:
+        # Barrier, an uplink above the written bound waits for the queued bound to be durable
+        start = time.monotonic()
+        reserved = self._db.flush(durable=True)
+        if reserved:
+            session.fcnt_reserved = session.fcnt_reserving
+        else:
+            self._logger.error(f"Database : FCnt {session.fcnt_reserving} not reserved")
+        self._metrics.record("fcnt_flush_wait", time.monotonic() - start)
+        return reserved
+
+    def __save_is_joined(self, session:Session, isJoined:bool):
+        self._db.update_is_joined(session.dev_eui, isJoined)
+
+    def __notify_join(self, session:Session, status:JoinStatus, request:MacRequest=None):
+        if request is None:
+            request = session.join_request
+        if request is not None:
+            request.complete(status)
+        on_join = session.on_join if session.on_join is not None else self._on_join
+        if callable(on_join):
+            on_join(status)
+
+    def __notify_transmit(self, session:Session, status:TransmitStatus, request:MacRequest=None):
+        if request is not None:
+            request.complete(status)
+        on_transmit = session.on_transmit if session.on_transmit is not None else self._on_transmit
+        if callable(on_transmit):
+            on_transmit(status)
+
+
+    def __increment_device_channel_group(self, session:Session):
+        device = session.device
+        device.channelGroup = (device.channelGroup + 1) % 8
+        self._db.update_channel_group(device.DevEUI.hex(), device.channelGroup)
+        device.uplink_channel_min = self._region.value.UPLINK_CHANNEL_MIN + 8 * device.channelGroup
+        device.uplink_channel_max = device.uplink_channel_min + 7 * (device.channelGroup + 1)
+        if device.uplink_channel_max > self._region.value.UPLINK_CHANNEL_MAX:
+            device.channelGroup = 0
+            device.uplink_channel_min = self._region.value.UPLINK_CHANNEL_MIN
+            device.uplink_channel_max = self._region.value.UPLINK_CHANNEL_MIN + 7
+
+    def __uplink_spreading_factor(self, session:Session) -> int:
+        # Spreading factor of the data rate set by LinkADRReq or the ADR backoff
+        return self._region.spreading_factor(session.mac.link_adr.data_rate)
+
+    def __uplink_tx_power(self) -> int:
+        # Radio thread, TX power of the device sending the uplink
+        return min(LORA_DEFAULT_TX_POWER, self._region.tx_power(self.__rx_session.mac.link_adr.tx_power))
             
 
 ############################## API to LoRaRF Library
+    def __radio_send(self, session:Session, rx1_delay:float, rx2_delay:float) -> bool:
+        """
+        Transmits the uplink PHYPayload of `session`, accounts its airtime in the duty cycle ledger and schedules
+        RX1 and RX2 at `rx1_delay` and `rx2_delay` seconds from the TX done instant.
+        The RX windows belong to `session` until the next uplink. Runs on the radio thread.
+        """
+        self.__rx_session = session
+        self.__radio_tx_mode()
+        tx_done_at = self.__radio_transmit()
+        if tx_done_at is None:
+            self._logger.warning(f"TX  : no TX done before timeout")
+            self.__busy_in_tx = False
+            self.__radio_idle_mode()
+            return False
+        self.__busy_in_tx = False
+        airtime = time_on_air(self._spreading_factor, self._region.value.UPLINK_BANDWIDTH,
+                              len(session.device.uplinkPhyPayload), LORA_CODING_RATE, LORA_PREAMBLE_SIZE)
+        self._ledger.record(session.mac.uplink_frequency(self._channel), airtime, tx_done_at)
+        self._metrics.record("tx_airtime", airtime)
+        self.__rx_windows = [
+            self._scheduler.schedule(tx_done_at + rx1_delay - RX_WINDOW_MARGIN, self._radio.submit, self.__radio_rx1_window_cb, self.__tx_sequence),
+            self._scheduler.schedule(tx_done_at + rx2_delay - RX_WINDOW_MARGIN, self._radio.submit, self.__radio_rx2_window_cb, self.__tx_sequence),
+            self._scheduler.schedule(tx_done_at + rx2_delay + RX2_WINDOW_DURATION, self.__rx_windows_closed_cb, self.__tx_sequence, session),
+        ]
+        self._rx_windows_end = tx_done_at + rx2_delay + RX2_WINDOW_DURATION
+        # The next uplinks of the session are encrypted ahead while waiting for RX1
+        self._scheduler.schedule(tx_done_at, self.__prepare_uplinks, session)
+        return True
+
+    def __cancel_rx_windows(self):
+        for event in self.__rx_windows:
+            event.cancel()
+        self.__rx_windows = []
+
     def __radio_tx_mode(self):
         self.__busy_in_tx = True
-        if self.__rx2_timer is not None:
-            self.__rx2_timer.cancel()
-            self.__rx2_timer = None
-        self._logger.debug(f"TX  : FREQ = {self._region.uplink_frequency(self._channel)} Hz, SF = {self._spreading_factor}")
+        self.__radio_wake()
+        # Windows of the previous uplink are dropped, late callbacks see a new sequence
+        self.__cancel_rx_windows()
+        self.__tx_sequence = self.__tx_sequence + 1
+        mac = self.__rx_session.mac
+        self._logger.debug(f"TX  : FREQ = {mac.uplink_frequency(self._channel)} Hz, SF = {self._spreading_factor}, POWER = {self.__uplink_tx_power()} dBm")
         self._LoRa.setSyncWord(LORA_SYNC_WORD)
-        self._LoRa.setTxPower(LORA_DEFAULT_TX_POWER, self._LoRa.TX_POWER_SX1262)
-        self._LoRa.setFrequency(self._region.uplink_frequency(self._channel))
+        self._LoRa.setTxPower(self.__uplink_tx_power(), self._LoRa.TX_POWER_SX1262)
+        self._LoRa.setFrequency(mac.uplink_frequency(self._channel))
         self._LoRa.setLoRaModulation(self._spreading_factor, self._region.value.UPLINK_BANDWIDTH, LORA_CODING_RATE)
         self._LoRa.setLoRaPacket(self._LoRa.HEADER_EXPLICIT, LORA_PREAMBLE_SIZE, LORA_PAYLOAD_MAX_SIZE, UPLINK_CRC_TYPE, UPLINK_IQ_POLARITY)
     
     def __radio_rx1_mode(self):
-        self.__busy_in_tx = False
-        self._logger.debug(f"RX1 : FREQ = {self._region.downlink_frequency(self._channel)} Hz, SF = {self._spreading_factor}")
+        mac = self.__rx_session.mac
+        rx1_spreading_factor = mac.rx1_spreading_factor(self._spreading_factor)
+        self._logger.debug(f"RX1 : FREQ = {mac.downlink_frequency(self._channel)} Hz, SF = {rx1_spreading_factor}")
+        self.__radio_wake()
         #self._LoRa.purge(LORA_PAYLOAD_MAX_SIZE)
         self._LoRa.setSyncWord(LORA_SYNC_WORD)
         self._LoRa.setRxGain(self._LoRa.RX_GAIN_BOOSTED)
-        self._LoRa.setFrequency(self._region.downlink_frequency(self._channel))
-        self._LoRa.setLoRaModulation(self._spreading_factor, self._region.value.DOWNLINK_BANDWIDTH, LORA_CODING_RATE)
+        self._LoRa.setFrequency(mac.downlink_frequency(self._channel))
+        self._LoRa.setLoRaModulation(rx1_spreading_factor, self._region.value.DOWNLINK_BANDWIDTH, LORA_CODING_RATE)
         self._LoRa.setLoRaPacket(self._LoRa.HEADER_EXPLICIT, LORA_PREAMBLE_SIZE, LORA_PAYLOAD_MAX_SIZE, DOWNLINK_CRC_TYPE, DOWNLINK_IQ_POLARITY)
-        self._LoRa.request(self._LoRa.RX_CONTINUOUS)
+        self._LoRa.setLoRaSymbNumTimeout(self.__rx_symbol_timeout(rx1_spreading_factor, self._region.value.DOWNLINK_BANDWIDTH))
+        self._LoRa.request(self._LoRa.RX_SINGLE)
+
+    def __radio_rx1_window_cb(self, tx_sequence:int):
+        # Radio thread
+        if not self.__busy_in_tx and tx_sequence == self.__tx_sequence:
+            self.__radio_rx1_mode()
+        self.__wake_polling()
+
+    def __radio_rx2_window_cb(self, tx_sequence:int):
+        # Radio thread
+        if not self.__busy_in_tx and tx_sequence == self.__tx_sequence:
+            self._logger.debug(f"RX2 window opens")
+            self.__radio_rx2_mode(single=True)
+        self.__wake_polling()
+
+    def __close_rx_windows(self, tx_sequence:int):
+        # A valid downlink for the device of the last uplink: the remaining windows are not needed
+        if self._radio.call(self.__radio_rx_windows_cancel, tx_sequence):
+            self._rx_windows_end = 0
+
+    def __radio_rx_windows_cancel(self, tx_sequence:int) -> bool:
+        # Radio thread, returns False if the windows of `tx_sequence` were already closed
+        if self.__busy_in_tx or tx_sequence != self.__tx_sequence or len(self.__rx_windows) == 0:
+            return False
+        self.__cancel_rx_windows()
+        self.__radio_idle_mode()
+        return True
+
+    def __radio_rx_windows_close(self, tx_sequence:int) -> bool:
+        # Radio thread, returns False if the windows of `tx_sequence` were already dropped
+        if self.__busy_in_tx or tx_sequence != self.__tx_sequence or len(self.__rx_windows) == 0:
+            return False
+        self._logger.debug(f"RX windows closed")
+        self.__rx_windows = []
+        self.__radio_idle_mode()
+        return True
+
+    def __rx_windows_closed_cb(self, tx_sequence:int, session:Session):
+        if not self._radio.call(self.__radio_rx_windows_close, tx_sequence):
+            return
+        if session.device.isJoined and session.uplink_request is not None:
+            self._channels.record_result(session.uplink_request.channel, False)
+            self.__notify_transmit(session, TransmitStatus.TX_NETWORK_NO_ACK, session.uplink_request)
+            session.uplink_request = None
+        if not session.device.isJoined: 
+            if session.device.join_max_tries > 0:
+                self.__retry_join(session)
+            else:
+                self.__notify_join(session, JoinStatus.JOIN_MAX_TRY_ERROR)
+        # Wake the service thread for the queued uplinks
+        self._events.put(RequestType.UPLINK)
+
+    def __rx_symbol_timeout(self, spreading_factor:int, bandwidth:int) -> int:
+        # Preamble plus the early opening margin on both sides, in LoRa symbols
+        symbol_time = (2 ** spreading_factor) / bandwidth
+        symbols = LORA_PREAMBLE_SIZE + math.ceil(2 * RX_WINDOW_MARGIN / symbol_time)
+        return min(symbols, 255)
+
+    def __rx_listen_periods(self, spreading_factor:int, bandwidth:int) -> tuple:
+        # RX and sleep periods (ms) of the duty cycled receive: the radio wakes at least twice per preamble
+        symbol_time = (2 ** spreading_factor) / bandwidth
+        rx_period = max(1, math.ceil(RX_LISTEN_SYMBOLS * symbol_time * 1000))
+        sleep_period = max(0, math.floor((LORA_PREAMBLE_SIZE - 2 * RX_LISTEN_SYMBOLS) * symbol_time * 1000))
+        return rx_period, sleep_period
 
-    def __radio_rx2_timer_cb(self)-> bool:
+    def __radio_irq_cb(self):
+        # Called from the GPIO thread on DIO1 rising edge, no SPI access here
         if self.__busy_in_tx:
+            # TX done, the radio thread waits for it in __radio_transmit()
+            self._tx_done_at = time.monotonic()
+            self._tx_done.set()
             return
-        self._logger.debug(f"RX2 timer expires")
-        self.__radio_rx2_mode()
-        if self._device.isJoined and self._device.confirmed_uplink:
-            self._device.confirmed_uplink = False
-            self._device.waiting_for_ack = True
-            self.__rx2_timeout_timer = Timer(UPLINK_RX2_DELAY, self.__rx2_timeout_timer_cb)
-            self.__rx2_timeout_timer.start()
-        if not self._device.isJoined:
-            self.__rx2_timeout_timer = Timer(JOIN_RX2_DELAY, self.__rx2_timeout_timer_cb)
-            self.__rx2_timeout_timer.start()
-
-    def __rx2_timeout_timer_cb(self)-> bool:
-        self._logger.debug(f"RX2 window timeout")
-        if self._device.isJoined and self._device.waiting_for_ack and not self._device.AckDown:
-            self._device.waiting_for_ack = False
-            if callable(self._on_transmit):
-                self._on_transmit(TransmitStatus.TX_NETWORK_NO_ACK)
-        if not self._device.isJoined: 
-            if self._device.join_max_tries > 0:
-                self.join(self._device.join_max_tries)
-            elif callable(self._on_join):
-                self._on_join(JoinStatus.JOIN_MAX_TRY_ERROR)
-
-    def __radio_rx2_mode(self)-> bool:
-        self._logger.debug(f"RX2 : FREQ = {self._region.value.RX2_FREQUENCY} Hz, SF = {self._region.value.RX2_SPREADING_FACTOR}")
+        self._metrics.increment("radio_irq")
+        self._events.put(time.monotonic())
+
+    def __radio_idle_mode(self):
+        # Radio state between the RX windows of two uplinks
+        if self._device_class == DeviceClass.CLASS_C:
+            self.__radio_rx2_mode()
+        elif self._device_class == DeviceClass.CLASS_C_LISTEN:
+            self.__radio_rx2_mode(listen=True)
+        else:
+            self.__radio_sleep()
+
+    def __radio_sleep(self):
+        if self.__radio_asleep:
+            return
+        self._logger.debug(f"Radio sleeps (warm start)")
+        self._LoRa.sleep(self._LoRa.SLEEP_WARM_START)
+        self.__radio_asleep = True
+        self._radio_on.off()
+
+    def __radio_wake(self, ratio:float=1.0):
+        if self.__radio_asleep:
+            # Warm start: the radio configuration is retained
+            self._LoRa.wake()
+            self.__radio_asleep = False
+        self._radio_on.on(ratio)
+
+    def __wake_polling(self):
+        # The service thread does not poll a sleeping radio, wake it for the RX window just opened
+        if not self._irq_mode:
+            self._events.put(RequestType.UPLINK)
+
+    def __radio_rx2_mode(self, single:bool=False, listen:bool=False):
+        # The RX2 window of an uplink follows the device that sent it, Class C listens with the first device
+        mac = self.__rx_session.mac if single else self._session.mac
+        self._logger.debug(f"RX2 : FREQ = {mac.rx2_frequency} Hz, SF = {mac.rx2_spreading_factor()}")
+        rx_period, sleep_period = self.__rx_listen_periods(mac.rx2_spreading_factor(), self._region.value.DOWNLINK_BANDWIDTH)
+        self.__radio_wake(rx_period / (rx_period + sleep_period) if listen else 1.0)
         #self._LoRa.purge(LORA_PAYLOAD_MAX_SIZE)
         self._LoRa.setSyncWord(LORA_SYNC_WORD)
         self._LoRa.setRxGain(self._LoRa.RX_GAIN_BOOSTED)
-        self._LoRa.setFrequency(self._region.value.RX2_FREQUENCY)
-        self._LoRa.setLoRaModulation(self._region.value.RX2_SPREADING_FACTOR, self._region.value.DOWNLINK_BANDWIDTH, LORA_CODING_RATE)
+        self._LoRa.setFrequency(mac.rx2_frequency)
+        self._LoRa.setLoRaModulation(mac.rx2_spreading_factor(), self._region.value.DOWNLINK_BANDWIDTH, LORA_CODING_RATE)
         self._LoRa.setLoRaPacket(self._LoRa.HEADER_EXPLICIT, LORA_PREAMBLE_SIZE, LORA_PAYLOAD_MAX_SIZE, DOWNLINK_CRC_TYPE, DOWNLINK_IQ_POLARITY)
-        self._LoRa.request(self._LoRa.RX_CONTINUOUS)
+        if single:
+            self._LoRa.setLoRaSymbNumTimeout(self.__rx_symbol_timeout(mac.rx2_spreading_factor(), self._region.value.DOWNLINK_BANDWIDTH))
+            self._LoRa.request(self._LoRa.RX_SINGLE)
+        elif listen:
+            self._LoRa.setLoRaSymbNumTimeout(0)
+            self._LoRa.listen(rx_period, sleep_period)
+        else:
+            self._LoRa.setLoRaSymbNumTimeout(0)
+            self._LoRa.request(self._LoRa.RX_CONTINUOUS)
+
+    def __radio_poll(self, rx_done_at:float) -> tuple:
+        """
+        Reads the packet received by the radio, if any. Runs on the radio thread.
+
+        Returns:
+            tuple: The packet (empty if none), its RX done instant and the sequence of the uplink whose RX windows
+                   were open when it was received (None outside the RX windows).
+        """
+        if self.__radio_asleep:
+            # Any SPI access would wake the radio
+            return bytes([]), rx_done_at, None
+        # IRQ mode: DIO1 rose, the IRQ status is read here
+        self._LoRa.wait(RADIO_POLL_TIMEOUT)
+        if self._LoRa.available() == 0:
+            return bytes([]), rx_done_at, None
 
-    def __radio_transmit(self, delay:int)-> bool:
+        if rx_done_at is None:
+            # Polling mode: the RX done instant is only known once polled
+            rx_done_at = time.monotonic()
+            time.sleep(0.2)
+        payload = self.__radio_receive(delay=1)
+        if len(payload) == 0:
+            return payload, rx_done_at, None
+
+        if len(self.__rx_windows) > 0:
+            # Packet received in RX1 or RX2: the windows stay scheduled until the packet is validated
+            return payload, rx_done_at, self.__tx_sequence
+        if self._device_class == DeviceClass.CLASS_C_LISTEN:
+            # The duty cycled receive stops after a packet
+            self.__radio_idle_mode()
+        return payload, rx_done_at, None
+
+    def __radio_transmit(self) -> float:
+        """
+        Transmits the uplink PHYPayload and waits for TX done.
+
+        Returns:
+            float: The `time.monotonic()` instant of TX done, None on timeout.
+        """
+        self._tx_done.clear()
         self._LoRa.beginPacket()
-        self._LoRa.write(list(self._device.uplinkPhyPayload), len(self._device.uplinkPhyPayload))
-        self._LoRa.endPacket()
-        self._logger.debug(f"UP  : PHYPAYLOAD = {self._device.uplinkPhyPayload.hex()}")
-        time.sleep(delay - 0.4)
-        self._LoRa.wait(0.1)
-        return True
+        phy_payload = self.__rx_session.device.uplinkPhyPayload
+        self._LoRa.write(list(phy_payload), len(phy_payload))
+        if not self._LoRa.endPacket():
+            return None
+        self._logger.debug(f"UP  : PHYPAYLOAD = {phy_payload.hex()}")
+        if self._irq_mode:
+            if not self._tx_done.wait(TX_DONE_TIMEOUT):
+                return None
+            # Reads the TX done status and restores the RF switch
+            self._LoRa.wait(RADIO_POLL_TIMEOUT)
+            return self._tx_done_at
+        deadline = time.monotonic() + TX_DONE_TIMEOUT
+        while not self._LoRa.wait(RADIO_POLL_TIMEOUT):
+            if time.monotonic() > deadline:
+                return None
+        return time.monotonic()
 
     def __radio_receive(self, delay:int)-> bytes:
         self._LoRa.wait()
@@ -481,8 +1271,8 @@ class LoRaMAC():
             self._LoRa.clearDeviceErrors()
             self._LoRa.purge(self._LoRa.available())
             return bytes([])
-        self._Mac.snr = self._LoRa.snr()
-        self._Mac.rssi = self._LoRa.packetRssi()
+        self.__rx_snr = self._LoRa.snr()
+        self.__rx_rssi = self._LoRa.packetRssi()
         rx_length = self._LoRa.available()
         rx_bytes = self._LoRa.get(rx_length)
         self._logger.info(f"Rx bytes[{rx_length}]: {rx_bytes.hex()}")
@@ -490,107 +1280,125 @@ class LoRaMAC():
         
 ############################## API using LoRaMAC Wrapper Class to C Shared Library
 
-    def __lorawan_message_type(self)->bool:
+    def __lorawan_join_request(self, session:Session) -> bool:
+        device = session.device
         try:
-            self._device.message_type = WrapperLoRaMAC.message_type(self._device.downlinkPhyPayload)
-            return True
-        except:
-            self._device.message_type = MessageType.PROPRIETARY
-            self._logger.error(f"LoRaWAN : Message Type")
-            return False
-
-    def __lorawan_join_request(self) -> bool:
-        try:
-            self._device.DevNonce = random.randint(1, 65535)
-            response = WrapperLoRaMAC.join_request(self._device.DevEUI, self._device.AppEUI, self._device.AppKey, self._device.DevNonce)
-            db = Database()
-            db.open()
-            db.update_dev_nonce(self._device.DevEUI.hex(), self._device.DevNonce)
-            db.close()
+            device.DevNonce = random.randint(1, 65535)
+            response = self._codec.join_request(device.DevEUI, device.AppEUI, device.AppKey, device.DevNonce)
+            self._db.update_dev_nonce(device.DevEUI.hex(), device.DevNonce)
+            # The DevNonce is written before the join request is sent, it is never used twice
+            if not self._db.flush(durable=True):
+                self._logger.error(f"Database : DevNonce {device.DevNonce} not saved")
+                return False
             if response["PHYPayload"] is None:
                 self._logger.debug(f"LoRaWAN : JoinRequest Failed")
                 return False
-            self._device.uplinkPhyPayload = response["PHYPayload"]
+            device.uplinkPhyPayload = response["PHYPayload"]
             return True
         except:
             self._logger.error(f"LoRaWAN : Join Request")
             return False
 
-    def __lorawan_join_accept(self) -> bool:
+    def __lorawan_join_accept(self, session:Session) -> bool:
+        device = session.device
         try:
-            response = WrapperLoRaMAC.join_accept(self._device.downlinkPhyPayload, self._device.AppKey, self._device.DevNonce)
+            response = self._codec.join_accept(device.downlinkPhyPayload, device.AppKey, device.DevNonce)
             if response is None:
                 self._logger.debug(f"LoRaWAN : JoinAccept Failed")
                 return False
-            self._device.isJoined = True
-            self._device.DevAddr = bytes(response["DevAddr"])
-            self._device.NwkSKey = bytes(response["NwkSKey"])
-            self._device.AppSKey = bytes(response["AppSKey"])
-            self._device.FCnt = 0
-            db = Database()
-            db.open()
-            db.update_session_keys(self._device.DevEUI.hex(), self._device.DevAddr.hex(), 
-                                        self._device.NwkSKey.hex(), self._device.AppSKey.hex())
-            db.update_f_cnt(self._device.DevEUI.hex(), self._device.FCnt)
-            db.close()
+            device.isJoined = True
+            device.DevAddr = bytes(response["DevAddr"])
+            device.NwkSKey = bytes(response["NwkSKey"])
+            device.AppSKey = bytes(response["AppSKey"])
+            # RxDelay 0 means the default 1 s
+            device.RxDelay = max(UPLINK_RX1_DELAY, response["RxDelay"] & 0x0F)
+            # A new session starts from the default MAC state and the join accept DLSettings
+            session.mac.reset(response["RX1DROffset"], response["RX2DataRate"], device.RxDelay)
+            self.__set_dev_addr(session)
+            self.__save_mac_state(session)
+            device.FCnt = 0
+            # No downlink of the new session to acknowledge yet
+            device.Ack = False
+            self._db.update_session_keys(device.DevEUI.hex(), device.DevAddr.hex(), 
+                                         device.NwkSKey.hex(), device.AppSKey.hex())
+            session.fcnt_reserved = 0
+            session.fcnt_reserving = 0
+            self.__reserve_f_cnt(session)
+            self._db.update_is_joined(device.DevEUI.hex(), True)
+            session.resume_uplinks = None
+            self._scheduler.schedule_in(0, self.__prepare_uplinks, session)
             return True
         except Exception as e:
             self._logger.error(f"LoRaWAN : Join Accept {e}")
             return False
 
 
-    def __lorawan_data_up(self, confirmed:bool=False, fPort:int=None) -> bool:
+    def __lorawan_data_up(self, session:Session, confirmed:bool=False, fPort:int=None) -> bool:
+        device = session.device
         try:
-            self._device.FCnt = self._device.FCnt + 1
-            self._device.confirmed_uplink = confirmed
+            device.FCnt = device.FCnt + 1
+            device.confirmed_uplink = confirmed
+            adr_ack_req = session.mac.adr_uplink() if ADR_ENABLED else False
             if fPort is None:
-                fPort = self._device.FPort
+                fPort = device.FPort
             if fPort is None:
                 fPort = 0
             if not confirmed:
-                response =  WrapperLoRaMAC.unconfirmed_data_up(self._device.uplinkMacPayload, self._device.FCnt, fPort, 
-                                                            self._device.DevAddr, self._device.NwkSKey,self._device.AppSKey,
-                                                            adr=False, ack=self._device.Ack, fOpts=self._Mac.answer)
+                response =  self._codec.unconfirmed_data_up(device.uplinkMacPayload, device.FCnt, fPort, 
+                                                            device.DevAddr, device.NwkSKey,device.AppSKey,
+                                                            adr=ADR_ENABLED, ack=device.Ack, fOpts=session.mac.answer,
+                                                            adr_ack_req=adr_ack_req)
             else:
-                self._device.AckDown = False
-                response =  WrapperLoRaMAC.confirmed_data_up(self._device.uplinkMacPayload, self._device.FCnt, fPort, 
-                                                            self._device.DevAddr, self._device.NwkSKey,self._device.AppSKey,
-                                                            adr=False, ack=self._device.Ack, fOpts=self._Mac.answer)
-            db = Database()
-            db.open()
-            db.update_f_cnt(self._device.DevEUI.hex(), self._device.FCnt)
-            db.close()
+                device.AckDown = False
+                response =  self._codec.confirmed_data_up(device.uplinkMacPayload, device.FCnt, fPort, 
+                                                            device.DevAddr, device.NwkSKey,device.AppSKey,
+                                                            adr=ADR_ENABLED, ack=device.Ack, fOpts=session.mac.answer,
+                                                            adr_ack_req=adr_ack_req)
+            if device.FCnt + FCNT_RESERVE_BLOCK // 2 >= session.fcnt_reserving:
+                self.__reserve_f_cnt(session)
+            if device.FCnt > session.fcnt_reserved and not self.__wait_f_cnt(session):
+                # Sent above the saved bound, the FCnt could be used again after a power cut
+                self._logger.error(f"LoRaWAN : Uplink FCnt {device.FCnt} not reserved")
+                return False
             if response["PHYPayload"] is None:
                 self._logger.debug(f"LoRaWAN : Uplink Failed")
                 return False
             
-            self._device.uplinkPhyPayload = response["PHYPayload"]
+            device.uplinkPhyPayload = response["PHYPayload"]
             return True
+        except ValueError as e:
+            # Payload or FOpts too long for the frame, reported as TX_PAYLOAD_ERROR by the caller
+            self._logger.warning(f"LoRaWAN : Uplink {e}")
+            return False
         except:
             self._logger.error(f"LoRaWAN : Uplink")
             return False
-    def __lorawan_data_down(self) -> bool:
+    def __lorawan_data_down(self, session:Session, frame:FrameView) -> bool:
+        device = session.device
         try:
-            DevAddr = bytearray(self._device.downlinkPhyPayload[1:5])
-            DevAddr.reverse()
-            if int(DevAddr.hex(), 16) != int(self._device.DevAddr.hex(), 16):
+            if frame.dev_addr != device.DevAddr:
                 self._logger.debug(f"LoRaWAN : Unknown device data received")
                 return False
             
-            response = WrapperLoRaMAC.data_down(self._device.downlinkPhyPayload, self._device.DevAddr,
-                                                self._device.NwkSKey, self._device.AppSKey)
+            response = self._codec.data_down(device.downlinkPhyPayload, device.DevAddr,
+                                                device.NwkSKey, device.AppSKey)
             
             if response is None:
                 return False
+            session.mac.downlink_received()
+            if session.resume_uplinks is not None:
+                self._logger.info(f"Session : restored session confirmed by the network")
+                session.resume_uplinks = None
             if response["FOptsLen"] > 0:
                 self._logger.debug(f"MAC command received")
-                self._Mac.handle_mac_command(response["FOpts"])
-            self._device.downlinkMacPayload = response["MacPayload"]
-            self._device.Adr = response["ADR"]
-            self._device.Rfu = response["RFU"]
-            self._device.AckDown = response["ACK"]
-            self._device.FCntDown = response["FCntDown"]
-            self._device.FPortDown = response["FPortDown"]
+                if session.mac.handle_mac_command(response["FOpts"]):
+                    self.__save_mac_state(session)
+            device.downlinkMacPayload = response["MacPayload"]
+            device.Adr = response["ADR"]
+            device.Rfu = response["RFU"]
+            device.AckDown = response["ACK"]
+            device.FCntDown = response["FCntDown"]
+            device.FPortDown = response["FPortDown"]
             return True
         except:
             self._logger.error(f"LoRaWAN : Downlink")
@@ -1010,6 +1010,14 @@ class SX126x(BaseLoRa) :
         # register onReceive function to call every receive done
         self._onReceive = callback
 
+    def onInterrupt(self, irq: int, callback) :
+
+        # register a callback on DIO1 rising edge doing no SPI access, for a radio begun without IRQ pin:
+        # the caller then reads the IRQ status with wait() from its own thread
+        gpio.setup(irq, gpio.IN)
+        gpio.remove_event_detect(irq)
+        gpio.add_event_detect(irq, gpio.RISING, callback=lambda channel : callback())
+
 ### SX126X API: OPERATIONAL MODES COMMANDS ###
 
     def setSleep(self, sleepConfig: int) :
@@ -1,3 +1,10 @@
 # __init__.py
-from .SX126x import SX126x
-from .SX127x import SX127x
+try:
+    from .SX126x import SX126x
+    from .SX127x import SX127x
+except ImportError:
+    # spidev and RPi.GPIO are only available on the Raspberry Pi
+    SX126x = None
+    SX127x = None
+from .base import BaseLoRa
+from .simulated import SimulatedLoRa
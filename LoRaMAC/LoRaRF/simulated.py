@@ -0,0 +1,429 @@
+from .base import BaseLoRa
+from ..loramac_airtime import time_on_air
+from ..loramac_scheduler import Scheduler
+from threading import Condition
+import logging
+import random
+import time
+
+class SimulatedLoRa(BaseLoRa) :
+    """In-memory LoRa radio with the SX126x API, for running the LoRaMAC layer without hardware.
+
+    TX done and RX done happen after the time on air of the packet. RX single windows time out
+    after the configured symbol timeout, and the IRQ callbacks are called when begin() gets an IRQ pin.
+    Uplinks are given to `on_uplink(payload, info)` and the network side answers with `send_downlink()`.
+    Packets are lost with probability `uplink_loss` / `downlink_loss`, uplinks collide with probability
+    `collision_rate`, and downlinks overlapping on the same frequency collide (CRC error).
+
+    Example Usage:
+        radio = SimulatedLoRa()\n
+        radio.on_uplink = lambda payload, info: radio.send_downlink(answer, info["frequency"], info["spreading_factor"], 125000, 1.0)\n
+        LoRaWAN = LoRaMAC(device, region, radio=radio, irq_pin=0)\n
+    """
+
+    # SetSleep
+    SLEEP_COLD_START                       = 0x00
+    SLEEP_WARM_START                       = 0x04
+
+    # SetStandby
+    STANDBY_RC                             = 0x00
+    STANDBY_XOSC                           = 0x01
+
+    # SetTx / SetRx
+    TX_SINGLE                              = 0x000000
+    RX_SINGLE                              = 0x000000
+    RX_CONTINUOUS                          = 0xFFFFFF
+
+    # SetPaConfig
+    TX_POWER_SX1261                        = 0x01
+    TX_POWER_SX1262                        = 0x02
+    TX_POWER_SX1268                        = 0x08
+
+    # IRQ
+    IRQ_TX_DONE                            = 0x0001
+    IRQ_RX_DONE                            = 0x0002
+    IRQ_HEADER_ERR                         = 0x0020
+    IRQ_CRC_ERR                            = 0x0040
+    IRQ_TIMEOUT                            = 0x0200
+    IRQ_NONE                               = 0x0000
+
+    # LoRa packet
+    HEADER_EXPLICIT                        = 0x00
+    HEADER_IMPLICIT                        = 0x01
+    RX_GAIN_POWER_SAVING                   = 0x00
+    RX_GAIN_BOOSTED                        = 0x01
+
+    # Chip mode
+    STATUS_MODE_SLEEP                      = 0x00
+    STATUS_MODE_STDBY_RC                   = 0x20
+    STATUS_MODE_RX                         = 0x50
+    STATUS_MODE_TX                         = 0x60
+
+    # Operation status
+    STATUS_DEFAULT                         = 0
+    STATUS_TX_WAIT                         = 1
+    STATUS_TX_TIMEOUT                      = 2
+    STATUS_TX_DONE                         = 3
+    STATUS_RX_WAIT                         = 4
+    STATUS_RX_CONTINUOUS                   = 5
+    STATUS_RX_TIMEOUT                      = 6
+    STATUS_RX_DONE                         = 7
+    STATUS_HEADER_ERR                      = 8
+    STATUS_CRC_ERR                         = 9
+
+    PREAMBLE_DETECT_SYMBOLS                = 4           # preamble symbols needed to lock on a packet
+
+    def __init__(self, uplink_loss: float = 0.0, downlink_loss: float = 0.0, collision_rate: float = 0.0,
+                 rssi: float = -80.0, snr: float = 7.0, noise: float = 0.0, seed: int = None) :
+
+        self._logger = logging.getLogger("DRIVER[Simulated]")
+        self.uplink_loss = uplink_loss
+        self.downlink_loss = downlink_loss
+        self.collision_rate = collision_rate
+        self.link_rssi = rssi
+        self.link_snr = snr
+        self.noise = noise
+        self.on_uplink = None
+        self._random = random.Random(seed)
+        self._condition = Condition()
+        self._scheduler = Scheduler("SimulatedLoRa")
+        self._irq = -1
+        self._mode = self.STATUS_MODE_STDBY_RC
+        self._session = 0
+        self._frequency = 0
+        self._sf = 7
+        self._bw = 125000
+        self._cr = 5
+        self._ldro = False
+        self._headerType = self.HEADER_EXPLICIT
+        self._preambleLength = 8
+        self._crcType = False
+        self._invertIq = False
+        self._txPower = 14
+        self._symbolTimeout = 0
+        self._rxOpenAt = 0.0
+        self._rxLocked = False
+        self._txBuffer = bytearray()
+        self._rxBuffer = bytes()
+        self._statusWait = self.STATUS_DEFAULT
+        self._statusIrq = self.IRQ_NONE
+        self._packetRssi = 0.0
+        self._packetSnr = 0.0
+        self._transmitTime = 0.0
+        self._air = []                # (start, end, frequency) of the downlinks on air
+        self._onTransmit = None
+        self._onReceive = None
+        self._onInterrupt = None
+        # counters
+        self.tx_count = 0
+        self.rx_count = 0
+        self.tx_airtime = 0.0
+        self.tx_done_at = 0.0         # time.monotonic() instant of the last TX done
+        self.rx_done_at = 0.0         # time.monotonic() instant of the last RX done
+
+### COMMON OPERATIONAL METHODS ###
+
+    def begin(self, bus: int = 0, cs: int = 0, reset: int = -1, busy: int = -1, irq: int = -1, txen: int = -1, rxen: int = -1, wake: int = -1, dio2_as_rf_switch_ctrl: bool = True) :
+
+        # any IRQ pin other than -1 enables the DIO1 callbacks
+        self._irq = irq
+        self._mode = self.STATUS_MODE_STDBY_RC
+        return True
+
+    def end(self) :
+
+        self.sleep(self.SLEEP_COLD_START)
+
+    def reset(self) -> bool :
+
+        self.standby()
+        return True
+
+    def sleep(self, option = SLEEP_WARM_START) :
+
+        with self._condition :
+            self._session += 1
+            self._mode = self.STATUS_MODE_SLEEP
+
+    def wake(self) :
+
+        self.standby()
+
+    def standby(self, option = STANDBY_RC) :
+
+        with self._condition :
+            self._session += 1
+            self._mode = self.STATUS_MODE_STDBY_RC
+
+    def getMode(self) -> int :
+
+        return self._mode
+
+    def clearDeviceErrors(self) :
+        pass
+
+### MODEM, MODULATION PARAMETER, AND PACKET PARAMETER SETUP METHODS ###
+
+    def setFrequency(self, frequency: int) :
+        self._frequency = frequency
+
+    def setTxPower(self, txPower: int, version = TX_POWER_SX1262) :
+        self._txPower = min(txPower, 22)
+
+    def setRxGain(self, rxGain) :
+        pass
+
+    def setSyncWord(self, syncWord: int) :
+        pass
+
+    def setLoRaModulation(self, sf: int, bw: int, cr: int, ldro: bool = False) :
+        self._sf = sf
+        self._bw = bw
+        self._cr = cr
+        self._ldro = ldro
+
+    def setLoRaPacket(self, headerType, preambleLength: int, payloadLength: int, crcType: bool = False, invertIq: bool = False) :
+        self._headerType = headerType
+        self._preambleLength = preambleLength
+        self._crcType = crcType
+        self._invertIq = invertIq
+
+    def setLoRaSymbNumTimeout(self, symbnum: int) :
+        self._symbolTimeout = symbnum
+
+### TRANSMIT RELATED METHODS ###
+
+    def beginPacket(self) :
+
+        self._txBuffer = bytearray()
+
+    def write(self, data, length: int = 0) :
+
+        if type(data) is int or type(data) is float :
+            data = (int(data),)
+        if length == 0 or length > len(data) : length = len(data)
+        self._txBuffer.extend(bytes(data[:length]))
+
+    def put(self, data) :
+
+        self._txBuffer.extend(bytes(data))
+
+    def endPacket(self, timeout: int = TX_SINGLE) -> bool :
+
+        with self._condition :
+            if self._mode == self.STATUS_MODE_TX :
+                self._logger.warning("Device still in previous TX mode")
+                return False
+            self._session += 1
+            session = self._session
+            self._mode = self.STATUS_MODE_TX
+            self._statusWait = self.STATUS_TX_WAIT
+            self._statusIrq = self.IRQ_NONE
+            payload = bytes(self._txBuffer)
+            airtime = self.__airtime(len(payload), self._sf, self._bw, self._crcType)
+            info = {"frequency": self._frequency, "spreading_factor": self._sf, "bandwidth": self._bw,
+                    "tx_power": self._txPower, "airtime": airtime}
+            self._transmitTime = time.monotonic()
+        self._scheduler.schedule_in(airtime, self.__tx_done, session, payload, info)
+        return True
+
+### RECEIVE RELATED METHODS ###
+
+    def request(self, timeout: int = RX_SINGLE) -> bool :
+
+        with self._condition :
+            if self._mode == self.STATUS_MODE_RX : return False
+            self._session += 1
+            session = self._session
+            self._mode = self.STATUS_MODE_RX
+            self._statusIrq = self.IRQ_NONE
+            self._rxLocked = False
+            self._rxOpenAt = time.monotonic()
+            self._statusWait = self.STATUS_RX_CONTINUOUS if timeout == self.RX_CONTINUOUS else self.STATUS_RX_WAIT
+            if self._statusWait == self.STATUS_RX_WAIT and self._symbolTimeout > 0 :
+                symbolTime = (2 ** self._sf) / self._bw
+                self._scheduler.schedule_in(self._symbolTimeout * symbolTime, self.__rx_timeout, session)
+        return True
+
+    def listen(self, rxPeriod: int, sleepPeriod: int) -> bool :
+
+        # RX duty cycle: sniffs the preambles every rxPeriod + sleepPeriod ms and stops after a packet
+        with self._condition :
+            if self._mode == self.STATUS_MODE_RX : return False
+            self._session += 1
+            self._mode = self.STATUS_MODE_RX
+            self._statusIrq = self.IRQ_NONE
+            self._rxLocked = False
+            self._rxOpenAt = time.monotonic()
+            self._statusWait = self.STATUS_RX_WAIT
+        return True
+
+    def available(self) -> int :
+
+        return len(self._rxBuffer)
+
+    def read(self, length: int = 0) :
+
+        single = length == 0
+        data = self.get(1 if single else length)
+        if single : return data[0] if len(data) > 0 else 0
+        return tuple(data)
+
+    def get(self, length: int = 1) -> bytes :
+
+        with self._condition :
+            data = self._rxBuffer[:length]
+            self._rxBuffer = self._rxBuffer[length:]
+        return bytes(data)
+
+    def purge(self, length: int = 0) :
+
+        with self._condition :
+            self._rxBuffer = self._rxBuffer[length:] if length > 0 else bytes()
+
+### WAIT, OPERATION STATUS, AND PACKET STATUS METHODS ###
+
+    def wait(self, timeout: int = 0) -> bool :
+
+        # timeout 0 waits until an IRQ, like the SX126x driver
+        with self._condition :
+            return self._condition.wait_for(lambda : self._statusIrq != self.IRQ_NONE, timeout if timeout > 0 else None)
+
+    def status(self) -> int :
+
+        with self._condition :
+            statusIrq = self._statusIrq
+            if self._statusWait == self.STATUS_RX_CONTINUOUS :
+                self._statusIrq = self.IRQ_NONE
+            if statusIrq & self.IRQ_TIMEOUT :
+                if self._statusWait == self.STATUS_TX_WAIT : return self.STATUS_TX_TIMEOUT
+                else : return self.STATUS_RX_TIMEOUT
+            elif statusIrq & self.IRQ_HEADER_ERR : return self.STATUS_HEADER_ERR
+            elif statusIrq & self.IRQ_CRC_ERR : return self.STATUS_CRC_ERR
+            elif statusIrq & self.IRQ_RX_DONE : return self.STATUS_RX_DONE
+            elif statusIrq & self.IRQ_TX_DONE : return self.STATUS_TX_DONE
+            return self._statusWait
+
+    def transmitTime(self) -> float :
+
+        return self._transmitTime * 1000
+
+    def packetRssi(self) -> float :
+
+        return self._packetRssi
+
+    def snr(self) -> float :
+
+        return self._packetSnr
+
+    def onTransmit(self, callback) :
+
+        self._onTransmit = callback
+
+    def onReceive(self, callback) :
+
+        self._onReceive = callback
+
+    def onInterrupt(self, irq: int, callback) :
+
+        # DIO1 rising edge without SPI access, the IRQ status is read by wait()
+        self._onInterrupt = callback
+
+### NETWORK SIDE ###
+
+    def send_downlink(self, payload: bytes, frequency: int, spreading_factor: int, bandwidth: int, delay: float = 0.0,
+                      inverted_iq: bool = True) -> float :
+        """Puts a packet on air in `delay` seconds, received if the radio listens on its frequency and data rate.
+        Returns the time.monotonic() instant the packet ends."""
+
+        start = time.monotonic() + delay
+        airtime = self.__airtime(len(payload), spreading_factor, bandwidth, False)
+        with self._condition :
+            self._air = [item for item in self._air if item[1] > start - 10]
+            self._air.append((start, start + airtime, frequency))
+        self._scheduler.schedule(start, self.__rx_start, bytes(payload), frequency, spreading_factor, bandwidth,
+                                 inverted_iq, start, airtime)
+        return start + airtime
+
+    def __airtime(self, size: int, sf: int, bw: int, crc: bool) -> float :
+
+        return time_on_air(sf, bw, size, self._cr, self._preambleLength,
+                           self._headerType == self.HEADER_EXPLICIT, crc)
+
+    def __tx_done(self, session: int, payload: bytes, info: dict) :
+
+        with self._condition :
+            self.tx_done_at = time.monotonic()
+            if session == self._session :
+                self._mode = self.STATUS_MODE_STDBY_RC
+                self._statusIrq = self.IRQ_TX_DONE
+                self._transmitTime = self.tx_done_at - self._transmitTime
+            self.tx_count += 1
+            self.tx_airtime += info["airtime"]
+            self._condition.notify_all()
+        if self._irq != -1 and callable(self._onTransmit) :
+            self._onTransmit()
+        if callable(self._onInterrupt) :
+            self._onInterrupt()
+        # the network only hears the uplinks that are not lost or collided
+        if self._random.random() < self.uplink_loss or self._random.random() < self.collision_rate :
+            self._logger.debug("Uplink lost")
+            return
+        if callable(self.on_uplink) :
+            info["end"] = self.tx_done_at
+            self.on_uplink(payload, info)
+
+    def __rx_timeout(self, session: int) :
+
+        with self._condition :
+            if session != self._session or self._statusIrq != self.IRQ_NONE or self._rxLocked : return
+            self._mode = self.STATUS_MODE_STDBY_RC
+            self._statusIrq = self.IRQ_TIMEOUT
+            self._condition.notify_all()
+        if self._irq != -1 and callable(self._onReceive) :
+            self._onReceive()
+        if callable(self._onInterrupt) :
+            self._onInterrupt()
+
+    def __rx_start(self, payload: bytes, frequency: int, sf: int, bw: int, invertedIq: bool, start: float, airtime: float) :
+
+        with self._condition :
+            if self._mode != self.STATUS_MODE_RX or self._frequency != frequency or self._sf != sf or \
+                self._bw != bw or self._invertIq != invertedIq :
+                return
+            symbolTime = (2 ** sf) / bw
+            if self._statusWait == self.STATUS_RX_WAIT :
+                # the preamble must start while the window listens
+                if start + (self._preambleLength - self.PREAMBLE_DETECT_SYMBOLS) * symbolTime < self._rxOpenAt :
+                    return
+            if self._random.random() < self.downlink_loss :
+                self._logger.debug("Downlink lost")
+                return
+            # preamble detected: the symbol timeout no longer applies
+            self._rxLocked = True
+            session = self._session
+        self._scheduler.schedule(start + airtime, self.__rx_done, session, payload, frequency, start, airtime)
+
+    def __rx_done(self, session: int, payload: bytes, frequency: int, start: float, airtime: float) :
+
+        with self._condition :
+            if session != self._session : return
+            collided = any(item[2] == frequency and item[0] < start + airtime and start < item[1] and item[0] != start
+                           for item in self._air)
+            self._rxLocked = False
+            if self._statusWait == self.STATUS_RX_WAIT :
+                self._mode = self.STATUS_MODE_STDBY_RC
+            if collided :
+                self._statusIrq = self.IRQ_CRC_ERR
+            else :
+                self._statusIrq = self.IRQ_RX_DONE
+                self._rxBuffer = payload
+                self._packetRssi = self.link_rssi + self._random.gauss(0, self.noise) if self.noise > 0 else self.link_rssi
+                self._packetSnr = self.link_snr + self._random.gauss(0, self.noise) if self.noise > 0 else self.link_snr
+                self.rx_count += 1
+                self.rx_done_at = time.monotonic()
+            self._condition.notify_all()
+        if self._irq != -1 and callable(self._onReceive) :
+            self._onReceive()
+        if callable(self._onInterrupt) :
+            self._onInterrupt()
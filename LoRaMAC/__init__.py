@@ -3,6 +3,11 @@
 __version__ = "1.0.2"             # LoRaWAN MAC version 1.0.2
 
 from .LoRaMAC import LoRaMAC
+from .loramac_async import AsyncLoRaMAC
+from .loramac_fragment import Reassembler
+from .LoRaRF import SimulatedLoRa
 from .loramac_region import Region
 from .loramac_device import Device
-from .loramac_status import JoinStatus, TransmitStatus, ReceiveStatus
\ No newline at end of file
+from .loramac_status import JoinStatus, TransmitStatus, ReceiveStatus
+from .loramac_types import DeviceClass
+from .loramac_request import Priority
\ No newline at end of file
@@ -0,0 +1,198 @@
+from .loramac_region import Region
+
+from threading import Lock
+import math
+import time
+
+LORAWAN_FRAME_OVERHEAD = 13      # MHDR(1) + DevAddr(4) + FCtrl(1) + FCnt(2) + FPort(1) + MIC(4)
+AIRTIME_WINDOW         = 3600    # duty cycle is accounted over one hour
+
+
+def time_on_air(spreading_factor:int, bandwidth:int, payload_size:int, coding_rate:int=5, preamble_size:int=8,
+                explicit_header:bool=True, crc:bool=True, low_data_rate_optimize:bool=None) -> float:
+    """
+    Computes the LoRa time on air of a packet (Semtech AN1200.13).
+
+    Args:
+        spreading_factor (int): The spreading factor (7 to 12).
+        bandwidth (int): The bandwidth in Hz.
+        payload_size (int): The PHY payload size in bytes.
+        coding_rate (int): The coding rate denominator (5 for 4/5 up to 8 for 4/8). Default is 5.
+        preamble_size (int): The number of preamble symbols. Default is 8.
+        explicit_header (bool): Whether the LoRa header is explicit. Default is True.
+        crc (bool): Whether the payload CRC is enabled. Default is True.
+        low_data_rate_optimize (bool): Whether LDRO is enabled. Default is None (enabled when a symbol lasts 16 ms or more).
+
+    Returns:
+        float: The time on air in seconds.
+    """
+    symbol_time = (2 ** spreading_factor) / bandwidth
+    if low_data_rate_optimize is None:
+        low_data_rate_optimize = symbol_time >= 0.016
+    de = 1 if low_data_rate_optimize else 0
+    h = 0 if explicit_header else 1
+    numerator = 8 * payload_size - 4 * spreading_factor + 28 + (16 if crc else 0) - 20 * h
+    payload_symbols = 8 + max(math.ceil(numerator / (4 * (spreading_factor - 2 * de))) * coding_rate, 0)
+    return (preamble_size + 4.25 + payload_symbols) * symbol_time
+
+
+class SubBand():
+    """
+    The `SubBand` class holds the duty cycle state of a regulatory sub-band.
+    """
+
+    def __init__(self, frequency_min:int, frequency_max:int, duty_cycle:float):
+        self.frequency_min = frequency_min
+        self.frequency_max = frequency_max
+        self.duty_cycle = duty_cycle
+        self.available_at = 0.0       # time.monotonic() instant of the next legal transmission
+        self.history = []             # (end, airtime) of the transmissions of the last hour
+
+    def contains(self, frequency:int) -> bool:
+        return self.frequency_min <= frequency < self.frequency_max
+
+
+class AirtimeLedger():
+    """
+    The `AirtimeLedger` class accounts the airtime spent per regulatory sub-band of a region.
+    After a transmission of airtime `T` on a sub-band of duty cycle `dc`, the sub-band is off for `T / dc - T`
+    (the LoRaWAN Toff rule), which keeps every hour of traffic under the duty cycle.
+    It also checks the maximum dwell time of a region (400 ms in US915), and holds all the transmissions
+    to the aggregated duty cycle set by DutyCycleReq.
+
+    Example Usage:
+        ledger  = AirtimeLedger(Region.EU868)\n
+        airtime = time_on_air(12, 125000, 23)\n
+        delay   = ledger.delay(868100000)\n
+        ledger.record(868100000, airtime)\n
+    """
+
+    def __init__(self, region:Region):
+        """
+        Initializes the ledger with the sub-bands and the dwell time of `region`.
+        """
+        self._lock = Lock()
+        self._bands = [SubBand(*band) for band in region.value.SUB_BANDS]
+        self._max_dwell_time = region.value.MAX_DWELL_TIME
+        self._max_duty_cycle = 1.0    # aggregated duty cycle set by DutyCycleReq
+        self._available_at = 0.0      # time.monotonic() instant allowed by the aggregated duty cycle
+
+    def set_max_duty_cycle(self, duty_cycle:float):
+        """
+        Sets the aggregated duty cycle of all the transmissions (DutyCycleReq), 1 for no limit.
+        """
+        with self._lock:
+            self._max_duty_cycle = duty_cycle
+
+    def band(self, frequency:int) -> SubBand:
+        """
+        Returns the sub-band of `frequency`, None if the frequency has no duty cycle limit.
+        """
+        for band in self._bands:
+            if band.contains(frequency):
+                return band
+        return None
+
+    def delay(self, frequency:int, now:float=None) -> float:
+        """
+        Returns the number of seconds until a transmission on `frequency` is legal (0 if legal now).
+        """
+        if now is None:
+            now = time.monotonic()
+        band = self.band(frequency)
+        with self._lock:
+            available_at = self._available_at if band is None else max(self._available_at, band.available_at)
+            return max(0.0, available_at - now)
+
+    def exceeds_dwell_time(self, airtime:float) -> bool:
+        """
+        Returns whether a transmission of `airtime` seconds breaks the dwell time limit of the region.
+        """
+        return self._max_dwell_time > 0 and airtime > self._max_dwell_time
+
+    def record(self, frequency:int, airtime:float, end:float=None):
+        """
+        Accounts a transmission of `airtime` seconds on `frequency` that ended at the `time.monotonic()` instant `end`.
+        """
+        if end is None:
+            end = time.monotonic()
+        band = self.band(frequency)
+        with self._lock:
+            if self._max_duty_cycle < 1:
+                self._available_at = max(self._available_at, end + airtime / self._max_duty_cycle - airtime)
+            if band is None:
+                return
+            band.available_at = max(band.available_at, end + airtime / band.duty_cycle - airtime)
+            band.history = [item for item in band.history if item[0] > end - AIRTIME_WINDOW]
+            band.history.append((end, airtime))
+
+    def airtime_last_hour(self, now:float=None) -> dict:
+        """
+        Returns the airtime spent in the last hour (seconds) by sub-band, keyed by "<frequency_min>-<frequency_max>".
+        """
+        if now is None:
+            now = time.monotonic()
+        output = {}
+        with self._lock:
+            for band in self._bands:
+                airtime = sum(item[1] for item in band.history if item[0] > now - AIRTIME_WINDOW)
+                output[f"{band.frequency_min}-{band.frequency_max}"] = airtime
+        return output
+
+
+class RadioOnTime():
+    """
+    The `RadioOnTime` class accounts the time the radio is awake (TX, RX or standby) over the last hour.
+    A duty cycled receive is accounted at its RX ratio.
+
+    Example Usage:
+        radio_on = RadioOnTime()\n
+        radio_on.on()\n
+        radio_on.off()\n
+        print(radio_on.last_hour())\n
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._since:float = None      # time.monotonic() instant the current awake period started
+        self._ratio = 1.0             # fraction of the current period the radio is on
+        self._history = []            # (start, end, ratio) of the awake periods of the last hour
+
+    def on(self, ratio:float=1.0, now:float=None):
+        """
+        Starts an awake period with the radio on for `ratio` of the time (ends the current one).
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            self.__close(now)
+            self._since = now
+            self._ratio = ratio
+
+    def off(self, now:float=None):
+        """
+        Ends the current awake period (radio asleep).
+        """
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            self.__close(now)
+            self._since = None
+
+    def last_hour(self, now:float=None) -> float:
+        """
+        Returns the number of seconds the radio was on in the last hour.
+        """
+        if now is None:
+            now = time.monotonic()
+        start = now - AIRTIME_WINDOW
+        with self._lock:
+            periods = list(self._history)
+            if self._since is not None:
+                periods.append((self._since, now, self._ratio))
+        return sum((end - max(begin, start)) * ratio for begin, end, ratio in periods if end > start)
+
+    def __close(self, now:float):
+        if self._since is not None and now > self._since:
+            self._history.append((self._since, now, self._ratio))
+        self._history = [item for item in self._history if item[1] > now - AIRTIME_WINDOW]
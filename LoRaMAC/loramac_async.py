@@ -0,0 +1,84 @@
+from .LoRaMAC import LoRaMAC
+from .loramac_status import JoinStatus, TransmitStatus
+
+import asyncio
+
+
+class AsyncLoRaMAC():
+    """
+    The `AsyncLoRaMAC` class is an `asyncio` facade over a `LoRaMAC` object.
+    Each call awaits the future returned by `LoRaMAC`, so the event loop keeps running while the radio is busy.
+
+    Example Usage:
+        LoRaWAN = AsyncLoRaMAC(LoRaMAC(device, region))\n
+        status  = await LoRaWAN.join(max_tries=3)\n
+        status  = await LoRaWAN.transmit(payload, confirmed=True)\n
+    """
+
+    def __init__(self, LoRaWAN:LoRaMAC):
+        """
+        Initializes the `AsyncLoRaMAC` object.
+
+        Args:
+            LoRaWAN (LoRaMAC): The LoRaMAC object to drive.
+        """
+        self._LoRaWAN = LoRaWAN
+
+    def is_joined(self, *args, **kwargs) -> bool:
+        """
+        Returns whether the device has successfully joined the LoRaWAN network (see `LoRaMAC.is_joined()`).
+        """
+        return self._LoRaWAN.is_joined(*args, **kwargs)
+
+    def add_device(self, *args, **kwargs) -> bool:
+        """
+        Hosts one more device on the radio (see `LoRaMAC.add_device()`).
+        """
+        return self._LoRaWAN.add_device(*args, **kwargs)
+
+    def max_payload_size(self, *args, **kwargs) -> int:
+        """
+        Returns the largest payload of one uplink at the current data rate (see `LoRaMAC.max_payload_size()`).
+        """
+        return self._LoRaWAN.max_payload_size(*args, **kwargs)
+
+    def get_metrics(self, *args, **kwargs) -> dict:
+        """
+        Returns the counters and latencies measured by the MAC (see `LoRaMAC.get_metrics()`).
+        """
+        return self._LoRaWAN.get_metrics(*args, **kwargs)
+
+    def request_link_check(self, *args, **kwargs):
+        self._LoRaWAN.request_link_check(*args, **kwargs)
+
+    def request_device_time(self, *args, **kwargs):
+        self._LoRaWAN.request_device_time(*args, **kwargs)
+
+    async def join(self, *args, **kwargs) -> JoinStatus:
+        """
+        Joins the network, same arguments as `LoRaMAC.join()` (max_tries, forced, device).
+
+        Returns:
+            JoinStatus: The final join status.
+        """
+        return await asyncio.wrap_future(self._LoRaWAN.join(*args, **kwargs))
+
+    async def transmit(self, *args, **kwargs) -> TransmitStatus:
+        """
+        Transmits data over the LoRaWAN network, same arguments as `LoRaMAC.transmit()`
+        (payload, confirmed, priority, fport, device).
+
+        Returns:
+            TransmitStatus: The final transmit status.
+        """
+        return await asyncio.wrap_future(self._LoRaWAN.transmit(*args, **kwargs))
+
+    async def transmit_fragmented(self, *args, **kwargs) -> TransmitStatus:
+        """
+        Transmits a payload larger than one frame, same arguments as `LoRaMAC.transmit_fragmented()`
+        (payload, confirmed, priority, parity_group, device).
+
+        Returns:
+            TransmitStatus: The final transmit status, once every fragment is sent.
+        """
+        return await asyncio.wrap_future(self._LoRaWAN.transmit_fragmented(*args, **kwargs))
@@ -0,0 +1,124 @@
+from .loramac_settings import CHANNEL_FAILURE_BACKOFF, CHANNEL_SNR_MIN, CHANNEL_SNR_MAX
+
+from threading import Lock
+import time
+
+
+class ChannelStats():
+    """
+    The `ChannelStats` class holds the link statistics of an uplink channel.
+    """
+
+    def __init__(self):
+        self.uplinks = 0          # confirmed uplinks sent
+        self.acks = 0             # confirmed uplinks acknowledged
+        self.failures = 0         # consecutive confirmed uplinks not acknowledged
+        self.rssi:float = None    # last downlink RSSI (dBm) after an uplink on the channel
+        self.snr:float = None     # last downlink SNR (dB) after an uplink on the channel
+        self.last_used = 0.0      # time.monotonic() instant of the last uplink
+        self.last_failure = 0.0   # time.monotonic() instant of the last uplink not acknowledged
+        self.current_weight = 0.0 # smooth weighted round-robin state
+
+    def to_dict(self) -> dict:
+        return {
+            "uplinks": self.uplinks,
+            "acks": self.acks,
+            "failures": self.failures,
+            "rssi": self.rssi,
+            "snr": self.snr,
+        }
+
+
+class ChannelSelector():
+    """
+    The `ChannelSelector` class picks the uplink channel by smooth weighted round-robin.
+    The weight of a channel is its ACK ratio, scaled by the SNR of the downlinks received after it,
+    and halved for every consecutive failure in the last CHANNEL_FAILURE_BACKOFF seconds.
+    Channels spread evenly when nothing is known, and failing frequencies are avoided without being banned.
+
+    Example Usage:
+        selector = ChannelSelector()\n
+        channel  = selector.select([0, 1, 2, 3])\n
+        selector.record_uplink(channel, confirmed=True)\n
+        selector.record_result(channel, acknowledged=True)\n
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._stats = {}
+
+    def select(self, channels:list, now:float=None) -> int:
+        """
+        Returns the next channel among `channels` (None if the list is empty).
+        """
+        if len(channels) == 0:
+            return None
+        if now is None:
+            now = time.monotonic()
+        with self._lock:
+            total = 0.0
+            selected = None
+            for channel in channels:
+                stats = self.__stats(channel)
+                weight = self.__weight(stats, now)
+                stats.current_weight = stats.current_weight + weight
+                total = total + weight
+                if selected is None or stats.current_weight > selected.current_weight:
+                    selected, selected_channel = stats, channel
+            selected.current_weight = selected.current_weight - total
+            return selected_channel
+
+    def record_uplink(self, channel:int, confirmed:bool=False, now:float=None):
+        """
+        Accounts an uplink sent on `channel`.
+        """
+        with self._lock:
+            stats = self.__stats(channel)
+            stats.last_used = time.monotonic() if now is None else now
+            if confirmed:
+                stats.uplinks = stats.uplinks + 1
+
+    def record_result(self, channel:int, acknowledged:bool, now:float=None):
+        """
+        Accounts the ACK (or its absence) of a confirmed uplink sent on `channel`.
+        """
+        with self._lock:
+            stats = self.__stats(channel)
+            if acknowledged:
+                stats.acks = stats.acks + 1
+                stats.failures = 0
+            else:
+                stats.failures = stats.failures + 1
+                stats.last_failure = time.monotonic() if now is None else now
+
+    def record_downlink(self, channel:int, rssi:float, snr:float):
+        """
+        Accounts a downlink received in the RX windows of an uplink sent on `channel`.
+        """
+        with self._lock:
+            stats = self.__stats(channel)
+            stats.rssi = rssi
+            stats.snr = snr
+            stats.failures = 0
+
+    def to_dict(self) -> dict:
+        """
+        Returns the statistics by channel.
+        """
+        with self._lock:
+            return {channel: stats.to_dict() for channel, stats in self._stats.items()}
+
+    def __stats(self, channel:int) -> ChannelStats:
+        if channel not in self._stats:
+            self._stats[channel] = ChannelStats()
+        return self._stats[channel]
+
+    def __weight(self, stats:ChannelStats, now:float) -> float:
+        # ACK ratio with one virtual success and failure, so unknown channels weigh 0.5
+        weight = (stats.acks + 1) / (stats.uplinks + 2)
+        if stats.snr is not None:
+            snr = max(CHANNEL_SNR_MIN, min(CHANNEL_SNR_MAX, stats.snr))
+            weight = weight * (0.5 + (snr - CHANNEL_SNR_MIN) / (CHANNEL_SNR_MAX - CHANNEL_SNR_MIN))
+        if stats.failures > 0 and now - stats.last_failure < CHANNEL_FAILURE_BACKOFF:
+            weight = weight / (2 ** stats.failures)
+        return weight
@@ -1,7 +1,7 @@
-
-
 from enum import IntEnum
 from .loramac_region import Region
+from .loramac_types import LORAWAN_MAX_FOPTS_LEN
+from .loramac_settings import ADR_ACK_LIMIT, ADR_ACK_DELAY, UPLINK_RX1_DELAY
 import logging
 
 class CID(IntEnum):
@@ -14,81 +14,474 @@ class CID(IntEnum):
     RXTimingSetup = 0x08
     TXParamSetup  = 0x09
     DlChannel     = 0x0A
-    DeviceTime    = 0x0B
+    DeviceTime    = 0x0D
 
 class LinkADR:
+    """
+    ADR state of the device: data rate, TXPower index, enabled channels, NbTrans and ADR_ACK_CNT.
+    """
 
-    def __init__(self, dr:int, tx_pwr:int, ch_mask:int, ch_mask_ctrl:int, nb_tx:int):
+    def __init__(self, dr:int, tx_pwr:int, ch_mask:int, ch_mask_ctrl:int, nb_tx:int, channels:set=None):
         self.data_rate = dr
         self.tx_power = tx_pwr
         self.ch_mask = ch_mask
         self.ch_mask_ctrl = ch_mask_ctrl
         self.nb_tx = nb_tx
-
-class DutyCycle:
-    pass
+        self.channels = set() if channels is None else set(channels)
+        self.ack_cnt = 0
 
 
 class MacCommand():
+    """
+    The `MacCommand` class handles the LoRaWAN 1.0.x MAC commands received in FOpts and holds the MAC state
+    they set (ADR, RX windows, channels, duty cycle).
+    Commands are parsed with a CID to (payload size, handler) table, and all the answers of a downlink,
+    with the device requests (LinkCheckReq, DeviceTimeReq), form the FOpts of the next uplink.
+    Commands beyond the 15 bytes of FOpts wait for the following uplink.
+    RXParamSetupAns, RXTimingSetupAns and DlChannelAns are repeated on every uplink until a downlink is received.
+
+    Example Usage:
+        mac = MacCommand(Region.EU868)\n
+        changed = mac.handle_mac_command(fOpts)\n
+        fOpts = mac.answer\n
+        mac.answer_sent()\n
+    """
 
     def __init__(self, region:Region=Region.US915):
-        if region == Region.US915:
-            self.link_adr = LinkADR(3, 21, 0, 1, 1)
-        elif region == Region.EU868:
-            self.link_adr = LinkADR(3, 14, 0, 1, 1)
-        self.answer:bytes = None
-        self.battery_level:int = 0  
+        self.battery_level:int = 0
         self.snr:float = 0
         self.rssi:float = 0
         self._region = region
         self._logger = logging.getLogger("APP[LoRaMAC]")
-        pass
-        
-    def __LinkADRAns(self, LinkADRReq:list):
-        if len(LinkADRReq) != 4:
-            self._logger.debug(f"Incorrect LinkADRReq: {bytes(LinkADRReq).hex()}")
-        # To be implemented for ADR
-        PowerACK = 1
-        DataRateACK = 1
-        ChannelMaskACK = 1
-        LinkADRAns = [CID.LinkADR]
-        LinkADRAns.append(0x00 | (PowerACK << 2) | (DataRateACK << 1) | (ChannelMaskACK << 0))
-        if self.answer is None:
-            self.answer = bytearray([])
-        self.answer = self.answer + bytes(LinkADRAns)
-        self.answer = bytes(self.answer)
-        self._logger.debug(f"LinkADRAns Response: {self.answer.hex()}")
-
-    def __DevStatusAns(self):
-        # To be implemented for ADR
-        DevStatusAns = [CID.DevStatus]
-        DevStatusAns.append(self.battery_level)
-        snr = max(-32, min(31, int(self.snr)))
-        snr_encoded = snr & 0x3F           # Get two's complement 6-bit representation
-        DevStatusAns.append(self.battery_level)
-        DevStatusAns.append(snr_encoded)
-        if self.answer is None:
-            self.answer = bytearray([])
-        self.answer = self.answer + bytes(DevStatusAns)
-        self.answer = bytes(self.answer)
-        self._logger.debug(f"DevStatusAns Response: {self.answer.hex()}")
-
-    def __DutyCycleAns(self, DutyCycleReq:list)->bytes:
-        pass
-        
-    def handle_mac_command(self, fOpts:bytes):
-        mac_cmd = list(fOpts)
+        # CID: (payload size of the network command, handler)
+        self.__handlers = {
+            CID.LinkCheck:     (2, self.__LinkCheckAns),
+            CID.LinkADR:       (4, self.__LinkADRReq),
+            CID.DutyCycle:     (1, self.__DutyCycleReq),
+            CID.RXParamSetup:  (4, self.__RXParamSetupReq),
+            CID.DevStatus:     (0, self.__DevStatusReq),
+            CID.NewChannel:    (5, self.__NewChannelReq),
+            CID.RXTimingSetup: (1, self.__RXTimingSetupReq),
+            CID.TXParamSetup:  (1, self.__TXParamSetupReq),
+            CID.DlChannel:     (4, self.__DlChannelReq),
+            CID.DeviceTime:    (5, self.__DeviceTimeAns),
+        }
+        self.link_margin:int = None        # LinkCheckAns
+        self.gateway_count:int = None      # LinkCheckAns
+        self.device_time:float = None      # DeviceTimeAns, seconds since the GPS epoch
+        self.__requests = []               # device requests of the next uplink
+        self.reset()
+
+    def reset(self, rx1_dr_offset:int=0, rx2_data_rate:int=None, rx_delay:int=UPLINK_RX1_DELAY):
+        """
+        Sets the default MAC state of a new session (join accept DLSettings and RxDelay).
+        DLSettings values the region does not accept are replaced by the region defaults, as RXParamSetupReq rejects them.
+        """
+        default_channels = range(self._region.value.UPLINK_CHANNEL_MIN, self._region.value.UPLINK_CHANNEL_MAX + 1)
+        self.link_adr = LinkADR(3, 0, 0, 1, 1, default_channels)
+        if rx1_dr_offset > self._region.value.RX1_DR_OFFSET_MAX:
+            self._logger.warning(f"Join accept RX1DROffset {rx1_dr_offset} invalid, 0 used")
+            rx1_dr_offset = 0
+        if rx2_data_rate is not None and rx2_data_rate not in self._region.value.DOWNLINK_DATA_RATES:
+            self._logger.warning(f"Join accept RX2DataRate DR{rx2_data_rate} invalid, DR{self._region.value.RX2_DATA_RATE} used")
+            rx2_data_rate = None
+        self.rx1_dr_offset = rx1_dr_offset
+        self.rx2_data_rate = self._region.value.RX2_DATA_RATE if rx2_data_rate is None else rx2_data_rate
+        self.rx2_frequency = self._region.value.RX2_FREQUENCY
+        self.rx_delay = max(UPLINK_RX1_DELAY, rx_delay)
+        self.max_duty_cycle = 0            # DutyCycleReq MaxDCycle, aggregated duty cycle 1 / 2^MaxDCycle
+        self.uplink_channels = {}          # channel: (frequency, min DR, max DR) set by NewChannelReq, frequency 0 if removed
+        self.downlink_channels = {}        # channel: RX1 frequency set by DlChannelReq
+        self.__answers = []
+        self.__sticky = {}
+        self.__sticky_unsent = False
+        self.__serialized = (0, 0, False)  # requests, answers and whether the sticky answers fit in the last `answer`
+        self.__overflow_logged = False
+
+    @property
+    def answer(self) -> bytes:
+        """
+        The FOpts of the next uplink (None if there is nothing to send), at most 15 bytes.
+        The commands that do not fit stay queued after `answer_sent()`.
+        """
+        output = bytearray()
+        commands = self.__requests + self.__answers + list(self.__sticky.values())
+        count = 0
+        for command in commands:
+            if len(output) + len(command) > LORAWAN_MAX_FOPTS_LEN:
+                if not self.__overflow_logged:
+                    self._logger.warning(f"MAC answers exceed FOpts, {len(commands) - count} wait for the next uplink")
+                    self.__overflow_logged = True
+                break
+            output.extend(command)
+            count = count + 1
+        requests = min(count, len(self.__requests))
+        answers = min(count - requests, len(self.__answers))
+        self.__serialized = (requests, answers, count == len(commands))
+        return bytes(output) if len(output) > 0 else None
+
+    @property
+    def pending(self) -> bool:
+        """
+        Whether answers or requests have not been sent yet (the sticky answers sent once do not count).
+        """
+        return len(self.__requests) > 0 or len(self.__answers) > 0 or self.__sticky_unsent
+
+    def answer_sent(self):
+        """
+        Clears the answers and requests of the last `answer`, sent in an uplink (the sticky answers stay until a downlink).
+        """
+        requests, answers, sticky = self.__serialized
+        self.__requests = self.__requests[requests:]
+        self.__answers = self.__answers[answers:]
+        if sticky:
+            self.__sticky_unsent = False
+        self.__serialized = (0, 0, False)
+        self.__overflow_logged = False
+
+    def downlink_received(self):
+        """
+        Resets ADR_ACK_CNT and drops the sticky answers, a downlink was received.
+        """
+        self.link_adr.ack_cnt = 0
+        self.__sticky = {}
+        self.__sticky_unsent = False
+
+    def request_link_check(self):
+        """
+        Adds LinkCheckReq to the next uplink, the network answers with the link margin and the gateway count.
+        """
+        if bytes([CID.LinkCheck]) not in self.__requests:
+            self.__requests.append(bytes([CID.LinkCheck]))
+
+    def request_device_time(self):
+        """
+        Adds DeviceTimeReq to the next uplink, the network answers with the GPS time.
+        """
+        if bytes([CID.DeviceTime]) not in self.__requests:
+            self.__requests.append(bytes([CID.DeviceTime]))
+
+    def handle_mac_command(self, fOpts:bytes) -> bool:
+        """
+        Handles the MAC commands of a downlink and queues their answers.
+        Parsing stops at the first unknown CID, whose payload size is unknown.
+
+        Returns:
+            bool: Whether the MAC state changed (and should be saved).
+        """
+        mac_cmd = bytes(fOpts)
         index = 0
-        cid = 0
+        changed = False
         size = len(mac_cmd)
-        self._logger.info(f"MAC cmd[{size}] = {fOpts.hex()}")
+        self._logger.info(f"MAC cmd[{size}] = {mac_cmd.hex()}")
+        link_adr_block = []
         while index < size:
             cid = mac_cmd[index]
+            if cid not in self.__handlers:
+                self._logger.warning(f"Unknown MAC command CID 0x{cid:02X}, {mac_cmd[index:].hex()} ignored")
+                break
+            payload_size, handler = self.__handlers[cid]
+            payload = mac_cmd[index + 1:index + 1 + payload_size]
+            if len(payload) != payload_size:
+                self._logger.warning(f"Truncated MAC command CID 0x{cid:02X}")
+                break
+            index = index + 1 + payload_size
             if cid == CID.LinkADR:
-                self._logger.debug(f"Received LinkADRReq Command")
-                self.__LinkADRAns(mac_cmd[index:index+4])
-                index = index + 4
-            if cid == CID.DevStatus:
-                self._logger.debug(f"Received DevStatusReq Command")
-                self.__DevStatusAns()
-            index = index + 1
\ No newline at end of file
+                # Contiguous LinkADRReq form one block (channel masks of more than 16 channels)
+                link_adr_block.append(payload)
+                continue
+            if len(link_adr_block) > 0:
+                changed = self.__LinkADRReq(link_adr_block) or changed
+                link_adr_block = []
+            self._logger.debug(f"Received {CID(cid).name} Command")
+            changed = handler(payload) or changed
+        if len(link_adr_block) > 0:
+            changed = self.__LinkADRReq(link_adr_block) or changed
+        return changed
+
+    def uplink_frequency(self, channel:int) -> int:
+        """
+        Returns the uplink frequency of a channel (NewChannelReq or region default).
+        """
+        if channel in self.uplink_channels:
+            return self.uplink_channels[channel][0]
+        return self._region.uplink_frequency(channel)
+
+    def downlink_frequency(self, channel:int) -> int:
+        """
+        Returns the RX1 frequency of an uplink channel (DlChannelReq, NewChannelReq or region default).
+        """
+        if channel in self.downlink_channels:
+            return self.downlink_channels[channel]
+        if channel in self.uplink_channels:
+            return self.uplink_channels[channel][0]
+        return self._region.downlink_frequency(channel)
+
+    def defined_channels(self) -> set:
+        """
+        Returns the uplink channels defined by the region and NewChannelReq.
+        """
+        channels = set(range(self._region.value.UPLINK_CHANNEL_MIN, self._region.value.UPLINK_CHANNEL_MAX + 1))
+        for channel, (frequency, _, _) in self.uplink_channels.items():
+            if frequency == 0:
+                channels.discard(channel)
+            else:
+                channels.add(channel)
+        return channels
+
+    def rx1_spreading_factor(self, uplink_spreading_factor:int) -> int:
+        """
+        Returns the RX1 spreading factor of an uplink sent with `uplink_spreading_factor`.
+        """
+        uplink_data_rate = self._region.data_rate(uplink_spreading_factor)
+        if uplink_data_rate is None:
+            return uplink_spreading_factor
+        return self._region.downlink_spreading_factor(self._region.rx1_data_rate(uplink_data_rate, self.rx1_dr_offset))
+
+    def rx2_spreading_factor(self) -> int:
+        """
+        Returns the RX2 spreading factor.
+        """
+        return self._region.downlink_spreading_factor(self.rx2_data_rate)
+
+    def to_dict(self) -> dict:
+        """
+        Returns the MAC state set by the network, to be saved with the session.
+        """
+        return {
+            "data_rate": self.link_adr.data_rate,
+            "tx_power": self.link_adr.tx_power,
+            "nb_tx": self.link_adr.nb_tx,
+            "channels": sorted(self.link_adr.channels),
+            "rx1_dr_offset": self.rx1_dr_offset,
+            "rx2_data_rate": self.rx2_data_rate,
+            "rx2_frequency": self.rx2_frequency,
+            "rx_delay": self.rx_delay,
+            "max_duty_cycle": self.max_duty_cycle,
+            "uplink_channels": {str(channel): list(value) for channel, value in self.uplink_channels.items()},
+            "downlink_channels": {str(channel): frequency for channel, frequency in self.downlink_channels.items()},
+        }
+
+    def set_state(self, state:dict) -> bool:
+        """
+        Restores the MAC state saved by `to_dict()`.
+
+        Returns:
+            bool: Whether the state was restored.
+        """
+        try:
+            self.link_adr.data_rate = int(state["data_rate"])
+            self.link_adr.tx_power = int(state["tx_power"])
+            self.link_adr.nb_tx = int(state["nb_tx"])
+            self.link_adr.channels = set(state["channels"])
+            self.rx1_dr_offset = int(state["rx1_dr_offset"])
+            self.rx2_data_rate = int(state["rx2_data_rate"])
+            if self.rx2_data_rate not in self._region.value.DOWNLINK_DATA_RATES:
+                # Saved from an invalid join accept DLSettings
+                self.rx2_data_rate = self._region.value.RX2_DATA_RATE
+            if self.rx1_dr_offset > self._region.value.RX1_DR_OFFSET_MAX:
+                self.rx1_dr_offset = 0
+            self.rx2_frequency = int(state["rx2_frequency"])
+            self.rx_delay = int(state["rx_delay"])
+            self.max_duty_cycle = int(state["max_duty_cycle"])
+            self.uplink_channels = {int(channel): tuple(value) for channel, value in state["uplink_channels"].items()}
+            self.downlink_channels = {int(channel): int(frequency) for channel, frequency in state["downlink_channels"].items()}
+            return True
+        except Exception as e:
+            self._logger.error(f"MAC state : {e}")
+            self.reset()
+            return False
+
+    def adr_uplink(self) -> bool:
+        """
+        Counts a new uplink in ADR_ACK_CNT and backs off after ADR_ACK_LIMIT + ADR_ACK_DELAY uplinks
+        without downlink: first TX power back to the maximum, then one data rate lower every ADR_ACK_DELAY
+        uplinks, and finally all the default channels enabled.
+
+        Returns:
+            bool: Whether the uplink must set ADRACKReq.
+        """
+        self.link_adr.ack_cnt = self.link_adr.ack_cnt + 1
+        if self.link_adr.ack_cnt < ADR_ACK_LIMIT:
+            return False
+        steps = self.link_adr.ack_cnt - ADR_ACK_LIMIT
+        if steps > 0 and steps % ADR_ACK_DELAY == 0:
+            if self.link_adr.tx_power > 0:
+                self.link_adr.tx_power = 0
+            elif self.link_adr.data_rate > min(self._region.value.DATA_RATES):
+                self.link_adr.data_rate = self.link_adr.data_rate - 1
+            else:
+                self.link_adr.channels = set(range(self._region.value.UPLINK_CHANNEL_MIN, self._region.value.UPLINK_CHANNEL_MAX + 1))
+            self._logger.info(f"ADR backoff : DR{self.link_adr.data_rate}, TXPower {self.link_adr.tx_power}")
+        return True
+
+    def adr_request_ack(self):
+        """
+        Sets ADRACKReq on the next uplink, asking the network for a downlink.
+        """
+        self.link_adr.ack_cnt = max(self.link_adr.ack_cnt, ADR_ACK_LIMIT - 1)
+
+    ############################## MAC command handlers (return whether the MAC state changed)
+
+    def __answer(self, command:list, sticky:bool=False):
+        if sticky:
+            self.__sticky[command[0]] = bytes(command)
+            self.__sticky_unsent = True
+        else:
+            self.__answers.append(bytes(command))
+        self._logger.debug(f"{CID(command[0]).name}Ans Response: {bytes(command).hex()}")
+
+    def __LinkCheckAns(self, payload:bytes) -> bool:
+        self.link_margin = payload[0]
+        self.gateway_count = payload[1]
+        self._logger.info(f"LinkCheck : margin {self.link_margin} dB, {self.gateway_count} gateways")
+        return False
+
+    def __LinkADRReq(self, block:list) -> bool:
+        # The block is applied only if every field of every command is accepted, with the DR, TXPower
+        # and NbTrans of the last command. Every command gets the same LinkADRAns.
+        channels = set(self.link_adr.channels)
+        for LinkADRReq in block:
+            ch_mask = LinkADRReq[1] | (LinkADRReq[2] << 8)
+            ch_mask_ctrl = (LinkADRReq[3] >> 4) & 0x07
+            channels = self.__channel_mask(ch_mask, ch_mask_ctrl, channels)
+            if channels is None:
+                break
+        last = block[-1]
+        data_rate = last[0] >> 4
+        tx_power = last[0] & 0x0F
+        nb_tx = last[3] & 0x0F
+        # 0xF keeps the current data rate / TX power
+        if data_rate == 0x0F:
+            data_rate = self.link_adr.data_rate
+        if tx_power == 0x0F:
+            tx_power = self.link_adr.tx_power
+        PowerACK = 1 if tx_power <= self._region.value.TX_POWER_INDEX_MAX else 0
+        DataRateACK = 1 if data_rate in self._region.value.DATA_RATES else 0
+        ChannelMaskACK = 1 if channels is not None and len(channels) > 0 else 0
+        applied = PowerACK and DataRateACK and ChannelMaskACK
+        if applied:
+            self.link_adr.data_rate = data_rate
+            self.link_adr.tx_power = tx_power
+            self.link_adr.ch_mask = last[1] | (last[2] << 8)
+            self.link_adr.ch_mask_ctrl = (last[3] >> 4) & 0x07
+            self.link_adr.nb_tx = nb_tx if nb_tx > 0 else self.link_adr.nb_tx
+            self.link_adr.channels = channels
+            self._logger.info(f"LinkADR : DR{data_rate}, TXPower {tx_power}, NbTrans {self.link_adr.nb_tx}, {len(channels)} channels")
+        for _ in block:
+            self.__answer([CID.LinkADR, (PowerACK << 2) | (DataRateACK << 1) | (ChannelMaskACK << 0)])
+        return bool(applied)
+
+    def __channel_mask(self, ch_mask:int, ch_mask_ctrl:int, channels:set) -> set:
+        # Enabled channels after applying ChMask to `channels`, None if the mask is not accepted
+        channels = set(channels)
+        defined = self.defined_channels()
+        if self._region == Region.US915:
+            if ch_mask_ctrl <= 3:
+                # ChMask applies to the 125 khz channels 16 * ChMaskCntl to 16 * ChMaskCntl + 15
+                for bit in range(16):
+                    channel = 16 * ch_mask_ctrl + bit
+                    if ch_mask & (1 << bit):
+                        channels.add(channel)
+                    else:
+                        channels.discard(channel)
+            elif ch_mask_ctrl == 6:
+                channels = set(defined)
+            elif ch_mask_ctrl == 7:
+                # Only 500 khz channels, which are not used for uplinks
+                channels = set()
+            else:
+                return None
+        else:
+            if ch_mask_ctrl == 0:
+                channels = {bit for bit in range(16) if ch_mask & (1 << bit)}
+                if not channels.issubset(defined):
+                    return None
+            elif ch_mask_ctrl == 6:
+                channels = set(defined)
+            else:
+                return None
+        return channels
+
+    def __DutyCycleReq(self, payload:bytes) -> bool:
+        self.max_duty_cycle = payload[0] & 0x0F
+        self._logger.info(f"DutyCycle : 1/{2 ** self.max_duty_cycle}")
+        self.__answer([CID.DutyCycle])
+        return True
+
+    def __RXParamSetupReq(self, payload:bytes) -> bool:
+        rx1_dr_offset = (payload[0] >> 4) & 0x07
+        rx2_data_rate = payload[0] & 0x0F
+        frequency = int.from_bytes(payload[1:4], "little") * 100
+        RX1DROffsetACK = 1 if rx1_dr_offset <= self._region.value.RX1_DR_OFFSET_MAX else 0
+        RX2DataRateACK = 1 if rx2_data_rate in self._region.value.DOWNLINK_DATA_RATES else 0
+        ChannelACK = 1 if self.__valid_frequency(frequency) else 0
+        applied = RX1DROffsetACK and RX2DataRateACK and ChannelACK
+        if applied:
+            self.rx1_dr_offset = rx1_dr_offset
+            self.rx2_data_rate = rx2_data_rate
+            self.rx2_frequency = frequency
+            self._logger.info(f"RXParamSetup : RX1DROffset {rx1_dr_offset}, RX2 DR{rx2_data_rate} {frequency} Hz")
+        self.__answer([CID.RXParamSetup, (RX1DROffsetACK << 2) | (RX2DataRateACK << 1) | ChannelACK], sticky=True)
+        return bool(applied)
+
+    def __DevStatusReq(self, payload:bytes) -> bool:
+        snr = max(-32, min(31, int(self.snr)))
+        snr_encoded = snr & 0x3F           # Get two's complement 6-bit representation
+        self.__answer([CID.DevStatus, self.battery_level, snr_encoded])
+        return False
+
+    def __NewChannelReq(self, payload:bytes) -> bool:
+        channel = payload[0]
+        frequency = int.from_bytes(payload[1:4], "little") * 100
+        min_data_rate = payload[4] & 0x0F
+        max_data_rate = payload[4] >> 4
+        # Channels 0 to 2 are the default channels, and US915 has a fixed channel plan
+        editable = self._region == Region.EU868 and 3 <= channel < self._region.value.CHANNELS_MAX
+        ChannelFrequencyACK = 1 if editable and (frequency == 0 or self.__valid_frequency(frequency)) else 0
+        DataRateRangeACK = 1 if editable and min_data_rate <= max_data_rate and \
+                                min_data_rate in self._region.value.DATA_RATES and \
+                                max_data_rate in self._region.value.DATA_RATES else 0
+        applied = ChannelFrequencyACK and DataRateRangeACK
+        if applied:
+            self.uplink_channels[channel] = (frequency, min_data_rate, max_data_rate)
+            self.downlink_channels.pop(channel, None)
+            if frequency == 0:
+                self.link_adr.channels.discard(channel)
+            else:
+                self.link_adr.channels.add(channel)
+            self._logger.info(f"NewChannel : channel {channel}, {frequency} Hz, DR{min_data_rate} to DR{max_data_rate}")
+        self.__answer([CID.NewChannel, (DataRateRangeACK << 1) | ChannelFrequencyACK])
+        return bool(applied)
+
+    def __RXTimingSetupReq(self, payload:bytes) -> bool:
+        # Del 0 means 1 s
+        self.rx_delay = max(UPLINK_RX1_DELAY, payload[0] & 0x0F)
+        self._logger.info(f"RXTimingSetup : RX1 delay {self.rx_delay} s")
+        self.__answer([CID.RXTimingSetup], sticky=True)
+        return True
+
+    def __TXParamSetupReq(self, payload:bytes) -> bool:
+        # Only defined in the regions with a dwell time setting (AS923), not answered here
+        self._logger.debug(f"TXParamSetupReq ignored")
+        return False
+
+    def __DlChannelReq(self, payload:bytes) -> bool:
+        channel = payload[0]
+        frequency = int.from_bytes(payload[1:4], "little") * 100
+        UplinkFrequencyExists = 1 if self._region == Region.EU868 and channel in self.defined_channels() else 0
+        ChannelFrequencyACK = 1 if self._region == Region.EU868 and self.__valid_frequency(frequency) else 0
+        applied = UplinkFrequencyExists and ChannelFrequencyACK
+        if applied:
+            self.downlink_channels[channel] = frequency
+            self._logger.info(f"DlChannel : channel {channel}, RX1 {frequency} Hz")
+        self.__answer([CID.DlChannel, (UplinkFrequencyExists << 1) | ChannelFrequencyACK], sticky=True)
+        return bool(applied)
+
+    def __DeviceTimeAns(self, payload:bytes) -> bool:
+        self.device_time = int.from_bytes(payload[0:4], "little") + payload[4] / 256
+        self._logger.info(f"DeviceTime : {self.device_time:.3f} s (GPS)")
+        return False
+
+    def __valid_frequency(self, frequency:int) -> bool:
+        return self._region.value.FREQUENCY_MIN <= frequency <= self._region.value.FREQUENCY_MAX
@@ -0,0 +1,430 @@
+from .loramac_types import MessageType, LORAWAN_MAX_PAYLOAD_LEN
+from .loramac_settings import CRYPTO_ENGINE, AES_KEY_CACHE_SIZE, KEYSTREAM_CACHE_SIZE, KEYSTREAM_BLOCKS
+from .loramac_wrapper import WrapperLoRaMAC
+
+from threading import Lock
+import functools
+import struct
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:
+    Cipher = None
+
+MTYPE_JOIN_REQUEST          = 0x00
+MTYPE_UNCONFIRMED_DATA_UP   = 0x40
+MTYPE_CONFIRMED_DATA_UP     = 0x80
+BLOCK_SIZE                  = 16
+BLOCK_MASK                  = (1 << 128) - 1
+
+
+############################## Pure Python AES-128 (FIPS-197), encryption only
+
+def _xtime(value:int) -> int:
+    value = value << 1
+    return (value ^ 0x11B) if value & 0x100 else value
+
+def _sbox() -> list:
+    # Multiplicative inverse in GF(2^8) followed by the affine transform
+    sbox = [0x63] * 256
+    p = q = 1
+    while True:
+        p = p ^ _xtime(p)                      # p * 3
+        q = q ^ (q << 1)                       # q / 3
+        q = q ^ (q << 2)
+        q = q ^ (q << 4)
+        q = q & 0xFF
+        if q & 0x80:
+            q = q ^ 0x09
+        x = q
+        for shift in range(1, 5):
+            x = x ^ (((q << shift) | (q >> (8 - shift))) & 0xFF)
+        sbox[p] = x ^ 0x63
+        if p == 1:
+            return sbox
+
+SBOX = _sbox()
+# Round tables: SubBytes, ShiftRows and MixColumns of one byte as a 32-bit column
+TE0 = [(_xtime(s) << 24) | (s << 16) | (s << 8) | (_xtime(s) ^ s) for s in SBOX]
+TE1 = [((t >> 8) | (t << 24)) & 0xFFFFFFFF for t in TE0]
+TE2 = [((t >> 16) | (t << 16)) & 0xFFFFFFFF for t in TE0]
+TE3 = [((t >> 24) | (t << 8)) & 0xFFFFFFFF for t in TE0]
+
+
+def _key_schedule(key:bytes) -> list:
+    # 44 round key words of AES-128
+    words = [int.from_bytes(key[i:i + 4], "big") for i in range(0, 16, 4)]
+    rcon = 1
+    for i in range(4, 44):
+        word = words[i - 1]
+        if i % 4 == 0:
+            word = ((word << 8) | (word >> 24)) & 0xFFFFFFFF
+            word = (SBOX[word >> 24] << 24) | (SBOX[(word >> 16) & 0xFF] << 16) | \
+                   (SBOX[(word >> 8) & 0xFF] << 8) | SBOX[word & 0xFF]
+            word = word ^ (rcon << 24)
+            rcon = _xtime(rcon)
+        words.append(words[i - 4] ^ word)
+    return words
+
+
+def _encrypt_block(round_keys:list, block:int) -> int:
+    s0 = (block >> 96) ^ round_keys[0]
+    s1 = ((block >> 64) & 0xFFFFFFFF) ^ round_keys[1]
+    s2 = ((block >> 32) & 0xFFFFFFFF) ^ round_keys[2]
+    s3 = (block & 0xFFFFFFFF) ^ round_keys[3]
+    for r in range(4, 40, 4):
+        t0 = TE0[s0 >> 24] ^ TE1[(s1 >> 16) & 0xFF] ^ TE2[(s2 >> 8) & 0xFF] ^ TE3[s3 & 0xFF] ^ round_keys[r]
+        t1 = TE0[s1 >> 24] ^ TE1[(s2 >> 16) & 0xFF] ^ TE2[(s3 >> 8) & 0xFF] ^ TE3[s0 & 0xFF] ^ round_keys[r + 1]
+        t2 = TE0[s2 >> 24] ^ TE1[(s3 >> 16) & 0xFF] ^ TE2[(s0 >> 8) & 0xFF] ^ TE3[s1 & 0xFF] ^ round_keys[r + 2]
+        t3 = TE0[s3 >> 24] ^ TE1[(s0 >> 16) & 0xFF] ^ TE2[(s1 >> 8) & 0xFF] ^ TE3[s2 & 0xFF] ^ round_keys[r + 3]
+        s0, s1, s2, s3 = t0, t1, t2, t3
+    # Last round without MixColumns
+    c0 = ((SBOX[s0 >> 24] << 24) | (SBOX[(s1 >> 16) & 0xFF] << 16) | (SBOX[(s2 >> 8) & 0xFF] << 8) | SBOX[s3 & 0xFF]) ^ round_keys[40]
+    c1 = ((SBOX[s1 >> 24] << 24) | (SBOX[(s2 >> 16) & 0xFF] << 16) | (SBOX[(s3 >> 8) & 0xFF] << 8) | SBOX[s0 & 0xFF]) ^ round_keys[41]
+    c2 = ((SBOX[s2 >> 24] << 24) | (SBOX[(s3 >> 16) & 0xFF] << 16) | (SBOX[(s0 >> 8) & 0xFF] << 8) | SBOX[s1 & 0xFF]) ^ round_keys[42]
+    c3 = ((SBOX[s3 >> 24] << 24) | (SBOX[(s0 >> 16) & 0xFF] << 16) | (SBOX[(s1 >> 8) & 0xFF] << 8) | SBOX[s2 & 0xFF]) ^ round_keys[43]
+    return (c0 << 96) | (c1 << 64) | (c2 << 32) | c3
+
+
+class AESCipher():
+    """
+    The `AESCipher` class is an AES-128 block cipher with the AES-CMAC (RFC 4493) of LoRaWAN.
+    It runs on the `cryptography` package when it is installed, else on a pure Python AES.
+    Ciphers are cached per key by `AESCipher.of()`, so the key schedule of a session key is computed once.
+
+    Example Usage:
+        cipher = AESCipher.of(NwkSKey)\n
+        mic    = cipher.cmac(B0 + message)[:4]\n
+        blocks = cipher.encrypt(A1 + A2)\n
+    """
+
+    def __init__(self, key:bytes, backend:str=None):
+        """
+        Initializes the `AESCipher` with its key schedule and its CMAC subkeys.
+
+        Args:
+            key (bytes): The 16 bytes AES key.
+            backend (str): "cryptography" or "python". Default is None ("cryptography" if installed).
+
+        Raises:
+            ValueError: If the key is not 16 bytes long or the backend is not available.
+        """
+        if len(key) != BLOCK_SIZE:
+            raise ValueError("AESCipher : key invalid")
+        if backend is None:
+            backend = "python" if Cipher is None else "cryptography"
+        if backend == "cryptography" and Cipher is None:
+            raise ValueError("AESCipher : cryptography package not installed")
+        self.backend = backend
+        self._encryptor = None
+        self._round_keys = None
+        self._lock = Lock()          # the encryptor of a cached cipher is shared by the threads
+        if backend == "cryptography":
+            self._encryptor = Cipher(algorithms.AES(bytes(key)), modes.ECB()).encryptor()
+        else:
+            self._round_keys = _key_schedule(bytes(key))
+        # CMAC subkeys K1 and K2
+        self._k1 = self.__double(self.encrypt_int(0))
+        self._k2 = self.__double(self._k1)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=AES_KEY_CACHE_SIZE)
+    def of(key:bytes, backend:str=None) -> 'AESCipher':
+        """
+        Returns the cached `AESCipher` of a key.
+        """
+        return AESCipher(bytes(key), backend)
+
+    def encrypt_int(self, block:int) -> int:
+        """
+        Encrypts one block given as a 128-bit integer (big endian).
+        """
+        if self._encryptor is not None:
+            with self._lock:
+                return int.from_bytes(self._encryptor.update(block.to_bytes(BLOCK_SIZE, "big")), "big")
+        return _encrypt_block(self._round_keys, block)
+
+    def encrypt(self, blocks:bytes) -> bytes:
+        """
+        Encrypts whole blocks in ECB mode.
+        """
+        if self._encryptor is not None:
+            with self._lock:
+                return self._encryptor.update(bytes(blocks))
+        output = bytearray()
+        for i in range(0, len(blocks), BLOCK_SIZE):
+            block = _encrypt_block(self._round_keys, int.from_bytes(blocks[i:i + BLOCK_SIZE], "big"))
+            output.extend(block.to_bytes(BLOCK_SIZE, "big"))
+        return bytes(output)
+
+    def cmac(self, message:bytes) -> bytes:
+        """
+        Returns the 16 bytes AES-CMAC of a message.
+        """
+        size = len(message)
+        last = max(0, (size - 1) // BLOCK_SIZE) * BLOCK_SIZE
+        mac = 0
+        for i in range(0, last, BLOCK_SIZE):
+            mac = self.encrypt_int(mac ^ int.from_bytes(message[i:i + BLOCK_SIZE], "big"))
+        tail = bytes(message[last:])
+        if size > 0 and len(tail) == BLOCK_SIZE:
+            block = int.from_bytes(tail, "big") ^ self._k1
+        else:
+            block = int.from_bytes(tail + bytes([0x80]) + bytes(BLOCK_SIZE - 1 - len(tail)), "big") ^ self._k2
+        return self.encrypt_int(mac ^ block).to_bytes(BLOCK_SIZE, "big")
+
+    @staticmethod
+    def __double(value:int) -> int:
+        # Multiplication by x in GF(2^128)
+        value = value << 1
+        return (value & BLOCK_MASK) ^ 0x87 if value >> 128 else value
+
+
+############################## LoRaWAN 1.0.2 frames
+
+def _b0_prefix(DevAddr:bytes, FCnt:int, downlink:bool) -> bytes:
+    # B0 block of the MIC without its last byte (message length)
+    return bytes([0x49, 0, 0, 0, 0, 1 if downlink else 0]) + DevAddr[::-1] + struct.pack("<I", FCnt & 0xFFFFFFFF) + bytes([0])
+
+
+def _a_blocks(DevAddr:bytes, FCnt:int, downlink:bool, count:int) -> bytes:
+    # A_1 to A_count blocks of the FRMPayload encryption
+    prefix = bytes([0x01, 0, 0, 0, 0, 1 if downlink else 0]) + DevAddr[::-1] + struct.pack("<I", FCnt & 0xFFFFFFFF) + bytes([0])
+    return b"".join(prefix + bytes([i]) for i in range(1, count + 1))
+
+
+def frame_mic(key:bytes, message:bytes, DevAddr:bytes, FCnt:int, downlink:bool, b0:bytes=None) -> bytes:
+    """
+    Returns the MIC of a data frame (`message` is MHDR to FRMPayload, `DevAddr` as stored in `Device`).
+    `b0` is the B0 block without its length byte, when precomputed.
+    """
+    if b0 is None:
+        b0 = _b0_prefix(DevAddr, FCnt, downlink)
+    return AESCipher.of(key).cmac(b0 + bytes([len(message)]) + message)[:4]
+
+
+def frame_crypt(key:bytes, payload:bytes, DevAddr:bytes, FCnt:int, downlink:bool, keystream:bytes=None) -> bytes:
+    """
+    Encrypts or decrypts a FRMPayload (AES-CTR with the A_i blocks of LoRaWAN).
+    `keystream` is the encrypted A_i blocks of the frame, when precomputed (see `KeystreamCache`).
+    """
+    size = len(payload)
+    if size == 0:
+        return bytes([])
+    if keystream is None or len(keystream) < size:
+        keystream = AESCipher.of(key).encrypt(_a_blocks(DevAddr, FCnt, downlink, (size + BLOCK_SIZE - 1) // BLOCK_SIZE))
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(keystream[:size], "big")).to_bytes(size, "big")
+
+
+class KeystreamCache():
+    """
+    The `KeystreamCache` class holds the keystreams (A_i blocks encrypted with AppSKey) and the B0 blocks
+    of the next uplinks of one session. FCnt only grows and DevAddr is fixed during a session, so the frames
+    FCnt+1 to FCnt+KEYSTREAM_CACHE_SIZE are computed while the radio is idle, and encrypting an uplink is a XOR.
+    The caches are kept by DevAddr; a new AppSKey (join) or `release()` drops the cache of the session.
+
+    Example Usage:
+        KeystreamCache.prepare(DevAddr, AppSKey, FCnt)\n
+        b0, keystream = KeystreamCache.of(DevAddr).take(FCnt + 1)\n
+    """
+
+    _caches = {}
+    _lock = Lock()
+
+    def __init__(self, DevAddr:bytes, AppSKey:bytes):
+        self.DevAddr = bytes(DevAddr)
+        self.AppSKey = bytes(AppSKey)
+        self._frames = {}                      # FCnt : (B0 prefix, keystream), replaced as a whole
+
+    @staticmethod
+    def of(DevAddr:bytes) -> 'KeystreamCache':
+        """
+        Returns the cache of a DevAddr, None if no uplink is prepared.
+        """
+        return KeystreamCache._caches.get(bytes(DevAddr))
+
+    @staticmethod
+    def prepare(DevAddr:bytes, AppSKey:bytes, FCnt:int, count:int=KEYSTREAM_CACHE_SIZE) -> 'KeystreamCache':
+        """
+        Computes the frames following the last sent FCnt that are not in the cache yet.
+
+        Args:
+            DevAddr (bytes): The DevAddr of the session.
+            AppSKey (bytes): The AppSKey of the session.
+            FCnt (int): The frame counter of the last uplink.
+            count (int): The number of frames kept ahead. Default is KEYSTREAM_CACHE_SIZE.
+
+        Returns:
+            KeystreamCache: The cache of the session.
+        """
+        DevAddr = bytes(DevAddr)
+        with KeystreamCache._lock:
+            cache = KeystreamCache._caches.get(DevAddr)
+            if cache is None or cache.AppSKey != AppSKey:
+                cache = KeystreamCache(DevAddr, AppSKey)
+                KeystreamCache._caches[DevAddr] = cache
+        cache.fill(FCnt, count)
+        return cache
+
+    @staticmethod
+    def release(DevAddr:bytes):
+        """
+        Drops the cache of a DevAddr (session ended or joined again).
+        """
+        with KeystreamCache._lock:
+            KeystreamCache._caches.pop(bytes(DevAddr), None)
+
+    def fill(self, FCnt:int, count:int):
+        """
+        Drops the frames up to FCnt and computes the missing frames up to FCnt + count, in one AES call.
+        """
+        frames = {key: value for key, value in self._frames.items() if key > FCnt}
+        missing = [key for key in range(FCnt + 1, FCnt + count + 1) if key not in frames]
+        if len(missing) > 0:
+            blocks = b"".join(_a_blocks(self.DevAddr, key, False, KEYSTREAM_BLOCKS) for key in missing)
+            keystream = AESCipher.of(self.AppSKey).encrypt(blocks)
+            size = KEYSTREAM_BLOCKS * BLOCK_SIZE
+            for i, key in enumerate(missing):
+                frames[key] = (_b0_prefix(self.DevAddr, key, False), keystream[i * size:(i + 1) * size])
+        self._frames = frames
+
+    def take(self, FCnt:int) -> tuple:
+        """
+        Returns the B0 prefix and the keystream of an uplink, (None, None) if not computed.
+        """
+        return self._frames.get(FCnt, (None, None))
+
+
+class CryptoLoRaMAC():
+    """
+    The `CryptoLoRaMAC` class builds and parses the LoRaWAN 1.0.2 frames in Python, without the C shared library.
+    Its static methods take the same arguments and return the same dictionaries as `WrapperLoRaMAC`,
+    so `LoRaMAC` uses either of them (see CRYPTO_ENGINE and `lorawan_codec()`).
+
+    Example Usage:
+        response = CryptoLoRaMAC.unconfirmed_data_up(payload, FCnt, FPort, DevAddr, NwkSKey, AppSKey)\n
+        PHYPayload = response["PHYPayload"]\n
+    """
+
+    LORAWAN_MAX_FOPTS_LEN = WrapperLoRaMAC.LORAWAN_MAX_FOPTS_LEN
+    LORAWAN_BUFFER_SIZE_MAX = WrapperLoRaMAC.LORAWAN_BUFFER_SIZE_MAX
+
+    @staticmethod
+    def message_type(PHYPayload:bytes) -> MessageType:
+        return MessageType(PHYPayload[0] >> 5)
+
+    @staticmethod
+    def prepare_session(DevAddr:bytes, NwkSKey:bytes, AppSKey:bytes, FCnt:int):
+        """
+        Computes the keystreams of the next uplinks of a session (call it while the radio is idle).
+        """
+        KeystreamCache.prepare(DevAddr, AppSKey, FCnt)
+
+    @staticmethod
+    def release_session(DevAddr:bytes):
+        """
+        Drops the precomputed uplinks of a session.
+        """
+        KeystreamCache.release(DevAddr)
+
+    @staticmethod
+    def join_request(DevEUI:bytes, AppEUI:bytes, AppKey:bytes, DevNonce:int) -> dict:
+        message = bytes([MTYPE_JOIN_REQUEST]) + AppEUI[::-1] + DevEUI[::-1] + struct.pack("<H", DevNonce & 0xFFFF)
+        return {"PHYPayload": message + AESCipher.of(AppKey).cmac(message)[:4]}
+
+    @staticmethod
+    def join_accept(PHYPayload:bytes, AppKey:bytes, DevNonce:int) -> dict:
+        if len(PHYPayload) not in (17, 33):
+            return None
+        cipher = AESCipher.of(AppKey)
+        # The network encrypts the join accept with AES decrypt, the device decrypts it with AES encrypt
+        body = cipher.encrypt(PHYPayload[1:])
+        if cipher.cmac(PHYPayload[:1] + body[:-4])[:4] != body[-4:]:
+            return None
+        nonces = body[0:6] + struct.pack("<H", DevNonce & 0xFFFF) + bytes(7)
+        output = {}
+        output["DevAddr"] = body[6:10][::-1]
+        output["NwkSKey"] = cipher.encrypt(bytes([0x01]) + nonces)
+        output["AppSKey"] = cipher.encrypt(bytes([0x02]) + nonces)
+        output["RxDelay"] = body[11]
+        output["RX1DROffset"] = (body[10] >> 4) & 0x07
+        output["RX2DataRate"] = body[10] & 0x0F
+        return output
+
+    @staticmethod
+    def unconfirmed_data_up(MacPayload:bytes, FCnt:int, FPort:int, DevAddr:bytes, NwkSKey:bytes, AppSKey:bytes, adr:bool=True, ack:bool=False, fOpts:bytes=None, adr_ack_req:bool=False) -> dict:
+        return CryptoLoRaMAC.__data_up(MTYPE_UNCONFIRMED_DATA_UP, MacPayload, FCnt, FPort, DevAddr, NwkSKey, AppSKey,
+                                       adr, ack, fOpts, adr_ack_req)
+
+    @staticmethod
+    def confirmed_data_up(MacPayload:bytes, FCnt:int, FPort:int, DevAddr:bytes, NwkSKey:bytes, AppSKey:bytes, adr:bool=True, ack:bool=False, fOpts:bytes=None, adr_ack_req:bool=False) -> dict:
+        return CryptoLoRaMAC.__data_up(MTYPE_CONFIRMED_DATA_UP, MacPayload, FCnt, FPort, DevAddr, NwkSKey, AppSKey,
+                                       adr, ack, fOpts, adr_ack_req)
+
+    @staticmethod
+    def data_down(PHYPayload:bytes, DevAddr:bytes, NwkSKey:bytes, AppSKey:bytes) -> dict:
+        size = len(PHYPayload)
+        if size < 12 or PHYPayload[1:5] != DevAddr[::-1]:
+            return None
+        FCtrl = PHYPayload[5]
+        FOptsLen = FCtrl & 0x0F
+        FCnt = PHYPayload[6] | (PHYPayload[7] << 8)
+        start = 8 + FOptsLen
+        if start > size - 4:
+            return None
+        if frame_mic(NwkSKey, PHYPayload[:-4], DevAddr, FCnt, True) != PHYPayload[-4:]:
+            return None
+        FPort = 0
+        payload = bytes([])
+        if start < size - 4:
+            FPort = PHYPayload[start]
+            payload = frame_crypt(NwkSKey if FPort == 0 else AppSKey, PHYPayload[start + 1:-4], DevAddr, FCnt, True)
+        output = {}
+        output["MacPayload"] = payload
+        output["FOpts"] = bytes(PHYPayload[8:start])
+        output["ADR"] = bool(FCtrl & 0x80)
+        output["RFU"] = bool(FCtrl & 0x40)
+        output["ACK"] = bool(FCtrl & 0x20)
+        output["FPending"] = bool(FCtrl & 0x10)
+        output["FOptsLen"] = FOptsLen
+        output["FCntDown"] = FCnt
+        output["FPortDown"] = FPort
+        return output
+
+    @staticmethod
+    def __data_up(MHDR:int, MacPayload:bytes, FCnt:int, FPort:int, DevAddr:bytes, NwkSKey:bytes, AppSKey:bytes,
+                  adr:bool, ack:bool, fOpts:bytes, adr_ack_req:bool) -> dict:
+        if fOpts is None:
+            fOpts = bytes([])
+        if len(MacPayload) > LORAWAN_MAX_PAYLOAD_LEN or len(fOpts) > CryptoLoRaMAC.LORAWAN_MAX_FOPTS_LEN:
+            raise ValueError("CryptoLoRaMAC : payload or FOpts too long")
+        b0, keystream = None, None
+        cache = KeystreamCache.of(DevAddr)
+        if cache is not None:
+            b0, keystream = cache.take(FCnt)
+            if FPort == 0 or cache.AppSKey != AppSKey:
+                keystream = None
+        FCtrl = (adr << 7) | (adr_ack_req << 6) | (ack << 5) | len(fOpts)
+        message = bytes([MHDR]) + DevAddr[::-1] + bytes([FCtrl]) + struct.pack("<H", FCnt & 0xFFFF) + bytes(fOpts)
+        if len(MacPayload) > 0:
+            # FPort 0 carries MAC commands encrypted with NwkSKey
+            message = message + bytes([FPort]) + frame_crypt(NwkSKey if FPort == 0 else AppSKey, MacPayload, DevAddr, FCnt, False,
+                                                             keystream)
+        if len(message) + 4 > CryptoLoRaMAC.LORAWAN_BUFFER_SIZE_MAX:
+            raise ValueError("CryptoLoRaMAC : payload or FOpts too long")
+        return {"PHYPayload": message + frame_mic(NwkSKey, message, DevAddr, FCnt, False, b0)}
+
+
+def lorawan_codec(engine:str=CRYPTO_ENGINE):
+    """
+    Returns the class building and parsing the LoRaWAN frames for CRYPTO_ENGINE.
+
+    Args:
+        engine (str): "library" (C shared library), "python" (`CryptoLoRaMAC`) or "auto" (the library if it loads).
+
+    Returns:
+        type: `WrapperLoRaMAC` or `CryptoLoRaMAC`.
+    """
+    if engine == "library" or (engine == "auto" and WrapperLoRaMAC.available()):
+        return WrapperLoRaMAC
+    return CryptoLoRaMAC
@@ -1,8 +1,22 @@
+from threading import RLock, Condition, Thread
+from contextlib import contextmanager
+import itertools
+import logging
 import sqlite3
+import atexit
+import json
 import os
 
 __currentdir = os.path.dirname(os.path.realpath(__file__))
-SQLITE_DATABASE_PATH = os.path.join(__currentdir, "loramac.db")
+# LORAMAC_DATABASE overrides the database file (benchmarks and simulations)
+SQLITE_DATABASE_PATH = os.environ.get("LORAMAC_DATABASE", os.path.join(__currentdir, "loramac.db"))
+# Persistent connection (see Database.persistent) : no fsync per commit, readers never block the writer.
+# The DevNonce and FCnt barriers make their commits durable with Database.sync()
+SQLITE_JOURNAL_MODE      = "WAL"
+SQLITE_SYNCHRONOUS       = "NORMAL"
+SQLITE_CACHED_STATEMENTS = 32
+# Write-behind (see WriteBehindDatabase) : updates wait this long to be coalesced in one transaction
+WRITE_BEHIND_DELAY       = 0.5     # 500 ms
 
 TABLE_DEVICE_QUERY = """
 CREATE TABLE IF NOT EXISTS DEVICE (
@@ -22,12 +36,27 @@ CREATE TABLE IF NOT EXISTS DEVICE (
 );
 """
 
+TABLE_MAC_STATE_QUERY = """
+CREATE TABLE IF NOT EXISTS MAC_STATE (
+    DevEUI VARCHAR(16) PRIMARY KEY,
+    State TEXT NOT NULL,
+    Updated_at TIMESTAMP DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now', 'utc'))
+);
+"""
+
 SELECT_DEVICES_QUERY = "SELECT * FROM DEVICE "
 SELECT_DEVICE_QUERY  = "SELECT * FROM DEVICE WHERE DevEUI = ? "
 INSERT_DEVICE_QUERY  = "INSERT INTO DEVICE(DevEUI, AppEUI, AppKey) VALUES(?, ?, ?) "
 UPDATE_DEVICE_QUERY  = "UPDATE DEVICE SET "
 DELETE_DEVICE_QUERY  = "DELETE FROM DEVICE WHERE DevEUI = ? "
+SELECT_MAC_STATE_QUERY = "SELECT State FROM MAC_STATE WHERE DevEUI = ? "
+UPSERT_MAC_STATE_QUERY = "INSERT OR REPLACE INTO MAC_STATE(DevEUI, State) VALUES(?, ?) "
 SELECT_DEVICE_QUERY_BY_DEVADDR  = "SELECT * FROM DEVICE WHERE DevAddr = ? "
+UPDATE_DEV_NONCE_QUERY      = UPDATE_DEVICE_QUERY + "DevNonce = ? WHERE DevEUI = ?"
+UPDATE_F_CNT_QUERY          = UPDATE_DEVICE_QUERY + "FCnt = ? WHERE DevEUI = ?"
+UPDATE_SESSION_KEYS_QUERY   = UPDATE_DEVICE_QUERY + "DevAddr = ?, NwkSKey = ?, AppSKey = ? WHERE DevEUI = ?"
+UPDATE_IS_JOINED_QUERY      = UPDATE_DEVICE_QUERY + "isJoined = ? WHERE DevEUI = ?"
+UPDATE_CHANNEL_GROUP_QUERY  = UPDATE_DEVICE_QUERY + "channelGoup = ? WHERE DevEUI = ?"
 
 DEFAULT_APPEUI       = "0000000000000000"
 
@@ -37,22 +66,94 @@ class COLOR:
     END = '\033[0m'
 
 class Database():
+    """
+    The `Database` class stores the devices and their MAC state in SQLite.
+    Opened with `persistent=True`, all the `Database` objects of a file share one connection in WAL mode,
+    opened once and kept for the life of the process: statements stay prepared and each call holds a lock,
+    so the handle is shared by the threads of `LoRaMAC`. Otherwise `open()` connects and `close()` disconnects.
+
+    Example Usage:
+        db = Database(persistent=True)\n
+        db.open()\n
+        db.update_f_cnt(DevEUI, FCnt)\n
+    """
+
+    # Persistent connections by database file : (connection, lock)
+    __shared = {}
+    __shared_lock = RLock()
 
-    def __init__(self, database_name : str = SQLITE_DATABASE_PATH):
+    def __init__(self, database_name : str = SQLITE_DATABASE_PATH, persistent : bool = False):
         self.__name = database_name
+        self.__persistent = persistent
         self.__connection : sqlite3.Connection = None
         self.__cursor : sqlite3.Cursor = None
+        self.__lock = RLock()
+        self.__batch = 0
 
     def open(self):
-        self.__connection = sqlite3.connect(self.__name)
+        if self.__persistent:
+            self.__connection, self.__lock = Database.__shared_connection(self.__name)
+        else:
+            self.__connection = sqlite3.connect(self.__name)
         self.__cursor = self.__connection.cursor()
 
     def close(self):
         if self.__connection != None:
-            self.__connection.close()
+            if not self.__persistent:
+                self.__connection.close()
             self.__connection = None
             self.__cursor = None
 
+    @staticmethod
+    def __shared_connection(database_name : str) -> tuple:
+        with Database.__shared_lock:
+            if database_name not in Database.__shared:
+                connection = sqlite3.connect(database_name, check_same_thread=False,
+                                             cached_statements=SQLITE_CACHED_STATEMENTS)
+                connection.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+                connection.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+                Database.__shared[database_name] = (connection, RLock())
+            return Database.__shared[database_name]
+
+    @contextmanager
+    def batch(self):
+        """
+        Groups the updates made in the `with` block in one transaction, committed at its end.
+        """
+        with self.__lock:
+            self.__batch = self.__batch + 1
+            try:
+                yield self
+            finally:
+                self.__batch = self.__batch - 1
+                if self.__batch == 0 and self.__connection != None:
+                    self.__connection.commit()
+
+    def __commit(self):
+        if self.__batch == 0:
+            self.__connection.commit()
+
+    def sync(self) -> bool:
+        """
+        Makes the committed transactions durable with an fsync of the WAL, which synchronous NORMAL skips at commit.
+        """
+        with self.__lock:
+            try:
+                if self.__connected__() is not True:
+                    return False
+                wal = self.__name + "-wal"
+                if not os.path.exists(wal):
+                    # Rollback journal: the commits are already synced
+                    return True
+                fd = os.open(wal, os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                return True
+            except:
+                return False
+
     def __connected__(self):
         if self.__connection == None :
             print(COLOR.FAIL+"No connection"+COLOR.END)
@@ -60,164 +161,360 @@ class Database():
         return True
 
     def create_table(self) -> bool:
-        try:
-            if self.__connected__() is not True:
+        with self.__lock:
+            try:
+                if self.__connected__() is not True:
+                    return False
+                self.__cursor.execute(TABLE_DEVICE_QUERY)
+                self.__cursor.execute(TABLE_MAC_STATE_QUERY)
+                self.__commit()
+                return True
+            except:
+                print("failed")
                 return False
-            self.__cursor.execute(TABLE_DEVICE_QUERY)
-            self.__connection.commit()
-            return True
-        except:
-            print("failed")
-            return False
 
 
 
     ######################## Table DEVICE CRUD methods #############################
     
     def get_device(self, DevEUI:str=None) -> dict:
-        try:
-            if self.__connected__() is not True:
+        with self.__lock:
+            try:
+                if self.__connected__() is not True:
+                    return None
+                if DevEUI == None:
+                    print(COLOR.FAIL+"DevEUI can't be none"+COLOR.END)
+                    return None
+                self.__cursor.execute(SELECT_DEVICE_QUERY, (DevEUI,))
+                item = self.__cursor.fetchone()
+                device = {}
+                columns = [description[0] for description in self.__cursor.description]
+                for i in range(len(columns)):
+                    device[columns[i]] = item[i]
+                return device
+            except:
                 return None
-            if DevEUI == None:
-                print(COLOR.FAIL+"DevEUI can't be none"+COLOR.END)
-                return None
-            self.__cursor.execute(SELECT_DEVICE_QUERY, (DevEUI,))
-            item = self.__cursor.fetchone()
-            device = {}
-            columns = [description[0] for description in self.__cursor.description]
-            for i in range(len(columns)):
-                device[columns[i]] = item[i]
-            return device
-        except:
-            return None
 
     def get_device_by_devaddr(self, DevAddr:str=None) -> dict:
-        try:
-            if self.__connected__() is not True:
-                return None
-            if DevAddr == None:
-                print(COLOR.FAIL+"DevAddr can't be none"+COLOR.END)
+        with self.__lock:
+            try:
+                if self.__connected__() is not True:
+                    return None
+                if DevAddr == None:
+                    print(COLOR.FAIL+"DevAddr can't be none"+COLOR.END)
+                    return None
+                self.__cursor.execute(SELECT_DEVICE_QUERY_BY_DEVADDR, (DevAddr,))
+                items = self.__cursor.fetchone()
+                device = {}
+                columns = [description[0] for description in self.__cursor.description]
+                for i in range(len(columns)):
+                    device[columns[i]] = items[i]
+                return device
+            except:
                 return None
-            self.__cursor.execute(SELECT_DEVICE_QUERY_BY_DEVADDR, (DevAddr,))
-            items = self.__cursor.fetchone()
-            device = {}
-            columns = [description[0] for description in self.__cursor.description]
-            for i in range(len(columns)):
-                device[columns[i]] = items[i]
-            return device
-        except:
-            return None
     
 
     def insert_device(self, DevEUI:str=None, AppEUI:str=DEFAULT_APPEUI, AppKey:str=None) -> bool:
-        try:
-            if self.__connected__() is not True:
+        with self.__lock:
+            try:
+                if self.__connected__() is not True:
+                    return False
+                if DevEUI == None or AppKey == None:
+                    print(COLOR.FAIL+"DevEUI or AppEUI can't be none"+COLOR.END)
+                    return False
+                self.__cursor.execute(INSERT_DEVICE_QUERY, (DevEUI, AppEUI, AppKey,))
+                self.__commit()
+                return True
+            except:
                 return False
-            if DevEUI == None or AppKey == None:
-                print(COLOR.FAIL+"DevEUI or AppEUI can't be none"+COLOR.END)
-                return False
-            self.__cursor.execute(INSERT_DEVICE_QUERY, (DevEUI, AppEUI, AppKey,))
-            self.__cursor.connection.commit()
-            return True
-        except:
-            return False
     
     def update_dev_nonce(self, DevEUI:str=None, DevNonce:int=1) -> bool:
-        try:
-            if self.__connected__() is not True:
-                return False
-            if DevEUI == None:
-                print(COLOR.FAIL+"DevEUI can't be none"+COLOR.END)
-                return False
-            if DevNonce <= 0 or DevNonce >= 65536:
-                print(COLOR.FAIL+"DevNonce must be between 1 and 65535"+COLOR.END)
+        with self.__lock:
+            try:
+                if self.__connected__() is not True:
+                    return False
+                if DevEUI == None:
+                    print(COLOR.FAIL+"DevEUI can't be none"+COLOR.END)
+                    return False
+                if DevNonce <= 0 or DevNonce >= 65536:
+                    print(COLOR.FAIL+"DevNonce must be between 1 and 65535"+COLOR.END)
+                    return False
+                self.__cursor.execute(UPDATE_DEV_NONCE_QUERY, (DevNonce, DevEUI,))
+                self.__commit()
+                return True
+            except:
                 return False
-            query = UPDATE_DEVICE_QUERY + "DevNonce = ? " \
-                                        + "WHERE DevEUI = ?"
-            self.__cursor.execute(query, (DevNonce, DevEUI,))
-            self.__connection.commit()
-            return True
-        except:
-            return False
 
     def update_f_cnt(self, DevEUI:str=None, FCnt:int=1) -> bool:
-        try:
-            if self.__connected__() is not True:
-                return False
-            if DevEUI == None:
-                print(COLOR.FAIL+"DevEUI can't be none"+COLOR.END)
+        with self.__lock:
+            try:
+                if self.__connected__() is not True:
+                    return False
+                if DevEUI == None:
+                    print(COLOR.FAIL+"DevEUI can't be none"+COLOR.END)
+                    return False
+                if FCnt < 0 or FCnt > 0xFFFFFFFF:
+                    print(COLOR.FAIL+"FCnt must be between 0 and 4294967295"+COLOR.END)
+                    return False
+                self.__cursor.execute(UPDATE_F_CNT_QUERY, (FCnt, DevEUI,))
+                self.__commit()
+                return True
+            except:
                 return False
-            if FCnt < 0 or FCnt > 65536:
-                print(COLOR.FAIL+"FCnt must be between 0 and 65535"+COLOR.END)
-                return False
-            query = UPDATE_DEVICE_QUERY + "FCnt = ? " \
-                                        + "WHERE DevEUI = ?"
-            self.__cursor.execute(query, (FCnt, DevEUI,))
-            self.__connection.commit()
-            return True
-        except:
-            return False
 
     def update_session_keys(self, DevEUI:str=None, DevAddr:str=None, NwkSKey:str=None, AppSKey:str=None) -> bool:
-        try:
-            if self.__connected__() is not True:
-                return False
-            if DevEUI == None or DevAddr == None or NwkSKey == None or AppSKey == None:
-                print(COLOR.FAIL+"DevEUI or DevAddr or NwkSKey or AppSKey can't be none"+COLOR.END)
+        with self.__lock:
+            try:
+                if self.__connected__() is not True:
+                    return False
+                if DevEUI == None or DevAddr == None or NwkSKey == None or AppSKey == None:
+                    print(COLOR.FAIL+"DevEUI or DevAddr or NwkSKey or AppSKey can't be none"+COLOR.END)
+                    return False
+                self.__cursor.execute(UPDATE_SESSION_KEYS_QUERY, (DevAddr, NwkSKey, AppSKey, DevEUI,))
+                self.__commit()
+                return True
+            except:
                 return False
-            query = UPDATE_DEVICE_QUERY + "DevAddr = ?, " \
-                                        + "NwkSKey = ?, " \
-                                        + "AppSKey = ? " \
-                                        + "WHERE DevEUI = ?"
-            self.__cursor.execute(query, (DevAddr, NwkSKey, AppSKey, DevEUI,))
-            self.__connection.commit()
-            return True
-        except:
-            return False
     
 
     def update_is_joined(self, DevEUI:str=None, isJoined:bool=False) -> bool:
-        try:
-            if self.__connected__() is not True:
+        with self.__lock:
+            try:
+                if self.__connected__() is not True:
+                    return False
+                if DevEUI == None:
+                    print(COLOR.FAIL+"DevEUI can't be none"+COLOR.END)
+                    return False
+                self.__cursor.execute(UPDATE_IS_JOINED_QUERY, (isJoined, DevEUI,))
+                self.__commit()
+                return True
+            except:
                 return False
-            if DevEUI == None:
-                print(COLOR.FAIL+"DevEUI can't be none"+COLOR.END)
-                return False
-            query = UPDATE_DEVICE_QUERY + "isJoined = ? " \
-                                        + "WHERE DevEUI = ?"
-            self.__cursor.execute(query, (isJoined, DevEUI,))
-            self.__connection.commit()
-            return True
-        except:
-            return False
     def update_channel_group(self, DevEUI:str=None, channelGoup:int=0) -> bool:
-        try:
-            if self.__connected__() is not True:
-                return False
-            if DevEUI == None:
-                print(COLOR.FAIL+"DevEUI can't be none"+COLOR.END)
-                return False
-            if channelGoup < 0 or channelGoup > 7:
-                print(COLOR.FAIL+"DevNonce must be between 0 and 7"+COLOR.END)
+        with self.__lock:
+            try:
+                if self.__connected__() is not True:
+                    return False
+                if DevEUI == None:
+                    print(COLOR.FAIL+"DevEUI can't be none"+COLOR.END)
+                    return False
+                if channelGoup < 0 or channelGoup > 7:
+                    print(COLOR.FAIL+"DevNonce must be between 0 and 7"+COLOR.END)
+                    return False
+                self.__cursor.execute(UPDATE_CHANNEL_GROUP_QUERY, (channelGoup, DevEUI,))
+                self.__commit()
+                return True
+            except:
                 return False
-            query = UPDATE_DEVICE_QUERY + "channelGoup = ? " \
-                                        + "WHERE DevEUI = ?"
-            self.__cursor.execute(query, (channelGoup, DevEUI,))
-            self.__connection.commit()
-            return True
-        except:
-            return False
     def delete_device(self, DevEUI:str=None) -> bool:
-        try:
-            if self.__connected__() is not True:
+        with self.__lock:
+            try:
+                if self.__connected__() is not True:
+                    return False
+                if DevEUI == None:
+                    print(COLOR.FAIL+"DevEUI can't be none"+COLOR.END)
+                    return False
+                self.__cursor.execute(DELETE_DEVICE_QUERY, (DevEUI,))
+                self.__commit()
+                return True
+            except:
                 return False
-            if DevEUI == None:
-                print(COLOR.FAIL+"DevEUI can't be none"+COLOR.END)
+
+    ######################## Table MAC_STATE methods #############################
+
+    def get_mac_state(self, DevEUI:str=None) -> dict:
+        with self.__lock:
+            try:
+                if self.__connected__() is not True:
+                    return None
+                if DevEUI == None:
+                    print(COLOR.FAIL+"DevEUI can't be none"+COLOR.END)
+                    return None
+                self.__cursor.execute(SELECT_MAC_STATE_QUERY, (DevEUI,))
+                item = self.__cursor.fetchone()
+                if item is None:
+                    return None
+                return json.loads(item[0])
+            except:
+                return None
+
+    def update_mac_state(self, DevEUI:str=None, state:dict=None) -> bool:
+        with self.__lock:
+            try:
+                if self.__connected__() is not True:
+                    return False
+                if DevEUI == None or state == None:
+                    print(COLOR.FAIL+"DevEUI or state can't be none"+COLOR.END)
+                    return False
+                self.__cursor.execute(UPSERT_MAC_STATE_QUERY, (DevEUI, json.dumps(state),))
+                self.__commit()
+                return True
+            except:
                 return False
-            self.__cursor.execute(DELETE_DEVICE_QUERY, (DevEUI,))
-            self.__connection.commit()
-            return True
-        except:
-            return False
 
 
+class WriteBehindDatabase():
+    """
+    The `WriteBehindDatabase` class queues the updates of a `Database` and writes them on a background thread,
+    so the radio and scheduler threads never wait on storage. Updates of the same kind for the same DevEUI
+    are coalesced (the last value wins) and each flush writes the queue in one transaction.
+    A failed update is queued again (unless a newer one replaced it) and retried after the delay.
+    `flush()` is the barrier for ordering-critical writes (DevNonce before a join request, reserved FCnt),
+    `flush(durable=True)` also syncs them to storage.
+    Reads flush the queue first, so they always see the queued updates.
+
+    Example Usage:
+        db = WriteBehindDatabase(Database(persistent=True))\n
+        db.open()\n
+        db.update_dev_nonce(DevEUI, DevNonce)\n
+        db.flush()\n
+    """
+
+    def __init__(self, database:Database, delay:float=WRITE_BEHIND_DELAY):
+        """
+        Initializes the `WriteBehindDatabase` and starts its thread.
+
+        Args:
+            database (Database): The database written by the thread, persistent for a shared connection.
+            delay (float): The time an update waits to be coalesced with the next ones. Default is WRITE_BEHIND_DELAY.
+        """
+        self._logger = logging.getLogger("APP[LoRaMAC]")
+        self.__database = database
+        self.__delay = delay
+        self.__condition = Condition()
+        self.__pending = {}                  # (update method, DevEUI) : arguments, in queue order
+        self.__sequence = itertools.count(1)
+        self.__queued = 0                    # sequence of the last queued update
+        self.__written = 0                   # sequence of the last written update
+        self.__failures = 0                  # writes that left updates in the queue
+        self.__urgent = False
+        self.transactions = 0
+        self._thread = Thread(target=self.__run, name="LoRaMAC Database", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def open(self):
+        self.__database.open()
+
+    def close(self):
+        self.flush()
+        self.__database.close()
+
+    def flush(self, timeout:float=None, durable:bool=False) -> bool:
+        """
+        Blocks until every update queued before the call is committed.
+
+        Args:
+            timeout (float): The maximum wait in seconds. Default is None (no limit).
+            durable (bool): Whether the commits must also survive a power cut (fsync). Default is False.
+
+        Returns:
+            bool: True if the updates are written, False on timeout, write or sync error.
+        """
+        with self.__condition:
+            target = self.__queued
+            if self.__written < target:
+                failures = self.__failures
+                self.__urgent = True
+                self.__condition.notify_all()
+                self.__condition.wait_for(lambda: self.__written >= target or self.__failures > failures, timeout)
+                if self.__written < target:
+                    return False
+        if durable:
+            return self.__database.sync()
+        return True
+
+    def pending(self) -> int:
+        """
+        Returns the number of updates waiting to be written.
+        """
+        with self.__condition:
+            return len(self.__pending)
+
+    ######################## Reads and inserts, after the queued updates #############################
+
+    def create_table(self) -> bool:
+        self.flush()
+        return self.__database.create_table()
+
+    def get_device(self, DevEUI:str=None) -> dict:
+        self.flush()
+        return self.__database.get_device(DevEUI)
+
+    def get_device_by_devaddr(self, DevAddr:str=None) -> dict:
+        self.flush()
+        return self.__database.get_device_by_devaddr(DevAddr)
+
+    def insert_device(self, DevEUI:str=None, AppEUI:str=DEFAULT_APPEUI, AppKey:str=None) -> bool:
+        self.flush()
+        return self.__database.insert_device(DevEUI, AppEUI, AppKey)
+
+    def delete_device(self, DevEUI:str=None) -> bool:
+        self.flush()
+        return self.__database.delete_device(DevEUI)
+
+    def get_mac_state(self, DevEUI:str=None) -> dict:
+        self.flush()
+        return self.__database.get_mac_state(DevEUI)
+
+    ######################## Updates, written behind #############################
+
+    def update_dev_nonce(self, DevEUI:str=None, DevNonce:int=1):
+        self.__queue("update_dev_nonce", DevEUI, DevNonce)
+
+    def update_f_cnt(self, DevEUI:str=None, FCnt:int=1):
+        self.__queue("update_f_cnt", DevEUI, FCnt)
+
+    def update_session_keys(self, DevEUI:str=None, DevAddr:str=None, NwkSKey:str=None, AppSKey:str=None):
+        self.__queue("update_session_keys", DevEUI, DevAddr, NwkSKey, AppSKey)
+
+    def update_is_joined(self, DevEUI:str=None, isJoined:bool=False):
+        self.__queue("update_is_joined", DevEUI, isJoined)
+
+    def update_channel_group(self, DevEUI:str=None, channelGoup:int=0):
+        self.__queue("update_channel_group", DevEUI, channelGoup)
+
+    def update_mac_state(self, DevEUI:str=None, state:dict=None):
+        self.__queue("update_mac_state", DevEUI, state)
+
+    def __queue(self, method:str, DevEUI:str, *args):
+        with self.__condition:
+            # A newer update of the same kind replaces the queued one and moves to the end of the queue
+            self.__pending.pop((method, DevEUI), None)
+            self.__pending[(method, DevEUI)] = args
+            self.__queued = next(self.__sequence)
+            self.__condition.notify_all()
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while len(self.__pending) == 0:
+                    self.__condition.wait()
+                if not self.__urgent:
+                    # More updates of the same uplink or join come within the delay
+                    self.__condition.wait(self.__delay)
+                pending = self.__pending
+                sequence = self.__queued
+                self.__pending = {}
+                self.__urgent = False
+            failed = {}
+            try:
+                with self.__database.batch():
+                    for (method, DevEUI), args in pending.items():
+                        if getattr(self.__database, method)(DevEUI, *args) is False:
+                            self._logger.error(f"Database : {method} {DevEUI} failed")
+                            failed[(method, DevEUI)] = args
+                self.transactions = self.transactions + 1
+            except Exception as e:
+                self._logger.error(f"Database : write behind {e}")
+                failed = pending
+            with self.__condition:
+                if len(failed) == 0:
+                    self.__written = sequence
+                else:
+                    # Written again with the next updates, a newer update of the same kind wins
+                    for key, args in failed.items():
+                        if key not in self.__pending:
+                            self.__pending[key] = args
+                    self.__failures = self.__failures + 1
+                self.__condition.notify_all()
@@ -53,6 +53,7 @@ class Device():
 		self.join_max_tries = 0
 		self.uplink_channel_min = 0
 		self.uplink_channel_max = self.uplink_channel_min + 7 * (self.channelGroup + 1)
+		self.RxDelay = 1                       # RX1 delay in seconds (from join accept), RX2 is 1 s later
 		self.rx2_window_time : float = -1
 		self.rx2_window_timeout : float = -1
 		self.message_type = None
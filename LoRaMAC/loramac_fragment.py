@@ -0,0 +1,139 @@
+from threading import Lock
+import struct
+
+FRAGMENT_HEADER_FORMAT = ">BBBBH"   # session, index, data fragments, parity group, payload length
+FRAGMENT_HEADER_SIZE   = struct.calcsize(FRAGMENT_HEADER_FORMAT)
+FRAGMENT_COUNT_MAX     = 255        # data fragments of one payload (index fits in one byte with parity)
+
+
+def fragment(payload:bytes, fragment_size:int, session:int, parity_group:int=0) -> list:
+    """
+    Splits `payload` into frames of at most `fragment_size` bytes, header included.
+
+    Every frame starts with the header (session, index, data fragment count, parity group, payload length).
+    With `parity_group` k > 0, a parity fragment (XOR of the k data fragments of its group) follows
+    every k data fragments, so one lost fragment per group can be rebuilt by `Reassembler`.
+
+    Args:
+        payload (bytes): The payload to split.
+        fragment_size (int): The maximum frame size in bytes, header included.
+        session (int): The fragmentation session (0 to 255), distinguishes successive payloads.
+        parity_group (int): The number of data fragments covered by one parity fragment. Default is 0 (no parity).
+
+    Returns:
+        list: The frames (bytes), data and parity fragments in sending order.
+
+    Raises:
+        ValueError: If the payload needs more than 255 fragments or `fragment_size` leaves no room for data.
+    """
+    data_size = fragment_size - FRAGMENT_HEADER_SIZE
+    if data_size <= 0:
+        raise ValueError("Fragment : size too small")
+    chunks = [payload[i:i + data_size] for i in range(0, max(len(payload), 1), data_size)]
+    parity_count = 0 if parity_group <= 0 else (len(chunks) + parity_group - 1) // parity_group
+    if len(chunks) + parity_count > FRAGMENT_COUNT_MAX or len(payload) > 0xFFFF:
+        raise ValueError("Fragment : payload too large")
+
+    frames = []
+    for index, chunk in enumerate(chunks):
+        frames.append(struct.pack(FRAGMENT_HEADER_FORMAT, session & 0xFF, index, len(chunks),
+                                  parity_group, len(payload)) + chunk)
+        if parity_group > 0 and (index % parity_group == parity_group - 1 or index == len(chunks) - 1):
+            group = index // parity_group
+            parity = _xor(chunks[group * parity_group:index + 1], data_size)
+            frames.append(struct.pack(FRAGMENT_HEADER_FORMAT, session & 0xFF, len(chunks) + group, len(chunks),
+                                      parity_group, len(payload)) + parity)
+    return frames
+
+
+def _xor(chunks:list, size:int) -> bytes:
+    # XOR of `chunks` padded with zeros to `size` bytes
+    output = bytearray(size)
+    for chunk in chunks:
+        for i, byte in enumerate(chunk):
+            output[i] ^= byte
+    return bytes(output)
+
+
+class Reassembler():
+    """
+    The `Reassembler` class rebuilds payloads from the frames produced by `fragment()`.
+    Frames may arrive out of order, and one missing data fragment per parity group is rebuilt
+    from the parity fragment.
+
+    Example Usage:
+        reassembler = Reassembler()\n
+        for frame in frames:\n
+            payload = reassembler.add(frame)\n
+            if payload is not None:\n
+                print(payload)\n
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._sessions = {}
+
+    def add(self, frame:bytes) -> bytes:
+        """
+        Adds a received frame.
+
+        Returns:
+            bytes: The payload once all its data fragments are known, else None.
+        """
+        if len(frame) < FRAGMENT_HEADER_SIZE:
+            return None
+        session, index, count, parity_group, length = struct.unpack(FRAGMENT_HEADER_FORMAT, frame[:FRAGMENT_HEADER_SIZE])
+        body = frame[FRAGMENT_HEADER_SIZE:]
+        with self._lock:
+            state = self._sessions.get(session)
+            if state is not None and state["done"] and state["count"] == count and state["length"] == length and \
+                self.__is_late(state, index, body):
+                # Late fragment (parity or duplicate) of a rebuilt payload
+                return None
+            if state is None or state["done"] or state["count"] != count or state["length"] != length:
+                # A new payload replaces an unfinished or rebuilt one of the same session (the session wrapped)
+                state = {"count": count, "parity_group": parity_group, "length": length, "size": 0,
+                         "data": {}, "parity": {}, "done": False}
+                self._sessions[session] = state
+            if index < count:
+                state["data"][index] = body
+            else:
+                state["parity"][index - count] = body
+            state["size"] = max(state["size"], len(body))
+            self.__recover(state)
+            if len(state["data"]) < count:
+                return None
+            state["done"] = True
+        payload = b"".join(state["data"][index] for index in range(count))
+        return payload[:length]
+
+    def pending(self) -> int:
+        """
+        Returns the number of unfinished payloads.
+        """
+        with self._lock:
+            return len([state for state in self._sessions.values() if not state["done"]])
+
+    def __is_late(self, state:dict, index:int, body:bytes) -> bool:
+        # Whether a fragment of the session of a rebuilt payload belongs to that payload
+        if index < state["count"]:
+            # A rebuilt fragment is padded with zeros to the fragment size
+            return state["data"][index][:len(body)] == body
+        group_size = state["parity_group"]
+        group = index - state["count"]
+        if group_size <= 0:
+            return False
+        indexes = range(group * group_size, min((group + 1) * group_size, state["count"]))
+        return _xor([state["data"][item] for item in indexes], len(body)) == body
+
+    def __recover(self, state:dict):
+        group_size = state["parity_group"]
+        if group_size <= 0:
+            return
+        for group, parity in state["parity"].items():
+            indexes = range(group * group_size, min((group + 1) * group_size, state["count"]))
+            missing = [index for index in indexes if index not in state["data"]]
+            if len(missing) != 1:
+                continue
+            known = [state["data"][index] for index in indexes if index != missing[0]]
+            state["data"][missing[0]] = _xor(known + [parity], state["size"])
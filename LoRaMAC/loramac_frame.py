@@ -0,0 +1,114 @@
+from .loramac_types import MessageType
+
+JOIN_ACCEPT_SIZES   = (17, 33)      # without and with CFList
+DATA_FRAME_SIZE_MIN = 12            # MHDR (1) + FHDR without FOpts (7) + MIC (4)
+LORAWAN_MAJOR_R1    = 0x00
+
+
+class FrameView():
+    """
+    The `FrameView` class reads the header fields of a PHYPayload without copying it.
+    Fields are decoded from a `memoryview` when accessed, so a frame of another device or a malformed frame
+    is dropped after a few byte reads, before any crypto.
+
+    Example Usage:
+        frame = FrameView(payload)\n
+        if frame.is_downlink() and frame.dev_addr == device.DevAddr:\n
+            print(frame.fcnt, frame.fport)\n
+    """
+
+    __slots__ = ("_buffer",)
+
+    def __init__(self, PHYPayload:bytes):
+        """
+        Initializes a new `FrameView` object.
+
+        Args:
+            PHYPayload (bytes): The received frame (bytes, bytearray or memoryview), not copied.
+        """
+        self._buffer = memoryview(PHYPayload)
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    @property
+    def mtype(self) -> MessageType:
+        return MessageType(self._buffer[0] >> 5)
+
+    @property
+    def major(self) -> int:
+        return self._buffer[0] & 0x03
+
+    @property
+    def dev_addr(self) -> bytes:
+        """
+        DevAddr of a data frame, most significant byte first (as stored in `Device`).
+        """
+        return bytes(self._buffer[4:0:-1])
+
+    @property
+    def fctrl(self) -> int:
+        return self._buffer[5]
+
+    @property
+    def adr(self) -> bool:
+        return bool(self._buffer[5] & 0x80)
+
+    @property
+    def ack(self) -> bool:
+        return bool(self._buffer[5] & 0x20)
+
+    @property
+    def fpending(self) -> bool:
+        return bool(self._buffer[5] & 0x10)
+
+    @property
+    def fopts_len(self) -> int:
+        return self._buffer[5] & 0x0F
+
+    @property
+    def fcnt(self) -> int:
+        """
+        16 lower bits of the frame counter.
+        """
+        return self._buffer[6] | (self._buffer[7] << 8)
+
+    @property
+    def fopts(self) -> memoryview:
+        return self._buffer[8:8 + self.fopts_len]
+
+    @property
+    def fport(self) -> int:
+        """
+        FPort of a data frame, None if the frame has no FRMPayload.
+        """
+        start = 8 + self.fopts_len
+        if start >= len(self._buffer) - 4:
+            return None
+        return self._buffer[start]
+
+    @property
+    def frm_payload(self) -> memoryview:
+        return self._buffer[9 + self.fopts_len:-4]
+
+    @property
+    def mic(self) -> memoryview:
+        return self._buffer[-4:]
+
+    def is_downlink(self) -> bool:
+        """
+        Whether the frame is a well formed LoRaWAN R1 downlink: a join accept of a valid size,
+        or a data downlink whose FOpts fit between its FHDR and its MIC.
+
+        Returns:
+            bool: False for uplinks, proprietary frames, other LoRaWAN major versions and truncated frames.
+        """
+        size = len(self._buffer)
+        if size == 0 or self.major != LORAWAN_MAJOR_R1:
+            return False
+        mtype = self._buffer[0] >> 5
+        if mtype == MessageType.JOIN_ACCEPT.value:
+            return size in JOIN_ACCEPT_SIZES
+        if mtype == MessageType.UNCONFIRMED_DATA_DOWN.value or mtype == MessageType.CONFIRMED_DATA_DOWN.value:
+            return size >= DATA_FRAME_SIZE_MIN and 8 + self.fopts_len <= size - 4
+        return False
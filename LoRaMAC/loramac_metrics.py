@@ -0,0 +1,87 @@
+from collections import deque
+from threading import Lock
+
+
+class Metrics():
+    """
+    The `Metrics` class collects counters and latency samples of the LoRaMAC layer.
+    Samples are kept in a bounded window and summarized as percentiles by `to_dict()`.
+    """
+
+    SAMPLES_MAX = 1000
+
+    def __init__(self, samples_max:int=SAMPLES_MAX):
+        """
+        Initializes an empty `Metrics` object.
+
+        Args:
+            samples_max (int): The number of samples kept per metric. Default is 1000.
+        """
+        self._lock = Lock()
+        self._samples_max = samples_max
+        self._counters = {}
+        self._samples = {}
+
+    def increment(self, name:str, value:int=1):
+        """
+        Increments the counter `name` by `value`.
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def record(self, name:str, value:float):
+        """
+        Records a sample `value` (latencies are in seconds) for the metric `name`.
+        """
+        with self._lock:
+            if name not in self._samples:
+                self._samples[name] = deque(maxlen=self._samples_max)
+            self._samples[name].append(value)
+
+    def counter(self, name:str) -> int:
+        """
+        Returns the value of the counter `name` (0 if never incremented).
+        """
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def reset(self):
+        """
+        Clears all counters and samples.
+        """
+        with self._lock:
+            self._counters.clear()
+            self._samples.clear()
+
+    def to_dict(self) -> dict:
+        """
+        Converts the metrics to a dictionary.
+
+        Returns:
+            dict: counters by name, and for every sampled metric its count, mean, p50, p95, p99 and max.
+        """
+        with self._lock:
+            output = dict(self._counters)
+            for name, samples in self._samples.items():
+                values = sorted(samples)
+                if len(values) == 0:
+                    continue
+                output[name] = {
+                    "count": len(values),
+                    "mean": sum(values) / len(values),
+                    "p50": Metrics.percentile(values, 50),
+                    "p95": Metrics.percentile(values, 95),
+                    "p99": Metrics.percentile(values, 99),
+                    "max": values[-1],
+                }
+            return output
+
+    @staticmethod
+    def percentile(values:list, percent:float) -> float:
+        """
+        Returns the `percent` percentile of the sorted list `values` (nearest rank).
+        """
+        if len(values) == 0:
+            return 0.0
+        rank = int(round(percent / 100 * (len(values) - 1)))
+        return values[max(0, min(len(values) - 1, rank))]
@@ -0,0 +1,67 @@
+from .loramac_metrics import Metrics
+
+from concurrent.futures import Future
+from threading import Thread, current_thread
+from queue import Queue
+import logging
+import time
+
+
+class RadioActor():
+    """
+    The `RadioActor` class owns the radio: every radio operation is a command run on its single thread,
+    in the order the commands are posted. Callers never share a lock on the radio, they post commands
+    with `submit()` (asynchronous) or `call()` (waits for the result).
+
+    Example Usage:
+        radio  = RadioActor("LoRaMAC Radio")\n
+        future = radio.submit(LoRa.request, LoRa.RX_SINGLE)\n
+        status = radio.call(LoRa.status)\n
+    """
+
+    def __init__(self, name:str="Radio", metrics:Metrics=None):
+        """
+        Initializes the `RadioActor` and starts its thread.
+
+        Args:
+            name (str): The name of the radio thread.
+            metrics (Metrics): Records the time commands wait in the queue as "radio_command_wait". Default is None.
+        """
+        self._logger = logging.getLogger("APP[LoRaMAC]")
+        self._metrics = metrics
+        self._commands = Queue()
+        self._thread = Thread(target=self.__run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, function, *args) -> Future:
+        """
+        Posts the command `function(*args)` to the radio thread.
+
+        Returns:
+            Future: Completes with the return value (or the exception) of the command.
+        """
+        future = Future()
+        self._commands.put((time.monotonic(), future, function, args))
+        return future
+
+    def call(self, function, *args):
+        """
+        Runs the command `function(*args)` on the radio thread and returns its result.
+        A command calling `call()` runs the nested command at once.
+        """
+        if current_thread() is self._thread:
+            return function(*args)
+        return self.submit(function, *args).result()
+
+    def __run(self):
+        while True:
+            posted_at, future, function, args = self._commands.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            if self._metrics is not None:
+                self._metrics.record("radio_command_wait", time.monotonic() - posted_at)
+            try:
+                future.set_result(function(*args))
+            except Exception as e:
+                self._logger.error(f"Radio : {function.__name__} {e}")
+                future.set_exception(e)
@@ -18,6 +18,28 @@ class EU868():
     UPLINK_CHANNEL_MIN           = 0
     UPLINK_CHANNEL_MAX           = 7
     JOIN_CHANNEL_MAX             = 3
+    # maximum application payload size (N) by uplink spreading factor
+    MAX_PAYLOAD_SIZE             = {7: 222, 8: 222, 9: 115, 10: 51, 11: 51, 12: 51}
+    # uplink spreading factor by data rate (DR0 to DR5, 125 khz)
+    DATA_RATES                   = {0: 12, 1: 11, 2: 10, 3: 9, 4: 8, 5: 7}
+    # downlink spreading factor by data rate (125 khz)
+    DOWNLINK_DATA_RATES          = {0: 12, 1: 11, 2: 10, 3: 9, 4: 8, 5: 7}
+    RX2_DATA_RATE                = 0               # DR0 (SF12)
+    RX1_DR_OFFSET_MAX            = 5
+    CHANNELS_MAX                 = 16              # channels 3 to 15 are set by NewChannelReq
+    # frequency range accepted in NewChannelReq, RXParamSetupReq and DlChannelReq
+    FREQUENCY_MIN                = 863000000       # 863 Mhz
+    FREQUENCY_MAX                = 870000000       # 870 Mhz
+    TX_POWER_MAX                 = 16              # 16 dBm (max EIRP, TXPower 0)
+    TX_POWER_INDEX_MAX           = 7               # TXPower 7 : max EIRP - 14 dB
+    # ETSI EN 300 220 sub-bands: (frequency min, frequency max, duty cycle)
+    SUB_BANDS                    = [(863000000, 865000000, 0.001),
+                                    (865000000, 868000000, 0.01),
+                                    (868000000, 868600000, 0.01),
+                                    (868700000, 869200000, 0.001),
+                                    (869400000, 869650000, 0.1),
+                                    (869700000, 870000000, 0.01)]
+    MAX_DWELL_TIME               = 0               # no dwell time limit
 
 
 class US915():
@@ -36,6 +58,22 @@ class US915():
     SPREADING_FACTOR_MAX         = 8               # only SF7 and SF8 for uplinks
     UPLINK_CHANNEL_MIN           = 0
     UPLINK_CHANNEL_MAX           = 63
+    # maximum application payload size (N) by uplink spreading factor
+    MAX_PAYLOAD_SIZE             = {7: 242, 8: 125, 9: 53, 10: 11}
+    # uplink spreading factor by data rate (DR0 to DR3, 125 khz)
+    DATA_RATES                   = {0: 10, 1: 9, 2: 8, 3: 7}
+    # downlink spreading factor by data rate (DR8 to DR13, 500 khz)
+    DOWNLINK_DATA_RATES          = {8: 12, 9: 11, 10: 10, 11: 9, 12: 8, 13: 7}
+    RX2_DATA_RATE                = 8               # DR8 (SF12)
+    RX1_DR_OFFSET_MAX            = 3
+    CHANNELS_MAX                 = 64              # fixed channel plan, no NewChannelReq
+    # frequency range accepted in RXParamSetupReq
+    FREQUENCY_MIN                = 923300000       # 923.3 Mhz (downlink channel 0)
+    FREQUENCY_MAX                = 927500000       # 927.5 Mhz (downlink channel 7)
+    TX_POWER_MAX                 = 30              # 30 dBm (TXPower 0)
+    TX_POWER_INDEX_MAX           = 14              # TXPower 14 : 2 dBm
+    SUB_BANDS                    = []              # no duty cycle limit
+    MAX_DWELL_TIME               = 0.4             # 400 ms (FCC 15.247)
 
 
 class Region(Enum):
@@ -72,3 +110,82 @@ class Region(Enum):
         if self == Region.EU868 and channel > 2:
             return self.value.DOWNLINK_FREQUENCY_CHANNEL_0 - (8 - channel) * self.value.DOWNLINK_FREQUENCY_STEP
         return self.value.DOWNLINK_FREQUENCY_CHANNEL_0 + (channel % 8) * self.value.DOWNLINK_FREQUENCY_STEP
+
+    def max_payload_size(self, spreading_factor:int) -> int:
+        """
+        Returns the maximum application payload size of an uplink, without FOpts.
+
+        Args:
+            spreading_factor (int): The uplink spreading factor.
+
+        Returns:
+            int: The maximum payload size in bytes (0 if the spreading factor is not allowed).
+        """
+        return self.value.MAX_PAYLOAD_SIZE.get(spreading_factor, 0)
+
+    def spreading_factor(self, data_rate:int) -> int:
+        """
+        Returns the uplink spreading factor of a data rate.
+
+        Args:
+            data_rate (int): The LoRaWAN data rate (DR0 is the slowest).
+
+        Returns:
+            int: The spreading factor (0 if the data rate is not defined).
+        """
+        return self.value.DATA_RATES.get(data_rate, 0)
+
+    def data_rate(self, spreading_factor:int) -> int:
+        """
+        Returns the uplink data rate of a spreading factor.
+
+        Args:
+            spreading_factor (int): The uplink spreading factor.
+
+        Returns:
+            int: The LoRaWAN data rate (None if the spreading factor is not allowed).
+        """
+        for data_rate, value in self.value.DATA_RATES.items():
+            if value == spreading_factor:
+                return data_rate
+        return None
+
+    def downlink_spreading_factor(self, data_rate:int) -> int:
+        """
+        Returns the downlink spreading factor of a data rate.
+
+        Args:
+            data_rate (int): The LoRaWAN downlink data rate.
+
+        Returns:
+            int: The spreading factor (0 if the data rate is not defined).
+        """
+        return self.value.DOWNLINK_DATA_RATES.get(data_rate, 0)
+
+    def rx1_data_rate(self, uplink_data_rate:int, rx1_dr_offset:int) -> int:
+        """
+        Returns the RX1 downlink data rate of an uplink data rate and a RX1DROffset.
+
+        Args:
+            uplink_data_rate (int): The data rate of the uplink.
+            rx1_dr_offset (int): The RX1DROffset (RXParamSetupReq or join accept).
+
+        Returns:
+            int: The RX1 downlink data rate.
+        """
+        if self == Region.US915:
+            # DR0..DR3 answer on DR10..DR13, lowered by the offset down to DR8
+            return min(13, max(8, 10 + uplink_data_rate - rx1_dr_offset))
+        return max(0, uplink_data_rate - rx1_dr_offset)
+
+    def tx_power(self, tx_power_index:int) -> int:
+        """
+        Returns the TX power of a LinkADRReq TXPower index (2 dB steps below the maximum).
+
+        Args:
+            tx_power_index (int): The TXPower index (0 is the maximum).
+
+        Returns:
+            int: The TX power in dBm.
+        """
+        return self.value.TX_POWER_MAX - 2 * tx_power_index
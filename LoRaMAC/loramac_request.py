@@ -0,0 +1,157 @@
+from concurrent.futures import Future, InvalidStateError
+from enum import Enum, IntEnum
+from threading import Lock
+import heapq
+import itertools
+
+
+class RequestType(Enum):
+    """
+    Enumeration that represents the work items handled by the LoRaMAC service thread.
+    """
+    JOIN    = 0
+    UPLINK  = 1
+
+
+class Priority(IntEnum):
+    """
+    Enumeration that represents uplink queue priorities (lowest value is sent first).
+    """
+    HIGH    = 0
+    NORMAL  = 1
+    LOW     = 2
+
+
+class MacFuture(Future):
+    """
+    The `MacFuture` class is the `Future` returned by `join()` and `transmit()`.
+    `delay` is the number of seconds the request was expected to wait, when queued, for its RX windows
+    and duty cycle to allow a transmission.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.delay = 0.0
+
+
+class MacRequest():
+    """
+    The `MacRequest` class is a unit of work queued to the LoRaMAC service thread by `join()` or `transmit()`.
+    Its `future` completes with a `JoinStatus` (join) or a `TransmitStatus` (uplink).
+    """
+
+    def __init__(self, request_type:RequestType, payload:bytes=bytes([]), confirmed:bool=False, max_tries:int=1,
+                 priority:Priority=Priority.NORMAL, fport:int=None, mergeable:bool=True):
+        """
+        Initializes a new `MacRequest` object.
+
+        Args:
+            request_type (RequestType): The kind of work to perform.
+            payload (bytes): The uplink payload. Default is empty.
+            confirmed (bool): Whether the uplink must be confirmed by the network. Default is False.
+            max_tries (int): The remaining number of join attempts. Default is 1.
+            priority (Priority): The uplink queue priority. Default is Priority.NORMAL.
+            fport (int): The uplink FPort. Default is None (device FPort).
+            mergeable (bool): Whether pending payloads for the same FPort may be merged with this one. Default is True.
+        """
+        self.type = request_type
+        self.payload = payload
+        self.confirmed = confirmed
+        self.max_tries = max_tries
+        self.priority = priority
+        self.fport = fport
+        self.mergeable = mergeable
+        self.merged:list = []
+        self.phy_payload:bytes = None      # kept for the NbTrans repetitions of an unconfirmed uplink
+        self.transmissions = 0
+        self.channel:int = None            # uplink channel of the last transmission
+        self.session = None                # Session of the device, set by LoRaMAC
+        self.future = MacFuture()
+
+    def merge(self, request:'MacRequest'):
+        """
+        Appends the payload of `request` to this request, which then completes both futures.
+        The merged uplink is confirmed if any of the two is confirmed.
+        """
+        self.payload = self.payload + request.payload
+        self.confirmed = self.confirmed or request.confirmed
+        self.merged.append(request)
+
+    def complete(self, status):
+        """
+        Completes the `future` (and the ones of merged requests) with `status` (only the first status is kept).
+        """
+        try:
+            self.future.set_result(status)
+        except InvalidStateError:
+            pass
+        for request in self.merged:
+            request.complete(status)
+
+
+class UplinkQueue():
+    """
+    The `UplinkQueue` class is a thread-safe priority queue of uplink `MacRequest` objects.
+    Requests of the same priority are kept in FIFO order.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._heap = []
+        self._sequence = itertools.count()
+        self._requeued = itertools.count(1)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._heap)
+
+    def put(self, request:MacRequest):
+        """
+        Queues an uplink request.
+        """
+        with self._lock:
+            heapq.heappush(self._heap, (request.priority, next(self._sequence), request))
+
+    def requeue(self, request:MacRequest):
+        """
+        Puts back a request removed by `pop()` ahead of the requests of the same priority.
+        """
+        with self._lock:
+            heapq.heappush(self._heap, (request.priority, -next(self._requeued), request))
+
+    def priority(self) -> Priority:
+        """
+        Returns the priority of the first uplink request, None if the queue is empty.
+        """
+        with self._lock:
+            if len(self._heap) == 0:
+                return None
+            return self._heap[0][0]
+
+    def pop(self, max_size:int) -> MacRequest:
+        """
+        Removes the first uplink request and merges into it the pending requests for the same FPort,
+        in queue order, as long as the merged payload fits in `max_size` bytes.
+
+        Args:
+            max_size (int): The maximum payload size of the merged uplink.
+
+        Returns:
+            MacRequest: The uplink to send, None if the queue is empty.
+        """
+        with self._lock:
+            if len(self._heap) == 0:
+                return None
+            request = heapq.heappop(self._heap)[2]
+            kept = []
+            while len(self._heap) > 0:
+                item = heapq.heappop(self._heap)
+                pending = item[2]
+                if request.mergeable and pending.mergeable and pending.fport == request.fport and \
+                    len(request.payload) + len(pending.payload) <= max_size:
+                    request.merge(pending)
+                else:
+                    kept.append(item)
+            for item in kept:
+                heapq.heappush(self._heap, item)
+            return request
@@ -0,0 +1,92 @@
+from threading import Thread, Condition
+import heapq
+import itertools
+import logging
+import time
+
+
+class ScheduledEvent():
+    """
+    The `ScheduledEvent` class is a handle on a callback queued in a `Scheduler`.
+    """
+
+    def __init__(self, deadline:float, callback, args:tuple):
+        self.deadline = deadline
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Cancels the event, its callback will not be called.
+        """
+        self.cancelled = True
+
+
+class Scheduler():
+    """
+    The `Scheduler` class runs callbacks at `time.monotonic()` deadlines on a single thread.
+    Events are kept in a heap, so any number of pending events costs one thread.
+
+    Example Usage:
+        scheduler = Scheduler("LoRaMAC Scheduler")\n
+        event = scheduler.schedule(time.monotonic() + 1.0, callback, arg)\n
+        event.cancel()\n
+    """
+
+    def __init__(self, name:str="Scheduler"):
+        """
+        Initializes the `Scheduler` and starts its thread.
+
+        Args:
+            name (str): The name of the scheduler thread.
+        """
+        self._logger = logging.getLogger("APP[LoRaMAC]")
+        self._condition = Condition()
+        self._heap = []
+        self._sequence = itertools.count()
+        self._thread = Thread(target=self.__run, name=name, daemon=True)
+        self._thread.start()
+
+    def schedule(self, deadline:float, callback, *args) -> ScheduledEvent:
+        """
+        Schedules `callback(*args)` at the `time.monotonic()` instant `deadline`.
+
+        Returns:
+            ScheduledEvent: The handle to cancel the event.
+        """
+        event = ScheduledEvent(deadline, callback, args)
+        with self._condition:
+            heapq.heappush(self._heap, (deadline, next(self._sequence), event))
+            self._condition.notify()
+        return event
+
+    def schedule_in(self, delay:float, callback, *args) -> ScheduledEvent:
+        """
+        Schedules `callback(*args)` in `delay` seconds.
+
+        Returns:
+            ScheduledEvent: The handle to cancel the event.
+        """
+        return self.schedule(time.monotonic() + delay, callback, *args)
+
+    def __run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if len(self._heap) == 0:
+                        self._condition.wait()
+                        continue
+                    deadline, _, event = self._heap[0]
+                    if event.cancelled:
+                        heapq.heappop(self._heap)
+                        continue
+                    delay = deadline - time.monotonic()
+                    if delay <= 0:
+                        heapq.heappop(self._heap)
+                        break
+                    self._condition.wait(delay)
+            try:
+                event.callback(*event.args)
+            except Exception as e:
+                self._logger.error(f"Scheduler : {event.callback.__name__} {e}")
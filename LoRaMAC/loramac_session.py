@@ -0,0 +1,68 @@
+from .loramac_device import Device
+from .loramac_region import Region
+from .loramac_command import MacCommand
+from .loramac_request import MacRequest, UplinkQueue
+
+
+class Session():
+    """
+    The `Session` class holds the state of one device hosted by a `LoRaMAC` object: its LoRaWAN session,
+    its MAC command state, its uplink queue and its callbacks.
+    The radio, the duty cycle ledger, the channel statistics and the RX windows are shared by the sessions.
+
+    Example Usage:
+        session = Session(device, Region.EU868)\n
+        session.uplinks.put(request)\n
+        print(session.uplink_priority())\n
+    """
+
+    def __init__(self, device:Device, region:Region, on_join=None, on_transmit=None, on_receive=None):
+        """
+        Initializes a new `Session` object.
+
+        Args:
+            device (Device): The device of the session.
+            region (Region): The region of the network.
+            on_join (function): The join callback of the device. Default is None (callback of the `LoRaMAC`).
+            on_transmit (function): The transmit callback of the device. Default is None (callback of the `LoRaMAC`).
+            on_receive (function): The receive callback of the device. Default is None (callback of the `LoRaMAC`).
+        """
+        self.device = device
+        self.mac = MacCommand(region)
+        self.uplinks = UplinkQueue()
+        self.join_request:MacRequest = None     # join in progress
+        self.uplink_request:MacRequest = None   # confirmed uplink waiting for its ACK
+        self.repeat_request:MacRequest = None   # unconfirmed uplink waiting for its next NbTrans repetition
+        self.resume_uplinks:int = None          # uplinks without downlink on a session restored at start-up
+        self.piggyback_deadline = 0             # instant the MAC answers get a dedicated uplink, 0 if none pending
+        self.fcnt_reserved = 0                  # FCnt bound persisted in the database, no uplink above it before the next write
+        self.fcnt_reserving = 0                 # FCnt bound queued for the database, written behind
+        self.fragment_session = 0
+        self.on_join = on_join
+        self.on_transmit = on_transmit
+        self.on_receive = on_receive
+
+    @property
+    def dev_eui(self) -> str:
+        return self.device.DevEUI.hex()
+
+    @property
+    def dev_addr(self) -> str:
+        return self.device.DevAddr.hex()
+
+    def has_uplink(self) -> bool:
+        """
+        Whether an uplink or a NbTrans repetition is waiting to be sent.
+        """
+        return len(self.uplinks) > 0 or self.repeat_request is not None
+
+    def uplink_priority(self) -> int:
+        """
+        Returns the priority of the next uplink of the session, NbTrans repetitions before any queued uplink.
+
+        Returns:
+            int: The priority (lowest value is sent first), None if there is nothing to send.
+        """
+        if self.repeat_request is not None:
+            return -1
+        return self.uplinks.priority()
@@ -7,10 +7,14 @@ RADIO_SPI_CS_ID         = 0
 # RESET and BUSY pins
 RADIO_RESET_PIN         = 16
 RADIO_BUSY_PIN          = 6
-# IRQ pin not used (set to -1). TX and RX pins not used (set to -1)
+# IRQ pin (BCM) wired to the radio DIO1. Set to -1 to poll the IRQ status over SPI instead.
 RADIO_IRQ_PIN           = -1
+# TX and RX pins not used (set to -1)
 RADIO_TX_ENABLE_PIN     = -1
 RADIO_RX_ENABLE_PIN     = -1
+# Polling mode only (RADIO_IRQ_PIN = -1)
+RADIO_POLL_INTERVAL     = 0.2     # 200 ms between two IRQ status polls
+RADIO_POLL_TIMEOUT      = 0.05    # 50 ms max spent waiting for an IRQ per poll
 
 
 ################# LoRaWAN Specification
@@ -18,6 +22,9 @@ UPLINK_RX1_DELAY        = 1
 UPLINK_RX2_DELAY        = 2
 JOIN_RX1_DELAY          = 5
 JOIN_RX2_DELAY          = 6
+RX2_WINDOW_DURATION     = 2       # 2 s, RX2 window considered closed after it (fits a SF12 ACK)
+RX_WINDOW_MARGIN        = 0.05    # 50 ms, RX windows open early by this margin
+TX_DONE_TIMEOUT         = 5       # 5 s max airtime of an uplink
 LORA_CODING_RATE        = 5       # default coding rate : 4/5
 LORA_SYNC_WORD          = 0x34    # public network
 LORA_PREAMBLE_SIZE      = 8
@@ -27,4 +34,29 @@ UPLINK_IQ_POLARITY      = False
 DOWNLINK_IQ_POLARITY    = True
 UPLINK_CRC_TYPE         = True    # enabled
 DOWNLINK_CRC_TYPE       = False   # disabled
+RX_LISTEN_SYMBOLS       = 2       # RX period of the duty cycled RX2 listen, in symbols (sleeps the rest of the preamble)
+ADR_ENABLED             = True    # ADR bit of the uplinks
+ADR_ACK_LIMIT           = 64      # uplinks without downlink before ADRACKReq is set
+ADR_ACK_DELAY           = 32      # uplinks between two backoff steps after ADR_ACK_LIMIT
+RESUME_MAX_UPLINKS      = 8       # uplinks without downlink before a session restored at start-up is considered dead
+RESUME_JOIN_MAX_TRIES   = 3       # join attempts after a dead restored session
+PIGGYBACK_DEADLINE      = 30      # 30 s, MAC answers and downlink ACKs wait this long for an application uplink
+FCNT_RESERVE_BLOCK      = 64      # FCnt persisted every 64 uplinks as a reserved upper bound, resumed from after a restart
 
+
+################# Channel selection
+CHANNEL_FAILURE_BACKOFF = 600     # 10 min, a channel without ACK weighs less during this time
+CHANNEL_SNR_MIN         = -20     # downlink SNR (dB) giving the lowest weight
+CHANNEL_SNR_MAX         = 10      # downlink SNR (dB) giving the highest weight
+
+
+################# Fragmentation
+FRAGMENT_FPORT          = 201     # FPort of the fragments sent by transmit_fragmented()
+FRAGMENT_PARITY_GROUP   = 4       # one parity fragment every 4 data fragments (0 to disable)
+
+
+################# Crypto
+CRYPTO_ENGINE           = "auto"  # "library" (loramac.so), "python" (loramac_crypto.py) or "auto" (library if it loads)
+AES_KEY_CACHE_SIZE      = 64      # AES key schedules kept in cache (4 per device : AppKey, NwkSKey, AppSKey and spare)
+KEYSTREAM_CACHE_SIZE    = 8       # uplinks (FCnt+1 to FCnt+8) with their keystream computed ahead, Python engine
+KEYSTREAM_BLOCKS        = 16      # 256 bytes of keystream per uplink, covers the largest FRMPayload
@@ -20,6 +20,7 @@ class TransmitStatus(Enum):
     TX_NETWORK_NO_ACK   = 2
     TX_JOIN_ERROR       = 3
     TX_PAYLOAD_ERROR    = 4
+    TX_RADIO_ERROR      = 5
 
 
 class ReceiveStatus(Enum):
@@ -11,6 +11,14 @@ class MessageType(Enum):
     REJOIN_REQUEST        = 6
     PROPRIETARY           = 7
 
+class DeviceClass(Enum):
+    """
+    Enumeration of the receive behaviours of the device between uplinks.
+    """
+    CLASS_A               = 0     # radio asleep, only the RX1 and RX2 windows of the uplinks
+    CLASS_C               = 1     # RX2 continuous receive
+    CLASS_C_LISTEN        = 2     # RX2 duty cycled receive (SX126x RX duty cycle, sniffs the preambles)
+
 LORAWAN_MAX_FOPTS_LEN     = 15
 LORAWAN_MAX_PAYLOAD_LEN   = 224
 
@@ -1,6 +1,29 @@
-from .loramac_functions import messageType, joinRequest,joinAccept, unconfirmedDataUp, confirmedDataUp, dataDown
+from .loramac_functions import libLoRaMAC, messageType, joinRequest,joinAccept, unconfirmedDataUp, confirmedDataUp, dataDown
 from .loramac_types import *
+from threading import Lock
 import ctypes
+import struct
+
+LORA_FRAME_SIZE_MAX = 255
+
+
+class LibrarySession :
+    """Structures of one session passed to the C Shared Library, keys and DevAddr loaded once"""
+
+    def __init__(self, DevAddr:bytes, NwkSKey:bytes, AppSKey:bytes) :
+        self.DevAddr = bytes(DevAddr)
+        self.NwkSKey = bytes(NwkSKey)
+        self.AppSKey = bytes(AppSKey)
+        self.lock = Lock()
+        self.uplink = MACPayload_t()
+        self.downlink = MACPayload_t()
+        for mac in (self.uplink, self.downlink) :
+            mac.FHDR.DevAddr = int.from_bytes(self.DevAddr, "big")
+            ctypes.memmove(mac.NwkSKey, self.NwkSKey, 16)
+            ctypes.memmove(mac.AppSKey, self.AppSKey, 16)
+        self.output = (ctypes.c_uint8 * WrapperLoRaMAC.LORAWAN_BUFFER_SIZE_MAX)()
+        self.input = (ctypes.c_uint8 * LORA_FRAME_SIZE_MAX)()
+
 
 class WrapperLoRaMAC :
     """LoRaMAC Wrapper Class to C Shared Library"""
@@ -8,14 +31,30 @@ class WrapperLoRaMAC :
     LORAWAN_MAX_FOPTS_LEN = 15
     LORAWAN_BUFFER_SIZE_MAX = 224
 
+    # LibrarySession by DevAddr, replaced as a whole
+    _sessions = {}
+
     @staticmethod
-    def message_type(PHYPayload:bytes) -> MessageType :
+    def available() -> bool :
+        """Whether the C shared library is loaded (built for this architecture)"""
+        return libLoRaMAC is not None
+
+    @staticmethod
+    def prepare_session(DevAddr:bytes, NwkSKey:bytes, AppSKey:bytes, FCnt:int) :
+        """Allocates the structures of the session and loads its keys, the library encrypts each frame"""
+        WrapperLoRaMAC.__session(DevAddr, NwkSKey, AppSKey)
 
-        phyPayload = bytes(PHYPayload)
+    @staticmethod
+    def release_session(DevAddr:bytes) :
+        sessions = dict(WrapperLoRaMAC._sessions)
+        sessions.pop(bytes(DevAddr), None)
+        WrapperLoRaMAC._sessions = sessions
 
-        bufferSize = len(phyPayload)
-        buffer = (ctypes.c_uint8 * bufferSize)()
-        ctypes.memmove(ctypes.addressof(buffer), phyPayload, bufferSize)
+    @staticmethod
+    def message_type(PHYPayload:bytes) -> MessageType :
+
+        bufferSize = len(PHYPayload)
+        buffer = (ctypes.c_uint8 * bufferSize).from_buffer_copy(PHYPayload)
 
         msg_type : MHDR_MType_t = messageType(buffer, bufferSize)
 
@@ -25,50 +64,27 @@ class WrapperLoRaMAC :
     @staticmethod
     def join_request(DevEUI:bytes, AppEUI:bytes, AppKey:bytes, DevNonce:int) -> dict :
 
-        devEUI = tuple(DevEUI)
-        appEUI = tuple(AppEUI)
-        appKey = tuple(AppKey)
-
-        join = JoinRequest_t(devEUI, appEUI, appKey, DevNonce)
+        join = JoinRequest_t.from_buffer_copy(bytes(DevEUI) + bytes(AppEUI) + bytes(AppKey) + struct.pack("<H", DevNonce))
         buffer = (ctypes.c_uint8 * WrapperLoRaMAC.LORAWAN_BUFFER_SIZE_MAX)()
         bufferSize = WrapperLoRaMAC.LORAWAN_BUFFER_SIZE_MAX
 
         length = joinRequest(ctypes.byref(join), buffer, bufferSize)
 
         output = {}
-        PHYPayload = []
-        for i in range(length):
-            PHYPayload.append(buffer[i])
-        output["PHYPayload"] = bytes(PHYPayload)
+        output["PHYPayload"] = ctypes.string_at(buffer, length)
 
         return output
-    
-    
+
+
     @staticmethod
     def join_accept(PHYPayload:bytes, AppKey:bytes, DevNonce:int) -> dict :
 
-        phyPayload = bytes(PHYPayload)
-        appKey = tuple(AppKey)
-
-        DLsettings_data = DLsettings_t(0, 0, False)
-        FreqCH4 = (ctypes.c_uint8 * 3)()
-        FreqCH5 = (ctypes.c_uint8 * 3)()
-        FreqCH6 = (ctypes.c_uint8 * 3)()
-        FreqCH7 = (ctypes.c_uint8 * 3)()
-        FreqCH8 = (ctypes.c_uint8 * 3)()
-        CFlist_data = CFlist_t(FreqCH4, FreqCH5, FreqCH6, FreqCH7, FreqCH8)
-        AppNonce = 0
-        NetID = 0
-        DevAddr = 0
-        RxDelay = 0
-        hasCFlist = False
-        NwkSKey = (ctypes.c_uint8 * 16)()
-        AppSKey = (ctypes.c_uint8 * 16)()
-        join = JoinAccept_t(AppNonce, NetID, DevAddr, DLsettings_data, RxDelay, CFlist_data, hasCFlist, DevNonce, appKey, NwkSKey, AppSKey)
-
-        bufferSize = len(phyPayload)
-        buffer = (ctypes.c_uint8 * bufferSize)()
-        ctypes.memmove(ctypes.addressof(buffer), phyPayload, bufferSize)
+        join = JoinAccept_t()
+        join.DevNonce = DevNonce
+        ctypes.memmove(join.AppKey, bytes(AppKey), 16)
+
+        bufferSize = len(PHYPayload)
+        buffer = (ctypes.c_uint8 * bufferSize).from_buffer_copy(PHYPayload)
 
         status = joinAccept(ctypes.byref(join), buffer, bufferSize)
 
@@ -76,131 +92,100 @@ class WrapperLoRaMAC :
             return None
 
         output = {}
-        output["DevAddr"] = bytes.fromhex(hex(join.DevAddr)[2:].zfill(8))
-        NwkSKey = []
-        AppSKey = []
-        for i in range(16):
-            NwkSKey.append(join.NwkSKey[i])
-            AppSKey.append(join.AppSKey[i])
-
-        output["NwkSKey"] = bytes(NwkSKey)
-        output["AppSKey"] = bytes(AppSKey)
+        output["DevAddr"] = join.DevAddr.to_bytes(4, "big")
+        output["NwkSKey"] = bytes(join.NwkSKey)
+        output["AppSKey"] = bytes(join.AppSKey)
+        output["RxDelay"] = int(join.RxDelay)
+        output["RX1DROffset"] = int(join.DLsettings.Rx1DRoffset)
+        output["RX2DataRate"] = int(join.DLsettings.Rx2DR)
 
         return output
-    
 
-    @staticmethod
-    def unconfirmed_data_up(MacPayload:bytes, FCnt:int, FPort:int, DevAddr:bytes, NwkSKey:bytes, AppSKey:bytes, adr:bool=True, ack:bool=False, fOpts:bytes=None) -> dict:
-
-        payload = tuple(MacPayload)
-        nwkSKey = tuple(NwkSKey)
-        appSKey = tuple(AppSKey)
-        fOptsLen = 0
-        if fOpts != None:
-            fOptsLen = len(fOpts)
-            
-        FHDR_FCtrl_uplink_data = FHDR_FCtrl_uplink_t(adr, False, ack, False, fOptsLen)
-        FHDR_FCtrl_data = FHDR_FCtrl_t((),FHDR_FCtrl_uplink_data)
-
-        FOpts = (ctypes.c_uint8 * WrapperLoRaMAC.LORAWAN_MAX_FOPTS_LEN)()
-        if fOpts != None:
-            ctypes.memmove(ctypes.addressof(FOpts), fOpts, fOptsLen)
-
-        FHDR_data = FHDR_t(int(DevAddr.hex(), 16), FHDR_FCtrl_data, FCnt, FOpts)
-
-        mac = MACPayload_t(FHDR_data, nwkSKey, appSKey, FPort, len(payload), payload)
-        buffer = (ctypes.c_uint8 * WrapperLoRaMAC.LORAWAN_BUFFER_SIZE_MAX)()
-        bufferSize = WrapperLoRaMAC.LORAWAN_BUFFER_SIZE_MAX
-
-        length = unconfirmedDataUp(ctypes.byref(mac), buffer, bufferSize)
-    
-        output = {}
-        PHYPayload = []
-        for i in range(length):
-            PHYPayload.append(buffer[i])
-        output["PHYPayload"] = bytes(PHYPayload)
-
-        return output
 
     @staticmethod
-    def confirmed_data_up(MacPayload:bytes, FCnt:int, FPort:int, DevAddr:bytes, NwkSKey:bytes, AppSKey:bytes, adr:bool=True, ack:bool=False, fOpts:bytes=None) -> dict:
-        
-        payload = tuple(MacPayload)
-        nwkSKey = tuple(NwkSKey)
-        appSKey = tuple(AppSKey)
-        fOptsLen = 0
-        if fOpts != None:
-            fOptsLen = len(fOpts)
-            
-        FHDR_FCtrl_uplink_data = FHDR_FCtrl_uplink_t(adr, False, ack, False, fOptsLen)
-        FHDR_FCtrl_data = FHDR_FCtrl_t((),FHDR_FCtrl_uplink_data)
-
-        FOpts = (ctypes.c_uint8 * WrapperLoRaMAC.LORAWAN_MAX_FOPTS_LEN)()
-        if fOpts != None:
-            ctypes.memmove(ctypes.addressof(FOpts), fOpts, fOptsLen)
-
-        FHDR_data = FHDR_t(int(DevAddr.hex(), 16), FHDR_FCtrl_data, FCnt, FOpts)
-
-        mac = MACPayload_t(FHDR_data, nwkSKey, appSKey, FPort, len(payload), payload)
-        buffer = (ctypes.c_uint8 * WrapperLoRaMAC.LORAWAN_BUFFER_SIZE_MAX)()
-        bufferSize = WrapperLoRaMAC.LORAWAN_BUFFER_SIZE_MAX
-
-        length = confirmedDataUp(ctypes.byref(mac), buffer, bufferSize)
-
-        output = {}
-        PHYPayload = []
-        for i in range(length):
-            PHYPayload.append(buffer[i])
-        output["PHYPayload"] = bytes(PHYPayload)
+    def unconfirmed_data_up(MacPayload:bytes, FCnt:int, FPort:int, DevAddr:bytes, NwkSKey:bytes, AppSKey:bytes, adr:bool=True, ack:bool=False, fOpts:bytes=None, adr_ack_req:bool=False) -> dict:
+        return WrapperLoRaMAC.__data_up(unconfirmedDataUp, MacPayload, FCnt, FPort, DevAddr, NwkSKey, AppSKey,
+                                        adr, ack, fOpts, adr_ack_req)
 
-        return output
+    @staticmethod
+    def confirmed_data_up(MacPayload:bytes, FCnt:int, FPort:int, DevAddr:bytes, NwkSKey:bytes, AppSKey:bytes, adr:bool=True, ack:bool=False, fOpts:bytes=None, adr_ack_req:bool=False) -> dict:
+        return WrapperLoRaMAC.__data_up(confirmedDataUp, MacPayload, FCnt, FPort, DevAddr, NwkSKey, AppSKey,
+                                        adr, ack, fOpts, adr_ack_req)
 
     @staticmethod
     def data_down(PHYPayload:bytes, DevAddr:bytes, NwkSKey:bytes, AppSKey:bytes) -> dict:
-        
-        phyPayload = bytes(PHYPayload)
-        nwkSKey = tuple(NwkSKey)
-        appSKey = tuple(AppSKey)
-
-        FHDR_FCtrl_downlink_data = FHDR_FCtrl_downlink_t(False, False, False, False, 0)
-        FHDR_FCtrl_data = FHDR_FCtrl_t(FHDR_FCtrl_downlink_data, ())
-        FOpts = (ctypes.c_uint8 * WrapperLoRaMAC.LORAWAN_MAX_FOPTS_LEN)()
-        
-        FHDR_data = FHDR_t(int(DevAddr.hex(), 16), FHDR_FCtrl_data, 0, FOpts)
-
-        payloadSize = WrapperLoRaMAC.LORAWAN_BUFFER_SIZE_MAX
-        payload = (ctypes.c_uint8 * payloadSize)()
-
-        mac = MACPayload_t(FHDR_data, nwkSKey, appSKey, 0, payloadSize, payload)
-        
-        bufferSize = len(phyPayload)
-        buffer = (ctypes.c_uint8 * bufferSize)()
-
-        ctypes.memmove(ctypes.addressof(buffer), phyPayload, bufferSize)
 
-        status = dataDown(ctypes.byref(mac), buffer, bufferSize)
-        
-        if status == False:
+        bufferSize = len(PHYPayload)
+        if bufferSize > LORA_FRAME_SIZE_MAX:
             return None
-        
-        output = {}
-        macPayload = []
-        fOpts = []
-        for i in range(mac.payloadSize):
-            macPayload.append(mac.payload[i])
-        for i in range(mac.FHDR.FCtrl.downlink.FOptsLen):
-            fOpts.append(mac.FHDR.FOpts[i])
-        output["MacPayload"]=bytes(macPayload)
-        output["FOpts"]=bytes(fOpts)
-        output["ADR"]=bool(mac.FHDR.FCtrl.downlink.ADR)
-        output["RFU"]=bool(mac.FHDR.FCtrl.downlink.RFU)
-        output["ACK"]=bool(mac.FHDR.FCtrl.downlink.ACK)
-        output["FPending"]=bool(mac.FHDR.FCtrl.downlink.FPending)
-        output["FOptsLen"]=int(mac.FHDR.FCtrl.downlink.FOptsLen)
-        output["FCntDown"]=int(mac.FHDR.FCnt16)
-        output["FPortDown"]=int(mac.FPort)
+        session = WrapperLoRaMAC.__session(DevAddr, NwkSKey, AppSKey)
+
+        with session.lock:
+            mac = session.downlink
+            FCtrl = mac.FHDR.FCtrl.downlink
+            FCtrl.ADR = FCtrl.RFU = FCtrl.ACK = FCtrl.FPending = FCtrl.FOptsLen = 0
+            mac.FHDR.FCnt16 = 0
+            mac.FPort = 0
+            mac.payloadSize = WrapperLoRaMAC.LORAWAN_BUFFER_SIZE_MAX
+            ctypes.memmove(session.input, bytes(PHYPayload), bufferSize)
+
+            status = dataDown(ctypes.byref(mac), session.input, bufferSize)
+
+            if status == False:
+                return None
+
+            output = {}
+            output["MacPayload"] = ctypes.string_at(mac.payload, mac.payloadSize)
+            output["FOpts"] = ctypes.string_at(mac.FHDR.FOpts, FCtrl.FOptsLen)
+            output["ADR"] = bool(FCtrl.ADR)
+            output["RFU"] = bool(FCtrl.RFU)
+            output["ACK"] = bool(FCtrl.ACK)
+            output["FPending"] = bool(FCtrl.FPending)
+            output["FOptsLen"] = int(FCtrl.FOptsLen)
+            output["FCntDown"] = int(mac.FHDR.FCnt16)
+            output["FPortDown"] = int(mac.FPort)
 
         return output
 
+    @staticmethod
+    def __data_up(function, MacPayload:bytes, FCnt:int, FPort:int, DevAddr:bytes, NwkSKey:bytes, AppSKey:bytes,
+                  adr:bool, ack:bool, fOpts:bytes, adr_ack_req:bool) -> dict:
+
+        payloadSize = len(MacPayload)
+        fOptsLen = 0 if fOpts is None else len(fOpts)
+        if payloadSize > LORAWAN_MAX_PAYLOAD_LEN or fOptsLen > WrapperLoRaMAC.LORAWAN_MAX_FOPTS_LEN:
+            raise ValueError("WrapperLoRaMAC : payload or FOpts too long")
+        session = WrapperLoRaMAC.__session(DevAddr, NwkSKey, AppSKey)
+
+        with session.lock:
+            mac = session.uplink
+            FCtrl = mac.FHDR.FCtrl.uplink
+            FCtrl.ADR = adr
+            FCtrl.ADRACKReq = adr_ack_req
+            FCtrl.ACK = ack
+            FCtrl.ClassB = False
+            FCtrl.FOptsLen = fOptsLen
+            mac.FHDR.FCnt16 = FCnt & 0xFFFF
+            if fOptsLen > 0:
+                ctypes.memmove(mac.FHDR.FOpts, bytes(fOpts), fOptsLen)
+            mac.FPort = FPort
+            mac.payloadSize = payloadSize
+            ctypes.memmove(mac.payload, bytes(MacPayload), payloadSize)
+
+            length = function(ctypes.byref(mac), session.output, WrapperLoRaMAC.LORAWAN_BUFFER_SIZE_MAX)
+
+            output = {}
+            output["PHYPayload"] = ctypes.string_at(session.output, length)
 
+        return output
 
+    @staticmethod
+    def __session(DevAddr:bytes, NwkSKey:bytes, AppSKey:bytes) -> LibrarySession :
+        session = WrapperLoRaMAC._sessions.get(bytes(DevAddr))
+        if session is None or session.NwkSKey != NwkSKey or session.AppSKey != AppSKey:
+            # First frame of the session or new keys (join)
+            session = LibrarySession(DevAddr, NwkSKey, AppSKey)
+            sessions = dict(WrapperLoRaMAC._sessions)
+            sessions[session.DevAddr] = session
+            WrapperLoRaMAC._sessions = sessions
+        return session
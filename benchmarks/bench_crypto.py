@@ -0,0 +1,167 @@
+"""
+Throughput benchmark of the LoRaWAN frame engines (frames per second).
+
+It times the join request, the join accept, the data up and the data down of the Python engine
+(`CryptoLoRaMAC`) with the pure Python AES and with the `cryptography` package when it is installed,
+and of the LoRaMAC shared library when it loads on this machine. When the library loads, the frames of
+both engines are also compared byte for byte. Results are written as JSON.
+
+Usage:
+    python3 -m benchmarks.bench_crypto --frames 2000 --output crypto.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LoRaMAC import loramac_crypto
+from LoRaMAC.loramac_crypto import CryptoLoRaMAC, AESCipher
+from LoRaMAC.loramac_wrapper import WrapperLoRaMAC
+from LoRaMAC.loramac_settings import KEYSTREAM_CACHE_SIZE
+
+DEV_EUI  = bytes.fromhex("70b3d57ed0000001")
+APP_EUI  = bytes.fromhex("0000000000000000")
+APP_KEY  = bytes.fromhex("2b7e151628aed2a6abf7158809cf4f3c")
+NWK_SKEY = bytes.fromhex("000102030405060708090a0b0c0d0e0f")
+APP_SKEY = bytes.fromhex("0f0e0d0c0b0a09080706050403020100")
+DEV_ADDR = bytes.fromhex("26011bda")
+
+
+def join_accept_frame(DevNonce:int) -> bytes:
+    """
+    Returns a join accept of the network (AES decrypt of the body), built with the Python AES.
+    """
+    body = bytes([0x01, 0x02, 0x03, 0x13, 0x00, 0x00]) + DEV_ADDR[::-1] + bytes([0x00, 0x01])
+    mic = AESCipher.of(APP_KEY).cmac(bytes([0x20]) + body)[:4]
+    return bytes([0x20]) + aes_decrypt(APP_KEY, body + mic)
+
+
+def aes_decrypt(key:bytes, data:bytes) -> bytes:
+    # The network side of the join accept needs the AES decrypt of the cryptography package
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    decryptor = Cipher(algorithms.AES(key), modes.ECB()).decryptor()
+    return decryptor.update(data) + decryptor.finalize()
+
+
+def data_down_frame(FCnt:int, size:int) -> bytes:
+    """
+    Returns an unconfirmed downlink with the ACK bit set, built with the Python AES.
+    """
+    payload = loramac_crypto.frame_crypt(APP_SKEY, bytes(size), DEV_ADDR, FCnt, True)
+    message = bytes([0x60]) + DEV_ADDR[::-1] + bytes([0x20]) + (FCnt & 0xFFFF).to_bytes(2, "little") + bytes([1]) + payload
+    return message + loramac_crypto.frame_mic(NWK_SKEY, message, DEV_ADDR, FCnt, True)
+
+
+def scenarios(codec, frames:int, size:int, with_accept:bool) -> dict:
+    """
+    Returns the frames per second of each operation of a codec.
+    """
+    results = {}
+    payload = bytes(range(size))
+
+    start = time.perf_counter()
+    for i in range(frames):
+        codec.join_request(DEV_EUI, APP_EUI, APP_KEY, i)
+    results["join_request"] = frames / (time.perf_counter() - start)
+
+    if with_accept:
+        accept = join_accept_frame(1)
+        start = time.perf_counter()
+        for i in range(frames):
+            codec.join_accept(accept, APP_KEY, 1)
+        results["join_accept"] = frames / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(frames):
+        codec.unconfirmed_data_up(payload, i, 1, DEV_ADDR, NWK_SKEY, APP_SKEY)
+    results["data_up"] = frames / (time.perf_counter() - start)
+
+    # Uplinks prepared ahead (idle time of the radio), only the frame building is timed
+    elapsed = 0
+    for first in range(0, frames, KEYSTREAM_CACHE_SIZE):
+        codec.prepare_session(DEV_ADDR, NWK_SKEY, APP_SKEY, first)
+        start = time.perf_counter()
+        for i in range(first + 1, min(frames, first + KEYSTREAM_CACHE_SIZE) + 1):
+            codec.unconfirmed_data_up(payload, i, 1, DEV_ADDR, NWK_SKEY, APP_SKEY)
+        elapsed = elapsed + time.perf_counter() - start
+    codec.release_session(DEV_ADDR)
+    results["data_up_prepared"] = frames / elapsed
+
+    downlinks = [data_down_frame(i, size) for i in range(min(frames, 256))]
+    start = time.perf_counter()
+    for i in range(frames):
+        codec.data_down(downlinks[i % len(downlinks)], DEV_ADDR, NWK_SKEY, APP_SKEY)
+    results["data_down"] = frames / (time.perf_counter() - start)
+    return results
+
+
+def compare(frames:int, size:int, with_accept:bool) -> dict:
+    """
+    Compares the frames of the Python engine and of the shared library, byte for byte.
+    """
+    mismatches = {"join_request": 0, "join_accept": 0, "data_up": 0, "data_down": 0}
+    for i in range(frames):
+        payload = bytes((i + j) & 0xFF for j in range(i % (size + 1)))
+        fOpts = bytes([0x02]) if i % 3 == 0 else None
+        if CryptoLoRaMAC.join_request(DEV_EUI, APP_EUI, APP_KEY, i) != WrapperLoRaMAC.join_request(DEV_EUI, APP_EUI, APP_KEY, i):
+            mismatches["join_request"] += 1
+        args = (payload, i * 7, 1 + i % 223, DEV_ADDR, NWK_SKEY, APP_SKEY, i % 2 == 0, i % 5 == 0, fOpts, i % 7 == 0)
+        if CryptoLoRaMAC.confirmed_data_up(*args) != WrapperLoRaMAC.confirmed_data_up(*args):
+            mismatches["data_up"] += 1
+        downlink = data_down_frame(i, i % (size + 1))
+        if CryptoLoRaMAC.data_down(downlink, DEV_ADDR, NWK_SKEY, APP_SKEY) != WrapperLoRaMAC.data_down(downlink, DEV_ADDR, NWK_SKEY, APP_SKEY):
+            mismatches["data_down"] += 1
+        if with_accept:
+            accept = join_accept_frame(i)
+            if CryptoLoRaMAC.join_accept(accept, APP_KEY, i) != WrapperLoRaMAC.join_accept(accept, APP_KEY, i):
+                mismatches["join_accept"] += 1
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LoRaWAN frame engines throughput benchmark")
+    parser.add_argument("--frames", type=int, default=2000, help="frames per operation")
+    parser.add_argument("--size", type=int, default=16, help="application payload size in bytes")
+    parser.add_argument("--output", help="JSON output file (default stdout)")
+    args = parser.parse_args()
+
+    with_cryptography = loramac_crypto.Cipher is not None
+    results = {}
+    if with_cryptography:
+        results["python_cryptography"] = scenarios(CryptoLoRaMAC, args.frames, args.size, True)
+    # Pure Python AES: hide the cryptography package and drop the ciphers cached with it
+    cipher = loramac_crypto.Cipher
+    loramac_crypto.Cipher = None
+    AESCipher.of.cache_clear()
+    try:
+        results["python_pure_aes"] = scenarios(CryptoLoRaMAC, args.frames, args.size, with_cryptography)
+    finally:
+        loramac_crypto.Cipher = cipher
+        AESCipher.of.cache_clear()
+    if WrapperLoRaMAC.available():
+        results["library"] = scenarios(WrapperLoRaMAC, args.frames, args.size, with_cryptography)
+        results["mismatches"] = compare(args.frames, args.size, with_cryptography)
+
+    output = {
+        "benchmark": "crypto",
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": vars(args),
+        "engines": {"cryptography": with_cryptography, "library": WrapperLoRaMAC.available()},
+        "results": results,
+    }
+    text = json.dumps(output, indent=2, default=str)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as file:
+            file.write(text)
+
+
+if __name__ == "__main__":
+    main()
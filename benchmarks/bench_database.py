@@ -0,0 +1,126 @@
+"""
+Benchmark of the device database writes on the uplink path (FCnt update of every uplink).
+
+It compares a connection opened and closed around every write (rollback journal, default synchronous)
+with the persistent WAL connection of `Database(persistent=True)` and with the updates written behind
+by `WriteBehindDatabase` (the caller only queues, the time of the final flush is reported). Each mode writes to its own database
+file in `--directory`; run it on the SD card of the node to measure real fsync costs. Results are written as JSON.
+
+Usage:
+    python3 -m benchmarks.bench_database --writes 2000 --directory /home/pi --output database.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LoRaMAC.loramac_database import Database, WriteBehindDatabase
+from LoRaMAC.loramac_metrics import Metrics
+
+DEV_EUI = "70b3d57ed0000001"
+APP_EUI = "0000000000000000"
+APP_KEY = "2b7e151628aed2a6abf7158809cf4f3c"
+
+
+def per_write_connection(path:str, writes:int) -> Metrics:
+    """
+    FCnt updates as before: connect, update, commit and close for every uplink.
+    """
+    metrics = Metrics(samples_max=writes)
+    for FCnt in range(1, writes + 1):
+        start = time.perf_counter()
+        db = Database(path)
+        db.open()
+        db.update_f_cnt(DEV_EUI, FCnt % 65536)
+        db.close()
+        metrics.record("uplink_write", time.perf_counter() - start)
+    return metrics
+
+
+def persistent_connection(path:str, writes:int) -> Metrics:
+    """
+    FCnt updates on the persistent WAL connection shared by `LoRaMAC`.
+    """
+    metrics = Metrics(samples_max=writes)
+    db = Database(path, persistent=True)
+    db.open()
+    for FCnt in range(1, writes + 1):
+        start = time.perf_counter()
+        db.update_f_cnt(DEV_EUI, FCnt % 65536)
+        metrics.record("uplink_write", time.perf_counter() - start)
+    return metrics
+
+
+def write_behind(path:str, writes:int) -> Metrics:
+    """
+    FCnt updates queued to `WriteBehindDatabase`, coalesced and written on its thread.
+    """
+    metrics = Metrics(samples_max=writes)
+    db = WriteBehindDatabase(Database(path, persistent=True))
+    db.open()
+    for FCnt in range(1, writes + 1):
+        start = time.perf_counter()
+        db.update_f_cnt(DEV_EUI, FCnt % 65536)
+        metrics.record("uplink_write", time.perf_counter() - start)
+    start = time.perf_counter()
+    db.flush()
+    metrics.record("flush", time.perf_counter() - start)
+    return metrics
+
+
+def run(name:str, function, directory:str, writes:int) -> dict:
+    path = os.path.join(directory, f"bench-{name}.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    db = Database(path)
+    db.open()
+    db.create_table()
+    db.insert_device(DEV_EUI, APP_EUI, APP_KEY)
+    db.close()
+    start = time.perf_counter()
+    metrics = function(path, writes)
+    elapsed = time.perf_counter() - start
+    results = metrics.to_dict()
+    result = results["uplink_write"]
+    if "flush" in results:
+        result["flush"] = results["flush"]
+    result["writes_per_second"] = writes / elapsed
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Device database write benchmark")
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--directory", default=None, help="directory of the database files (default a temporary directory)")
+    parser.add_argument("--output", help="JSON output file (default stdout)")
+    args = parser.parse_args()
+
+    directory = args.directory if args.directory is not None else tempfile.mkdtemp(prefix="loramac-bench-")
+    output = {
+        "benchmark": "database",
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": vars(args),
+        "results": {
+            "per_write_connection": run("per-write", per_write_connection, directory, args.writes),
+            "persistent_wal": run("persistent", persistent_connection, directory, args.writes),
+            "write_behind": run("write-behind", write_behind, directory, args.writes),
+        },
+    }
+    text = json.dumps(output, indent=2, default=str)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as file:
+            file.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+End-to-end latency and throughput benchmark of the LoRaMAC layer.
+
+The MAC runs on a `SimulatedLoRa` against a local network server stand-in, so it runs on any Linux box
+(the cryptography package is required by the network server). Results are written as JSON.
+
+Usage:
+    python3 -m benchmarks.bench_loramac --region US915 --duration 60 --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import platform
+import tempfile
+
+# The benchmark never touches the device database of the node
+os.environ.setdefault("LORAMAC_DATABASE", os.path.join(tempfile.mkdtemp(prefix="loramac-bench-"), "loramac.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LoRaMAC import LoRaMAC, Region, Device, DeviceClass, TransmitStatus, ReceiveStatus, SimulatedLoRa
+from LoRaMAC.loramac_metrics import Metrics
+from benchmarks.network_server import NetworkServer
+
+DEV_EUI = "70b3d57ed0000001"
+APP_EUI = "0000000000000000"
+APP_KEY = "2b7e151628aed2a6abf7158809cf4f3c"
+
+HISTOGRAM_BUCKETS = [0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10]
+
+
+def histogram(values:list) -> dict:
+    """
+    Returns the number of samples at or below each bucket (seconds), "inf" for the rest.
+    """
+    output = {}
+    for bucket in HISTOGRAM_BUCKETS:
+        output[str(bucket)] = len([value for value in values if value <= bucket])
+    output["inf"] = len(values)
+    return output
+
+
+class Benchmark():
+    """
+    The `Benchmark` class runs the scenarios and collects one sample list per measurement.
+    """
+
+    def __init__(self, region:Region, irq:bool, loss:float, seed:int, device_class:DeviceClass=DeviceClass.CLASS_C,
+                 devices:int=1):
+        self.samples = {}
+        self.results = {}
+        self.radio = SimulatedLoRa(uplink_loss=loss, downlink_loss=loss, seed=seed)
+        self.server = NetworkServer(self.radio, region)
+        self.server.register(DEV_EUI, APP_KEY)
+        self.device = Device(DEV_EUI, APP_EUI, APP_KEY)
+        self.LoRaWAN = LoRaMAC(self.device, region, radio=self.radio, irq_pin=0 if irq else -1,
+                               device_class=device_class)
+        self.LoRaWAN.set_logging_level(logging.WARNING)
+        self.LoRaWAN.set_callback(None, self.on_transmit, self.on_receive)
+        self.devices = [self.device]
+        for i in range(1, devices):
+            # More devices on the same radio (virtual multi-device mode)
+            DevEUI = f"{DEV_EUI[:12]}{i + 1:04x}"
+            self.server.register(DevEUI, APP_KEY)
+            self.devices.append(Device(DevEUI, APP_EUI, APP_KEY))
+            self.LoRaWAN.add_device(self.devices[-1])
+        self._received = []
+
+    def record(self, name:str, value:float):
+        self.samples.setdefault(name, []).append(value)
+
+    def on_transmit(self, status:TransmitStatus):
+        if status in (TransmitStatus.TX_OK, TransmitStatus.TX_NETWORK_ACK):
+            self.record("tx_done_to_callback", time.monotonic() - self.radio.tx_done_at)
+
+    def on_receive(self, status:ReceiveStatus, payload:bytes):
+        if status == ReceiveStatus.RX_OK:
+            self._received.append(time.monotonic())
+            # RX done instant of the radio, before any poll or interrupt of the MAC
+            self.record("rx_done_to_on_receive", self._received[-1] - self.radio.rx_done_at)
+
+    def join(self, count:int):
+        for _ in range(count):
+            for device in self.devices:
+                start = time.monotonic()
+                status = self.LoRaWAN.join(max_tries=3, forced=True, device=device).result()
+                self.record("join", time.monotonic() - start)
+                if not self.LoRaWAN.is_joined(device):
+                    raise RuntimeError(f"Join failed: {status}")
+
+    def transmit_calls(self, count:int):
+        futures = []
+        for i in range(count):
+            start = time.perf_counter()
+            futures.append(self.LoRaWAN.transmit(bytes([i & 0xFF])))
+            self.record("transmit_call", time.perf_counter() - start)
+        for future in futures:
+            future.result()
+
+    def confirmed(self, count:int):
+        for i in range(count):
+            start = time.monotonic()
+            status = self.LoRaWAN.transmit(bytes([i & 0xFF] * 8), confirmed=True).result()
+            if status == TransmitStatus.TX_NETWORK_ACK:
+                self.record("transmit_to_ack", time.monotonic() - start)
+            else:
+                self.results["confirmed_failures"] = self.results.get("confirmed_failures", 0) + 1
+
+    def downlinks(self, count:int):
+        self._received = []
+        self.server.downlink_ends = []
+        for i in range(count):
+            self.server.queue_downlink(bytes([0xA0, i & 0xFF]))
+            self.LoRaWAN.transmit(bytes([i & 0xFF] * 8)).result()
+            deadline = time.monotonic() + 5
+            while len(self._received) <= i and time.monotonic() < deadline:
+                time.sleep(0.01)
+        for end, received in zip(self.server.downlink_ends, self._received):
+            self.record("downlink_to_on_receive", received - end)
+
+    def sustained(self, duration:float):
+        sent = 0
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            # One uplink per device in flight, the MAC serves the devices in turn
+            futures = [self.LoRaWAN.transmit(bytes(16), device=device) for device in self.devices]
+            sent = sent + len([future for future in futures if future.result() == TransmitStatus.TX_OK])
+        self.results["uplinks_per_minute"] = sent * 60 / duration
+
+    def report(self) -> dict:
+        for name, values in self.samples.items():
+            summary = Metrics()
+            for value in values:
+                summary.record(name, value)
+            self.results[name] = summary.to_dict()[name]
+            self.results[name]["histogram"] = histogram(values)
+        return self.results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LoRaMAC end-to-end benchmark on a simulated radio")
+    parser.add_argument("--region", default="US915", choices=[region.name for region in Region])
+    parser.add_argument("--device-class", default="CLASS_C", choices=[device_class.name for device_class in DeviceClass])
+    parser.add_argument("--polling", action="store_true", help="poll the radio instead of the DIO1 callbacks")
+    parser.add_argument("--devices", type=int, default=1, help="devices sharing the radio (sustained run and joins)")
+    parser.add_argument("--joins", type=int, default=3)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--confirmed", type=int, default=20)
+    parser.add_argument("--downlinks", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=60, help="sustained uplink run in seconds")
+    parser.add_argument("--loss", type=float, default=0.0, help="uplink and downlink loss probability")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="JSON output file (default stdout)")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    bench = Benchmark(Region[args.region], not args.polling, args.loss, args.seed, DeviceClass[args.device_class],
+                      args.devices)
+    started = time.time()
+    bench.join(args.joins)
+    bench.transmit_calls(args.calls)
+    bench.confirmed(args.confirmed)
+    bench.downlinks(args.downlinks)
+    bench.sustained(args.duration)
+
+    output = {
+        "benchmark": "loramac",
+        "timestamp": started,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": vars(args),
+        "results": bench.report(),
+        "mac_metrics": bench.LoRaWAN.get_metrics(),
+        "radio": {"tx_count": bench.radio.tx_count, "rx_count": bench.radio.rx_count, "tx_airtime": bench.radio.tx_airtime},
+    }
+    text = json.dumps(output, indent=2, default=str)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as file:
+            file.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+RX-done-to-callback latency of the LoRaMAC layer, polling the radio versus the DIO1 callbacks.
+
+Both modes run the same downlink scenario on a `SimulatedLoRa` against the local network server stand-in.
+`rx_done_to_on_receive` is measured from the RX done instant of the simulated radio to the application
+`on_receive` callback; `rx_done_to_callback` is the MAC metric (from the instant the MAC saw the packet
+to the return of the callbacks). Results are written as JSON.
+
+Usage:
+    python3 -m benchmarks.bench_rx_latency --downlinks 20 --output rx_latency.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import platform
+import tempfile
+
+os.environ.setdefault("LORAMAC_DATABASE", os.path.join(tempfile.mkdtemp(prefix="loramac-bench-"), "loramac.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from LoRaMAC import Region, DeviceClass
+from benchmarks.bench_loramac import Benchmark
+
+
+def run(region:Region, irq:bool, downlinks:int, seed:int) -> dict:
+    bench = Benchmark(region, irq, 0.0, seed, DeviceClass.CLASS_C)
+    bench.join(1)
+    bench.downlinks(downlinks)
+    results = bench.report()
+    return {
+        "rx_done_to_on_receive": results.get("rx_done_to_on_receive"),
+        "rx_done_to_callback": bench.LoRaWAN.get_metrics().get("rx_done_to_callback"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RX done to callback latency, polling versus IRQ")
+    parser.add_argument("--region", default="US915", choices=[region.name for region in Region])
+    parser.add_argument("--downlinks", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="JSON output file (default stdout)")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    started = time.time()
+    output = {
+        "benchmark": "rx_latency",
+        "timestamp": started,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": vars(args),
+        "results": {
+            "polling": run(Region[args.region], False, args.downlinks, args.seed),
+            "irq": run(Region[args.region], True, args.downlinks, args.seed),
+        },
+    }
+    text = json.dumps(output, indent=2, default=str)
+    if args.output is None:
+        print(text)
+    else:
+        with open(args.output, "w") as file:
+            file.write(text)
+
+
+if __name__ == "__main__":
+    main()
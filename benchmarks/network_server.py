@@ -0,0 +1,201 @@
+"""
+Minimal LoRaWAN 1.0.2 network server stand-in for the benchmarks.
+
+It answers the join requests and the confirmed uplinks heard by a `SimulatedLoRa`, and sends the
+application downlinks queued with `queue_downlink()`, in RX1 of the uplink.
+AES and AES-CMAC come from `loramac_crypto` (the `cryptography` package when installed, else pure Python),
+the AES decryption of the join accept is a pure Python inverse cipher on its key schedule.
+"""
+from LoRaMAC import Region
+from LoRaMAC.LoRaRF import SimulatedLoRa
+from LoRaMAC.loramac_crypto import AESCipher, SBOX, _key_schedule, _xtime
+
+from threading import Lock
+import logging
+import struct
+import time
+import os
+
+MTYPE_JOIN_REQUEST          = 0x00
+MTYPE_JOIN_ACCEPT           = 0x20
+MTYPE_UNCONFIRMED_DATA_UP   = 0x40
+MTYPE_UNCONFIRMED_DATA_DOWN = 0x60
+MTYPE_CONFIRMED_DATA_UP     = 0x80
+FCTRL_ACK                   = 0x20
+NET_ID                      = bytes([0x13, 0x00, 0x00])
+
+INV_SBOX = [0] * 256
+for index, value in enumerate(SBOX):
+    INV_SBOX[value] = index
+
+
+def _multiply(a:int, b:int) -> int:
+    # Product in GF(2^8)
+    product = 0
+    while b:
+        if b & 1:
+            product = product ^ a
+        a = _xtime(a)
+        b = b >> 1
+    return product
+
+
+def _decrypt_block(round_keys:list, block:bytes) -> bytes:
+    # FIPS-197 inverse cipher, the state is 16 bytes column by column
+    keys = b"".join(word.to_bytes(4, "big") for word in round_keys)
+    state = [byte ^ keys[160 + i] for i, byte in enumerate(block)]
+    for r in range(9, -1, -1):
+        # InvShiftRows and InvSubBytes, then AddRoundKey
+        state = [INV_SBOX[state[(i - 4 * (i % 4)) % 16]] ^ keys[16 * r + i] for i in range(16)]
+        if r > 0:
+            # InvMixColumns
+            mixed = []
+            for c in range(0, 16, 4):
+                column = state[c:c + 4]
+                for row in range(4):
+                    mixed.append(_multiply(column[row], 14) ^ _multiply(column[(row + 1) % 4], 11) ^
+                                 _multiply(column[(row + 2) % 4], 13) ^ _multiply(column[(row + 3) % 4], 9))
+            state = mixed
+    return bytes(state)
+
+
+def aes_encrypt(key:bytes, block:bytes) -> bytes:
+    return AESCipher.of(bytes(key)).encrypt(block)
+
+
+def aes_decrypt(key:bytes, block:bytes) -> bytes:
+    round_keys = _key_schedule(bytes(key))
+    return b"".join(_decrypt_block(round_keys, block[i:i + 16]) for i in range(0, len(block), 16))
+
+
+def aes_cmac(key:bytes, message:bytes) -> bytes:
+    return AESCipher.of(bytes(key)).cmac(message)
+
+
+def frame_mic(key:bytes, message:bytes, dev_addr:int, fcnt:int, downlink:bool) -> bytes:
+    b0 = bytes([0x49, 0, 0, 0, 0, 1 if downlink else 0]) + struct.pack("<II", dev_addr, fcnt) + bytes([0, len(message)])
+    return aes_cmac(key, b0 + message)[:4]
+
+
+def frame_crypt(key:bytes, payload:bytes, dev_addr:int, fcnt:int, downlink:bool) -> bytes:
+    output = bytearray()
+    for i in range(0, len(payload), 16):
+        a = bytes([0x01, 0, 0, 0, 0, 1 if downlink else 0]) + struct.pack("<II", dev_addr, fcnt) + bytes([0, i // 16 + 1])
+        keystream = aes_encrypt(key, a)
+        output.extend(byte ^ keystream[j] for j, byte in enumerate(payload[i:i + 16]))
+    return bytes(output)
+
+
+class NetworkServer():
+    """
+    The `NetworkServer` class plays the network and application servers on the air of a `SimulatedLoRa`.
+
+    Example Usage:
+        radio  = SimulatedLoRa()\n
+        server = NetworkServer(radio, Region.US915)\n
+        server.register(DevEUI, AppKey)\n
+    """
+
+    def __init__(self, radio:SimulatedLoRa, region:Region, rx1_delay:int=1, join_rx1_delay:int=5):
+        self._logger = logging.getLogger("BENCH[NetworkServer]")
+        self._radio = radio
+        self._region = region
+        self._rx1_delay = rx1_delay
+        self._join_rx1_delay = join_rx1_delay
+        self._lock = Lock()
+        self._keys = {}          # DevEUI (hex) -> AppKey
+        self._sessions = {}      # DevAddr -> session
+        self._downlinks = []     # (FPort, payload) sent in RX1 of the next uplinks
+        self._next_dev_addr = 0x260B0001
+        self.uplinks = 0
+        self.downlinks = 0
+        self.downlink_ends = []  # time.monotonic() instants the application downlinks end on air
+        radio.on_uplink = self.on_uplink
+
+    def register(self, DevEUI:str, AppKey:str):
+        """
+        Registers a device (hex strings, as given to `Device`).
+        """
+        self._keys[DevEUI.lower()] = bytes.fromhex(AppKey)
+
+    def queue_downlink(self, payload:bytes, fport:int=1):
+        """
+        Queues an application downlink for RX1 of the next uplink.
+        """
+        with self._lock:
+            self._downlinks.append((fport, bytes(payload)))
+
+    def on_uplink(self, payload:bytes, info:dict):
+        """
+        Handles an uplink heard by the simulated radio (called on the radio thread).
+        """
+        if len(payload) < 12:
+            return
+        mtype = payload[0] & 0xE0
+        try:
+            if mtype == MTYPE_JOIN_REQUEST:
+                self.__join(payload, info)
+            elif mtype in (MTYPE_UNCONFIRMED_DATA_UP, MTYPE_CONFIRMED_DATA_UP):
+                self.__data_up(payload, info, mtype == MTYPE_CONFIRMED_DATA_UP)
+        except Exception as e:
+            self._logger.error(f"Uplink : {e}")
+
+    def __join(self, payload:bytes, info:dict):
+        DevEUI = payload[9:17][::-1].hex()
+        AppKey = self._keys.get(DevEUI)
+        if AppKey is None or aes_cmac(AppKey, payload[:19])[:4] != payload[19:23]:
+            self._logger.warning(f"JoinRequest : unknown device or wrong MIC")
+            return
+        dev_nonce = payload[17:19]
+        app_nonce = os.urandom(3)
+        with self._lock:
+            dev_addr = self._next_dev_addr
+            self._next_dev_addr = self._next_dev_addr + 1
+        # DLSettings: RX1DROffset 0 and the region RX2 data rate
+        dl_settings = self._region.value.RX2_DATA_RATE & 0x0F
+        body = app_nonce + NET_ID + struct.pack("<I", dev_addr) + bytes([dl_settings, self._rx1_delay])
+        message = bytes([MTYPE_JOIN_ACCEPT]) + body
+        mic = aes_cmac(AppKey, message)[:4]
+        nwk_s_key = aes_encrypt(AppKey, bytes([0x01]) + app_nonce + NET_ID + dev_nonce + bytes(7))
+        app_s_key = aes_encrypt(AppKey, bytes([0x02]) + app_nonce + NET_ID + dev_nonce + bytes(7))
+        with self._lock:
+            self._sessions[dev_addr] = {"NwkSKey": nwk_s_key, "AppSKey": app_s_key, "FCntDown": 0}
+        # the join accept is "encrypted" with AES decrypt so the device decrypts it with AES encrypt
+        self.__send(bytes([MTYPE_JOIN_ACCEPT]) + aes_decrypt(AppKey, body + mic), info, self._join_rx1_delay)
+
+    def __data_up(self, payload:bytes, info:dict, confirmed:bool):
+        dev_addr = struct.unpack("<I", payload[1:5])[0]
+        session = self._sessions.get(dev_addr)
+        if session is None:
+            return
+        fcnt = struct.unpack("<H", payload[6:8])[0]
+        if frame_mic(session["NwkSKey"], payload[:-4], dev_addr, fcnt, False) != payload[-4:]:
+            self._logger.warning(f"DataUp : wrong MIC")
+            return
+        self.uplinks = self.uplinks + 1
+        with self._lock:
+            downlink = self._downlinks.pop(0) if len(self._downlinks) > 0 else None
+        if not confirmed and downlink is None:
+            return
+
+        fctrl = FCTRL_ACK if confirmed else 0x00
+        session["FCntDown"] = session["FCntDown"] + 1
+        message = bytes([MTYPE_UNCONFIRMED_DATA_DOWN]) + struct.pack("<I", dev_addr) + bytes([fctrl]) + \
+                  struct.pack("<H", session["FCntDown"] & 0xFFFF)
+        if downlink is not None:
+            fport, data = downlink
+            key = session["AppSKey"] if fport > 0 else session["NwkSKey"]
+            message = message + bytes([fport]) + frame_crypt(key, data, dev_addr, session["FCntDown"], True)
+        message = message + frame_mic(session["NwkSKey"], message, dev_addr, session["FCntDown"], True)
+        end = self.__send(message, info, self._rx1_delay)
+        if downlink is not None:
+            self.downlink_ends.append(end)
+
+    def __send(self, message:bytes, info:dict, rx1_delay:float) -> float:
+        # RX1: downlink channel of the uplink channel, same spreading factor
+        channel = next(channel for channel in range(self._region.value.UPLINK_CHANNEL_MIN, self._region.value.UPLINK_CHANNEL_MAX + 1)
+                       if self._region.uplink_frequency(channel) == info["frequency"])
+        self.downlinks = self.downlinks + 1
+        delay = info["end"] + rx1_delay - time.monotonic()
+        return self._radio.send_downlink(message, self._region.downlink_frequency(channel), info["spreading_factor"],
+                                         self._region.value.DOWNLINK_BANDWIDTH, max(0.0, delay))
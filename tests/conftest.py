@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# The tests never touch the device database of the node
+os.environ.setdefault("LORAMAC_DATABASE", os.path.join(tempfile.mkdtemp(prefix="loramac-test-"), "loramac.db"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,83 @@
+import pytest
+
+from LoRaMAC.loramac_airtime import LORAWAN_FRAME_OVERHEAD, AirtimeLedger, time_on_air
+from LoRaMAC.loramac_region import Region
+
+
+# Semtech AN1200.13 / LoRa calculator, 125 khz, CR 4/5, 8 preamble symbols, explicit header, CRC on.
+# LDRO is on at SF11 and SF12 (symbol of 16.384 ms and 32.768 ms).
+@pytest.mark.parametrize("spreading_factor, payload_size, expected", [
+    (7,  13, 0.046336),
+    (8,  13, 0.082432),
+    (9,  13, 0.164864),
+    (10, 13, 0.288768),
+    (11, 13, 0.577536),
+    (12, 13, 1.155072),
+    (11, 51, 1.314816),
+    (12, 51, 2.465792),
+])
+def test_time_on_air(spreading_factor, payload_size, expected):
+    assert time_on_air(spreading_factor, 125000, payload_size) == pytest.approx(expected)
+
+
+def test_time_on_air_low_data_rate_optimize():
+    # 51 bytes at SF11: 58 payload symbols without LDRO, 68 with it
+    assert time_on_air(11, 125000, 51, low_data_rate_optimize=False) == pytest.approx(1.150976)
+    assert time_on_air(11, 125000, 51, low_data_rate_optimize=True) == pytest.approx(1.314816)
+    # No LDRO at SF10 125 khz, nor at SF12 500 khz (symbol of 8.192 ms)
+    assert time_on_air(10, 125000, 13) == time_on_air(10, 125000, 13, low_data_rate_optimize=False)
+    assert time_on_air(12, 500000, 13) == time_on_air(12, 500000, 13, low_data_rate_optimize=False)
+
+
+def test_time_on_air_coding_rate_and_header():
+    # SF7 13 bytes: 5 payload symbol blocks, of 8 symbols at CR 4/8
+    assert time_on_air(7, 125000, 13, coding_rate=8) == pytest.approx((8 + 4.25 + 8 + 5 * 8) * 0.001024)
+    # Implicit header without CRC: 16 + 20 bits less, 3 payload symbol blocks
+    assert time_on_air(7, 125000, 13, explicit_header=False, crc=False) == pytest.approx((8 + 4.25 + 8 + 3 * 5) * 0.001024)
+
+
+def test_eu868_sub_band_off_time():
+    ledger = AirtimeLedger(Region.EU868)
+    airtime = time_on_air(12, 125000, 13)
+    # 868.1 Mhz is in the 1% sub-band: Toff = T / 0.01 - T
+    ledger.record(868100000, airtime, end=100.0)
+    assert ledger.delay(868100000, now=100.0) == pytest.approx(99 * airtime)
+    assert ledger.delay(868100000, now=100.0 + 99 * airtime) == 0
+    # The same sub-band is off on every one of its channels, the other sub-bands are not
+    assert ledger.delay(868500000, now=100.0) == pytest.approx(99 * airtime)
+    assert ledger.delay(869525000, now=100.0) == 0
+    # 867.1 Mhz is in the 865-868 Mhz sub-band
+    assert ledger.delay(867100000, now=100.0) == 0
+
+
+def test_eu868_sub_band_off_time_per_duty_cycle():
+    ledger = AirtimeLedger(Region.EU868)
+    # 0.1% sub-band (868.7 - 869.2 Mhz) and 10% sub-band (869.4 - 869.65 Mhz)
+    ledger.record(868800000, 1.0, end=0.0)
+    ledger.record(869525000, 1.0, end=0.0)
+    assert ledger.delay(868800000, now=0.0) == pytest.approx(999.0)
+    assert ledger.delay(869525000, now=0.0) == pytest.approx(9.0)
+
+
+def test_aggregated_duty_cycle():
+    ledger = AirtimeLedger(Region.EU868)
+    # DutyCycleReq MaxDCycle 7: 1 / 128 of all the transmissions
+    ledger.set_max_duty_cycle(1 / 128)
+    ledger.record(868100000, 1.0, end=0.0)
+    assert ledger.delay(869525000, now=0.0) == pytest.approx(127.0)
+
+
+def test_us915_dwell_time():
+    ledger = AirtimeLedger(Region.US915)
+    assert not ledger.exceeds_dwell_time(0.4)
+    assert ledger.exceeds_dwell_time(0.401)
+    # DR0 (SF10 125 khz) carries 11 bytes of application payload within 400 ms, not 12
+    assert not ledger.exceeds_dwell_time(time_on_air(10, 125000, 11 + LORAWAN_FRAME_OVERHEAD))
+    assert ledger.exceeds_dwell_time(time_on_air(10, 125000, 12 + LORAWAN_FRAME_OVERHEAD))
+    # No duty cycle limit in US915
+    ledger.record(902300000, 0.4, end=0.0)
+    assert ledger.delay(902300000, now=0.0) == 0
+
+
+def test_eu868_no_dwell_time():
+    assert not AirtimeLedger(Region.EU868).exceeds_dwell_time(2.5)
@@ -0,0 +1,106 @@
+from LoRaMAC.loramac_command import CID, MacCommand
+from LoRaMAC.loramac_region import Region
+
+
+def link_adr_req(data_rate:int, tx_power:int, ch_mask:int, ch_mask_ctrl:int, nb_tx:int) -> bytes:
+    return bytes([CID.LinkADR, (data_rate << 4) | tx_power, ch_mask & 0xFF, ch_mask >> 8, (ch_mask_ctrl << 4) | nb_tx])
+
+
+def test_device_time_cid():
+    # LoRaWAN 1.0.3 DeviceTimeReq / DeviceTimeAns
+    assert CID.DeviceTime == 0x0D
+    mac = MacCommand(Region.EU868)
+    mac.request_device_time()
+    assert mac.answer == bytes([0x0D])
+
+
+def test_device_time_answer():
+    mac = MacCommand(Region.EU868)
+    assert mac.handle_mac_command(bytes([CID.DeviceTime, 0x10, 0x00, 0x00, 0x00, 0x80])) is False
+    assert mac.device_time == 16.5
+    assert mac.answer is None
+
+
+def test_unknown_cid_stops_parsing():
+    mac = MacCommand(Region.EU868)
+    # DevStatusReq, then an unknown CID whose payload size is unknown: the DutyCycleReq after it is ignored
+    assert mac.handle_mac_command(bytes([CID.DevStatus, 0x7F, 0x01, CID.DutyCycle, 0x03])) is False
+    assert mac.max_duty_cycle == 0
+    assert mac.answer == bytes([CID.DevStatus, 0, 0])
+
+
+def test_truncated_command_ignored():
+    mac = MacCommand(Region.EU868)
+    # DutyCycleReq applied, RXParamSetupReq misses 2 bytes of its frequency
+    assert mac.handle_mac_command(bytes([CID.DutyCycle, 0x02, CID.RXParamSetup, 0x00, 0xD2])) is True
+    assert mac.max_duty_cycle == 2
+    assert mac.rx2_frequency == Region.EU868.value.RX2_FREQUENCY
+    assert mac.answer == bytes([CID.DutyCycle])
+
+
+def test_link_adr_block_applied_with_last_command():
+    mac = MacCommand(Region.US915)
+    # US915 sub-band 2: all 125 khz channels off, then channels 8 to 15 on, DR2 TXPower 4 NbTrans 2
+    block = link_adr_req(0, 0, 0x0000, 7, 0) + link_adr_req(2, 4, 0xFF00, 0, 2)
+    assert mac.handle_mac_command(block) is True
+    assert mac.link_adr.channels == set(range(8, 16))
+    assert (mac.link_adr.data_rate, mac.link_adr.tx_power, mac.link_adr.nb_tx) == (2, 4, 2)
+    # Every command of the block gets the same LinkADRAns
+    assert mac.answer == bytes([CID.LinkADR, 0x07, CID.LinkADR, 0x07])
+
+
+def test_link_adr_block_rejected_as_a_whole():
+    mac = MacCommand(Region.US915)
+    channels = set(mac.link_adr.channels)
+    # The data rate of the last command is not an uplink data rate: no field of the block is applied
+    block = link_adr_req(0, 0, 0x0000, 7, 0) + link_adr_req(9, 4, 0xFF00, 0, 2)
+    assert mac.handle_mac_command(block) is False
+    assert mac.link_adr.channels == channels
+    assert mac.link_adr.data_rate == 3
+    assert mac.answer == bytes([CID.LinkADR, 0x05, CID.LinkADR, 0x05])
+
+
+def test_reset_with_join_accept_dl_settings():
+    mac = MacCommand(Region.US915)
+    mac.reset(rx1_dr_offset=2, rx2_data_rate=10, rx_delay=3)
+    assert (mac.rx1_dr_offset, mac.rx2_data_rate, mac.rx_delay) == (2, 10, 3)
+    assert mac.rx2_spreading_factor() == 10
+
+
+def test_reset_rejects_invalid_dl_settings():
+    mac = MacCommand(Region.US915)
+    # DR0 is an uplink data rate in US915, RX1DROffset is at most 3
+    mac.reset(rx1_dr_offset=4, rx2_data_rate=0)
+    assert (mac.rx1_dr_offset, mac.rx2_data_rate) == (0, Region.US915.value.RX2_DATA_RATE)
+    assert mac.rx2_spreading_factor() == 12
+
+
+def test_set_state_replaces_invalid_rx2_data_rate():
+    mac = MacCommand(Region.US915)
+    state = mac.to_dict()
+    state["rx2_data_rate"] = 0
+    assert mac.set_state(state)
+    assert mac.rx2_data_rate == Region.US915.value.RX2_DATA_RATE
+
+
+def test_answers_beyond_fopts_wait_for_the_next_uplink():
+    mac = MacCommand(Region.EU868)
+    # 8 DutyCycleReq: 8 answers of 1 byte, then 4 DevStatusReq: 4 answers of 3 bytes, 20 bytes in all
+    mac.handle_mac_command(bytes([CID.DutyCycle, 0x01] * 8 + [CID.DevStatus] * 4))
+    assert mac.answer == bytes([CID.DutyCycle] * 8 + [CID.DevStatus, 0, 0] * 2)
+    mac.answer_sent()
+    assert mac.pending
+    assert mac.answer == bytes([CID.DevStatus, 0, 0] * 2)
+    mac.answer_sent()
+    assert not mac.pending
+    assert mac.answer is None
+
+
+def test_answer_sent_keeps_the_commands_queued_after_answer():
+    mac = MacCommand(Region.EU868)
+    mac.handle_mac_command(bytes([CID.DutyCycle, 0x01]))
+    assert mac.answer == bytes([CID.DutyCycle])
+    # Queued after the uplink was built, sent with the next one
+    mac.request_link_check()
+    mac.answer_sent()
+    assert mac.answer == bytes([CID.LinkCheck])
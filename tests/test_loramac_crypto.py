@@ -0,0 +1,90 @@
+import pytest
+
+from LoRaMAC.loramac_crypto import AESCipher, Cipher, CryptoLoRaMAC
+
+BACKENDS = ["python", pytest.param("cryptography", marks=pytest.mark.skipif(Cipher is None, reason="cryptography not installed"))]
+
+# RFC 4493 (AES-CMAC) key and messages, the first block is the FIPS-197 / SP 800-38A ECB vector
+RFC4493_KEY = bytes.fromhex("2b7e151628aed2a6abf7158809cf4f3c")
+RFC4493_MESSAGE = bytes.fromhex("6bc1bee22e409f96e93d7e117393172aae2d8a571e03ac9c9eb76fac45af8e5130c81c46a35ce411"
+                                "e5fbc1191a0a52eff69f2445df4f9b17ad2b417be66c3710")
+
+# Frames built by an independent network server implementation (benchmarks/network_server.py)
+APP_KEY = bytes.fromhex("000102030405060708090a0b0c0d0e0f")
+DEV_NONCE = 0x1234
+DEV_ADDR = bytes.fromhex("26011bda")
+NWK_S_KEY = bytes.fromhex("c72609a4d953fba072b6a857064f9c5b")
+APP_S_KEY = bytes.fromhex("0a73b78f2d8bea62adb603aa3c4c5c32")
+JOIN_ACCEPT = bytes.fromhex("207b3735bb3bfe4baf6d6bfeb2e42b7c59")
+# Unconfirmed data up, ADR, FCnt 5, FPort 1, "hello, lorawan node!"
+DATA_UP = bytes.fromhex("40da1b012680050001798cde202998ba326b51e0bc8b2ccafcf9328f9169c582c7")
+# Unconfirmed data down, ACK, FCnt 7, FOpts DutyCycleReq 7, FPort 2, 010203
+DATA_DOWN = bytes.fromhex("60da1b01262207000407023d4abf4b76ff6f")
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_aes_encrypt(backend):
+    cipher = AESCipher(RFC4493_KEY, backend)
+    assert cipher.encrypt(RFC4493_MESSAGE[:16]).hex() == "3ad77bb40d7a3660a89ecaf32466ef97"
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("length, expected", [
+    (0,  "bb1d6929e95937287fa37d129b756746"),
+    (16, "070a16b46b4d4144f79bdd9dd04a287c"),
+    (40, "dfa66747de9ae63030ca32611497c827"),
+    (64, "51f0bebf7e3b9d92fc49741779363cfe"),
+])
+def test_cmac_rfc4493(backend, length, expected):
+    assert AESCipher(RFC4493_KEY, backend).cmac(RFC4493_MESSAGE[:length]).hex() == expected
+
+
+def test_invalid_key():
+    with pytest.raises(ValueError):
+        AESCipher(bytes(15))
+
+
+def test_join_accept():
+    response = CryptoLoRaMAC.join_accept(JOIN_ACCEPT, APP_KEY, DEV_NONCE)
+    assert response["DevAddr"] == DEV_ADDR
+    assert response["NwkSKey"] == NWK_S_KEY
+    assert response["AppSKey"] == APP_S_KEY
+    assert (response["RX1DROffset"], response["RX2DataRate"], response["RxDelay"]) == (2, 1, 1)
+
+
+def test_join_accept_wrong_key():
+    assert CryptoLoRaMAC.join_accept(JOIN_ACCEPT, bytes(16), DEV_NONCE) is None
+
+
+def test_unconfirmed_data_up():
+    response = CryptoLoRaMAC.unconfirmed_data_up(b"hello, lorawan node!", 5, 1, DEV_ADDR, NWK_S_KEY, APP_S_KEY)
+    assert response["PHYPayload"] == DATA_UP
+
+
+def test_unconfirmed_data_up_precomputed_keystream():
+    CryptoLoRaMAC.prepare_session(DEV_ADDR, NWK_S_KEY, APP_S_KEY, 5)
+    try:
+        response = CryptoLoRaMAC.unconfirmed_data_up(b"hello, lorawan node!", 5, 1, DEV_ADDR, NWK_S_KEY, APP_S_KEY)
+    finally:
+        CryptoLoRaMAC.release_session(DEV_ADDR)
+    assert response["PHYPayload"] == DATA_UP
+
+
+def test_data_up_too_long():
+    with pytest.raises(ValueError):
+        CryptoLoRaMAC.unconfirmed_data_up(bytes(225), 5, 1, DEV_ADDR, NWK_S_KEY, APP_S_KEY)
+    with pytest.raises(ValueError):
+        CryptoLoRaMAC.confirmed_data_up(b"\x01", 5, 1, DEV_ADDR, NWK_S_KEY, APP_S_KEY, fOpts=bytes(16))
+
+
+def test_data_down():
+    response = CryptoLoRaMAC.data_down(DATA_DOWN, DEV_ADDR, NWK_S_KEY, APP_S_KEY)
+    assert response["MacPayload"] == b"\x01\x02\x03"
+    assert response["FOpts"] == b"\x04\x07"
+    assert response["ACK"] is True
+    assert (response["FCntDown"], response["FPortDown"]) == (7, 2)
+
+
+def test_data_down_wrong_mic():
+    frame = DATA_DOWN[:-1] + bytes([DATA_DOWN[-1] ^ 0x01])
+    assert CryptoLoRaMAC.data_down(frame, DEV_ADDR, NWK_S_KEY, APP_S_KEY) is None
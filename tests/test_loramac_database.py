@@ -0,0 +1,72 @@
+from LoRaMAC.loramac_database import Database, WriteBehindDatabase
+
+DEV_EUI = "0011223344556677"
+APP_KEY = "000102030405060708090a0b0c0d0e0f"
+
+
+def test_durable_flush_writes_queued_updates(tmp_path):
+    path = str(tmp_path / "loramac.db")
+    db = WriteBehindDatabase(Database(path, persistent=True), delay=10)
+    db.open()
+    db.create_table()
+    db.insert_device(DEV_EUI, AppKey=APP_KEY)
+    db.update_f_cnt(DEV_EUI, 64)
+    db.update_dev_nonce(DEV_EUI, 1234)
+    assert db.flush(timeout=5, durable=True)
+    assert db.pending() == 0
+    # A new connection reads the committed bound and DevNonce
+    reader = Database(path)
+    reader.open()
+    device = reader.get_device(DEV_EUI)
+    reader.close()
+    assert (device["FCnt"], device["DevNonce"]) == (64, 1234)
+
+
+def test_sync_without_wal(tmp_path):
+    db = Database(str(tmp_path / "loramac.db"))
+    db.open()
+    db.create_table()
+    assert db.sync()
+    db.close()
+    assert not db.sync()
+
+
+class FailingDatabase(Database):
+    # The first `failures` FCnt updates fail, like a write refused while another connection locks the file
+    def __init__(self, path:str, failures:int):
+        super().__init__(path, persistent=True)
+        self.failures = failures
+
+    def update_f_cnt(self, DevEUI:str=None, FCnt:int=1) -> bool:
+        if self.failures > 0:
+            self.failures = self.failures - 1
+            return False
+        return super().update_f_cnt(DevEUI, FCnt)
+
+
+def test_flush_fails_until_the_update_is_written(tmp_path):
+    path = str(tmp_path / "loramac.db")
+    database = FailingDatabase(path, failures=1)
+    db = WriteBehindDatabase(database, delay=0.05)
+    db.open()
+    db.create_table()
+    db.insert_device(DEV_EUI, AppKey=APP_KEY)
+    db.update_f_cnt(DEV_EUI, 64)
+    assert not db.flush(timeout=5, durable=True)
+    assert db.pending() == 1
+    # Retried after the delay
+    assert db.flush(timeout=5, durable=True)
+    assert db.get_device(DEV_EUI)["FCnt"] == 64
+
+
+def test_failed_update_replaced_by_newer_one(tmp_path):
+    database = FailingDatabase(str(tmp_path / "loramac.db"), failures=1)
+    db = WriteBehindDatabase(database, delay=10)
+    db.open()
+    db.create_table()
+    db.insert_device(DEV_EUI, AppKey=APP_KEY)
+    db.update_f_cnt(DEV_EUI, 64)
+    assert not db.flush(timeout=5)
+    db.update_f_cnt(DEV_EUI, 128)
+    assert db.flush(timeout=5)
+    assert db.get_device(DEV_EUI)["FCnt"] == 128
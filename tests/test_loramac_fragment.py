@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from LoRaMAC.loramac_fragment import fragment, Reassembler, FRAGMENT_HEADER_SIZE
+
+
+PAYLOAD = random.Random(1).randbytes(200)
+
+
+def test_fragment_sizes_and_headers():
+    frames = fragment(PAYLOAD, 50, session=7)
+    assert len(frames) == 5
+    assert all(len(frame) <= 50 for frame in frames)
+    assert [frame[:4] for frame in frames] == [bytes([7, index, 5, 0]) for index in range(5)]
+
+
+def test_fragment_with_parity_adds_one_frame_per_group():
+    frames = fragment(PAYLOAD, 50, session=1, parity_group=2)
+    # 5 data fragments, parity after fragments 1, 3 and 4
+    assert [frame[1] for frame in frames] == [0, 1, 5, 2, 3, 6, 4, 7]
+
+
+def test_fragment_errors():
+    with pytest.raises(ValueError):
+        fragment(PAYLOAD, FRAGMENT_HEADER_SIZE, session=0)
+    with pytest.raises(ValueError):
+        fragment(bytes(300), FRAGMENT_HEADER_SIZE + 1, session=0)
+
+
+def test_reassemble_out_of_order():
+    frames = fragment(PAYLOAD, 40, session=3)
+    random.Random(2).shuffle(frames)
+    reassembler = Reassembler()
+    results = [reassembler.add(frame) for frame in frames]
+    assert results[:-1] == [None] * (len(frames) - 1)
+    assert results[-1] == PAYLOAD
+    assert reassembler.pending() == 0
+
+
+@pytest.mark.parametrize("lost", range(5))
+def test_parity_recovers_one_lost_fragment_per_group(lost):
+    frames = fragment(PAYLOAD, 50, session=4, parity_group=3)
+    frames = [frame for frame in frames if frame[1] != lost]
+    reassembler = Reassembler()
+    results = [reassembler.add(frame) for frame in frames]
+    assert PAYLOAD in results
+
+
+def test_two_lost_fragments_in_a_group_are_not_recovered():
+    frames = fragment(PAYLOAD, 50, session=5, parity_group=3)
+    frames = [frame for frame in frames if frame[1] not in (0, 1)]
+    reassembler = Reassembler()
+    assert [reassembler.add(frame) for frame in frames] == [None] * len(frames)
+    assert reassembler.pending() == 1
+
+
+def test_late_parity_and_duplicates_are_ignored():
+    frames = fragment(PAYLOAD, 50, session=6, parity_group=2)
+    reassembler = Reassembler()
+    results = [reassembler.add(frame) for frame in frames]
+    assert results.count(PAYLOAD) == 1
+    assert [reassembler.add(frame) for frame in frames] == [None] * len(frames)
+    assert reassembler.pending() == 0
+
+
+def test_session_wrap_rebuilds_the_next_payload():
+    # Session 256 wraps to 0: same session, fragment count and length as an already rebuilt payload
+    reassembler = Reassembler()
+    other = bytes(reversed(PAYLOAD))
+    for session, payload in ((0, PAYLOAD), (256, other)):
+        results = [reassembler.add(frame) for frame in fragment(payload, 50, session=session, parity_group=2)]
+        assert payload in results
+    assert reassembler.pending() == 0
+
+
+def test_short_frame_is_ignored():
+    assert Reassembler().add(bytes(FRAGMENT_HEADER_SIZE - 1)) is None
@@ -0,0 +1,88 @@
+import pytest
+
+from LoRaMAC.loramac_frame import FrameView
+from LoRaMAC.loramac_types import MessageType
+
+# Unconfirmed data down, ACK, FCnt 7, FOpts DutyCycleReq 7, FPort 2, 010203 (tests/test_loramac_crypto.py)
+DATA_DOWN = bytes.fromhex("60da1b01262207000407023d4abf4b76ff6f")
+MIC = bytes(4)
+
+
+def data_frame(mtype:MessageType, fctrl:int=0x00, fopts:bytes=b"", fport:int=None, payload:bytes=b"") -> bytes:
+    frame = bytes([mtype.value << 5]) + bytes.fromhex("da1b0126") + bytes([fctrl | len(fopts), 0x07, 0x00]) + fopts
+    if fport is not None:
+        frame = frame + bytes([fport]) + payload
+    return frame + MIC
+
+
+def test_data_down_fields():
+    frame = FrameView(DATA_DOWN)
+    assert frame.is_downlink()
+    assert frame.mtype == MessageType.UNCONFIRMED_DATA_DOWN
+    assert frame.dev_addr == bytes.fromhex("26011bda")
+    assert (frame.ack, frame.adr, frame.fpending) == (True, False, False)
+    assert frame.fcnt == 7
+    assert bytes(frame.fopts) == b"\x04\x07"
+    assert frame.fport == 2
+    assert len(frame.frm_payload) == 3
+    assert bytes(frame.mic) == DATA_DOWN[-4:]
+
+
+def test_view_is_not_a_copy():
+    buffer = bytearray(DATA_DOWN)
+    frame = FrameView(buffer)
+    buffer[6] = 0x08
+    assert frame.fcnt == 8
+
+
+@pytest.mark.parametrize("size", range(0, 12))
+def test_truncated_data_down(size):
+    # Shorter than MHDR + FHDR + MIC
+    assert not FrameView(data_frame(MessageType.CONFIRMED_DATA_DOWN)[:size]).is_downlink()
+
+
+def test_shortest_data_down():
+    frame = FrameView(data_frame(MessageType.CONFIRMED_DATA_DOWN))
+    assert len(frame) == 12
+    assert frame.is_downlink()
+
+
+def test_fopts_longer_than_frame():
+    # FOptsLen 15 with 2 bytes of FOpts: the FOpts would run into the MIC
+    frame = bytearray(data_frame(MessageType.UNCONFIRMED_DATA_DOWN, fopts=b"\x04\x07", fport=2, payload=b"\x01"))
+    frame[5] = 0x0F
+    assert not FrameView(frame).is_downlink()
+    # FOpts ending right before the MIC
+    frame = data_frame(MessageType.UNCONFIRMED_DATA_DOWN, fopts=bytes([0x02] * 15))
+    assert FrameView(frame).is_downlink()
+
+
+@pytest.mark.parametrize("size, expected", [(17, True), (33, True), (0, False), (1, False), (16, False),
+                                            (18, False), (32, False), (34, False)])
+def test_join_accept_size(size, expected):
+    frame = bytes([MessageType.JOIN_ACCEPT.value << 5]) + bytes(max(size - 1, 0))
+    assert FrameView(frame[:size]).is_downlink() is expected
+
+
+@pytest.mark.parametrize("mtype", [MessageType.JOIN_REQUEST, MessageType.UNCONFIRMED_DATA_UP,
+                                   MessageType.CONFIRMED_DATA_UP, MessageType.REJOIN_REQUEST,
+                                   MessageType.PROPRIETARY])
+def test_not_downlink(mtype):
+    assert not FrameView(data_frame(mtype, fport=1, payload=b"\x01")).is_downlink()
+
+
+def test_other_major_version():
+    frame = bytearray(DATA_DOWN)
+    frame[0] = frame[0] | 0x01
+    assert not FrameView(frame).is_downlink()
+
+
+def test_fport_without_frm_payload():
+    # No FPort and no FRMPayload, with and without FOpts
+    assert FrameView(data_frame(MessageType.UNCONFIRMED_DATA_DOWN)).fport is None
+    assert FrameView(data_frame(MessageType.UNCONFIRMED_DATA_DOWN, fopts=b"\x04\x07")).fport is None
+    assert len(FrameView(data_frame(MessageType.UNCONFIRMED_DATA_DOWN)).frm_payload) == 0
+    # FPort with an empty FRMPayload
+    frame = FrameView(data_frame(MessageType.UNCONFIRMED_DATA_DOWN, fport=0))
+    assert frame.fport == 0
+    assert len(frame.frm_payload) == 0
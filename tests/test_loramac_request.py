@@ -0,0 +1,82 @@
+from LoRaMAC.loramac_request import MacRequest, RequestType, Priority, UplinkQueue
+
+
+def uplink(payload:bytes, priority:Priority=Priority.NORMAL, fport:int=1, mergeable:bool=True) -> MacRequest:
+    return MacRequest(RequestType.UPLINK, payload=payload, priority=priority, fport=fport, mergeable=mergeable)
+
+
+def test_pop_empty_queue():
+    assert UplinkQueue().pop(255) is None
+
+
+def test_pop_by_priority_then_fifo():
+    queue = UplinkQueue()
+    low = uplink(b"L", Priority.LOW, fport=1)
+    first = uplink(b"A", fport=2)
+    second = uplink(b"B", fport=3)
+    high = uplink(b"H", Priority.HIGH, fport=4)
+    for request in (low, first, second, high):
+        queue.put(request)
+    assert [queue.pop(255) for _ in range(4)] == [high, first, second, low]
+    assert len(queue) == 0
+
+
+def test_pop_merges_same_fport_in_queue_order():
+    queue = UplinkQueue()
+    first = uplink(b"\x01\x02", fport=1)
+    other = uplink(b"\x09", fport=2)
+    second = uplink(b"\x03", fport=1, priority=Priority.LOW)
+    for request in (first, other, second):
+        queue.put(request)
+    request = queue.pop(255)
+    assert request is first
+    assert request.payload == b"\x01\x02\x03"
+    assert request.merged == [second]
+    assert queue.pop(255) is other
+    assert len(queue) == 0
+
+
+def test_pop_merge_stops_at_max_size():
+    queue = UplinkQueue()
+    requests = [uplink(bytes(4)) for _ in range(3)]
+    for request in requests:
+        queue.put(request)
+    assert len(queue.pop(8).payload) == 8
+    assert len(queue) == 1
+    assert queue.pop(8) is requests[2]
+
+
+def test_pop_never_merges_unmergeable_requests():
+    queue = UplinkQueue()
+    fragment = uplink(b"\x01", mergeable=False)
+    queue.put(fragment)
+    queue.put(uplink(b"\x02"))
+    assert queue.pop(255).payload == b"\x01"
+    assert len(queue) == 1
+
+
+def test_merged_request_completes_every_future():
+    queue = UplinkQueue()
+    first = uplink(b"\x01")
+    second = uplink(b"\x02")
+    second.confirmed = True
+    queue.put(first)
+    queue.put(second)
+    request = queue.pop(255)
+    assert request.confirmed
+    request.complete("done")
+    request.complete("ignored")
+    assert first.future.result() == "done"
+    assert second.future.result() == "done"
+
+
+def test_requeue_goes_ahead_of_same_priority():
+    queue = UplinkQueue()
+    first = uplink(b"\x01", fport=1)
+    second = uplink(b"\x02", fport=2)
+    queue.put(first)
+    queue.put(second)
+    request = queue.pop(255)
+    queue.requeue(request)
+    assert queue.priority() == Priority.NORMAL
+    assert queue.pop(255) is first